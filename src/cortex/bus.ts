@@ -6,10 +6,55 @@ import { execCommand } from '../rome/executor';
 
 const inbox = path.join('.qflush', 'cortex', 'inbox');
 const outbox = path.join('.qflush', 'cortex', 'outbox');
+// one consumer per inbox: tools/cortex_bus_worker.py holds the same lock file (owner pid first)
+const lockPath = path.normalize(inbox) + '.lock';
+
+function lockOwner(): number | null {
+  try {
+    const pid = parseInt(fs.readFileSync(lockPath, 'utf8').split(/\s+/)[0], 10);
+    return Number.isFinite(pid) ? pid : null;
+  } catch (e) {
+    return null;
+  }
+}
+
+function pidAlive(pid: number): boolean {
+  try { process.kill(pid, 0); return true; } catch (e: any) { return e && e.code === 'EPERM'; }
+}
+
+function acquireInboxLock(): boolean {
+  for (let attempt = 0; attempt < 3; attempt++) {
+    try {
+      fs.writeFileSync(lockPath, `${process.pid} bus.ts\n`, { flag: 'wx' });
+      process.on('exit', () => {
+        try { if (lockOwner() === process.pid) fs.unlinkSync(lockPath); } catch (e) { /* ignore */ }
+      });
+      return true;
+    } catch (e: any) {
+      if (!e || e.code !== 'EEXIST') throw e;
+    }
+    const owner = lockOwner();
+    if (owner !== null && pidAlive(owner)) {
+      console.error(`[CORTEX] ${inbox} is already served by pid ${owner} (${lockPath}); stop it (e.g. tools/cortex_bus_worker.py) to use the TS bus`);
+      return false;
+    }
+    if (owner === null) {
+      let age = Infinity;
+      try { age = Date.now() - fs.statSync(lockPath).mtimeMs; } catch (e) { /* gone */ }
+      if (age < 1000) {
+        console.error(`[CORTEX] ${lockPath} is being taken by another consumer; bus not started`);
+        return false;
+      }
+    }
+    try { fs.unlinkSync(lockPath); } catch (e) { /* stale lock already gone */ }
+  }
+  return false;
+}
 
 export function startCortexBus() {
   fs.mkdirSync(inbox, { recursive: true });
   fs.mkdirSync(outbox, { recursive: true });
+  if (!acquireInboxLock()) return;
 
   console.log('[CORTEX] Bus démarré — watching', inbox);
 
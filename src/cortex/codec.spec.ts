@@ -1,5 +1,5 @@
 import { describe, it, expect } from 'vitest';
-import { decodeCortexPacket } from './codec';
+import { buildCortexPacket, decodeCortexPacket, parseCortexPacket } from './codec';
 import packet80 from '../../decoded_brotli_red_80.json';
 
 describe('Cortex codec', () => {
@@ -10,4 +10,19 @@ describe('Cortex codec', () => {
     expect(packet80.cmd).toBe('enable-spyder');
     expect(Array.isArray(packet80.args)).toBe(true);
   });
+
+  it('parseCortexPacket should reject non-plain payload kinds', () => {
+    const raw = Buffer.from('{"cmd":"noop"}');
+    // kind 3 (delta) is bits 0..1 both set
+    expect(() => parseCortexPacket(buildCortexPacket(raw, 0x03))).toThrow(/unsupported payload kind 3/);
+  });
+
+  it('parseCortexPacket should read kind-0 packets with RGBA / CHECK32 flags set', () => {
+    const raw = Buffer.from('{"cmd":"noop"}');
+    for (const flags of [0x04, 0x08, 0x0c]) {
+      const parsed = parseCortexPacket(buildCortexPacket(raw, flags));
+      expect(parsed.flags).toBe(flags);
+      expect(parsed.raw.equals(raw)).toBe(true);
+    }
+  });
 });
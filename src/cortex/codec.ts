@@ -7,6 +7,9 @@ import sharp from 'sharp';
 const brotliCompressSync = (input: Buffer) => zlib.brotliCompressSync(input, { params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 11 } });
 const brotliDecompressSync = (input: Buffer) => zlib.brotliDecompressSync(input);
 
+// flags bits 0..1: payload kind, a 2-bit value (see docs/CORTEX-PACKET.md)
+export const PAYLOAD_KIND_MASK = 0x03;
+
 // CRC-8 OC8 implementation
 export function crc8_oc8(data: Buffer, poly = 0x07, init = 0x00): number {
   let crc = init & 0xff;
@@ -39,6 +42,9 @@ export function parseCortexPacket(buf: Buffer) {
   const totalLen = buf.readUInt32BE(0);
   const payloadLen = buf.readUInt32BE(4);
   const flags = buf.readUInt8(8);
+  // bits 0..1 are the payload kind (0 plain, 1 archive, 2 blocks, 3 delta); only plain packets are read here
+  const kind = flags & PAYLOAD_KIND_MASK;
+  if (kind !== 0) throw new Error(`unsupported payload kind ${kind} (archive/blocks/delta packets are read by tools/rgba_brotli_oc8.py)`);
   if (payloadLen < 1) throw new Error('invalid payload length');
   if (buf.length < 16 + payloadLen) throw new Error('buffer shorter than payload');
   const payloadWithCrc = buf.slice(16, 16 + payloadLen);
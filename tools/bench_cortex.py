@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Python Cortex codec and scanners on synthetic corpora.
+
+Usage:
+  python tools/bench_cortex.py run [--sizes 1K,1M,4M] [--corpora json,source,random]
+                                   [--qualities 11,5] [--max-png-bytes 200M,256K]
+                                   [--scan-size 1M] [--png-size 32M] [--repeat N] [--out results.json]
+                                   [--baseline old.json [--tolerance 0.10]]
+  python tools/bench_cortex.py compare <baseline.json> <results.json> [--tolerance 0.10]
+
+Corpora are generated offline and deterministically (fixed seed) under
+--work-dir, and kept between runs: `json` is newline-separated bus packets,
+`source` is a synthetic code dump, `random` is incompressible bytes. Sizes
+go from 1K up to 500M.
+
+Every case runs the real tool in a child process: the child imports the
+tool, then times its ``main(argv)`` alone, so ``seconds`` and ``mb_s``
+cover the tool's work (PNG I/O included) and not interpreter start-up and
+imports. Those are reported apart: ``process_seconds`` is the child's
+whole wall time, ``startup_seconds`` the difference. ``seconds`` is the
+best of --repeat runs and peak RSS comes from the child's own rusage. Cases:
+
+  encode/<corpus>/<size>/q<Q>/p<P>   rgba_brotli_oc8.py encode (quality and part-size scaling)
+  decode/<corpus>/<size>/q<Q>/p<P>   rgba_brotli_oc8.py decode of those parts
+  scan/<shifted|corrupted>           scan_and_decode_cortex.py on legacy parts, junk-prefixed
+  scan/zero-padded                   the shifted packet followed by --scan-size NUL bytes
+  scan/decoys[-check32]              the same behind plausible fake headers (OC8 only / FLAG_CHECK32)
+  red/json                           decode_red_brotli.py on a red-plane Brotli image
+  offsets/shifted                    scan_brotli_offsets.py on the same, junk-prefixed
+  png/<pillow|cxpk>/<write|read>     one part of --png-size random bytes through Pillow
+                                     (save at level 1 / open+load+tobytes) or oc8.pngio
+
+Results are JSON (environment + one record per case). `compare` (or
+`run --baseline`) matches cases by name and exits 1 when a case got
+slower or bigger than the baseline by more than --tolerance.
+"""
+
+from __future__ import annotations
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import brotli
+from PIL import Image
+
+from oc8 import planes, pngio
+from oc8.crc import PacketCheck
+from oc8.headers import FLAG_CHECK32
+from oc8.parts import PngPartWriter, full_part_geometry
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WORK_DIR = os.path.join('.qflush', 'cortex', 'bench')
+RESULTS_VERSION = 2  # 2: seconds is the in-process main() time
+_GEN_CHUNK = 1 << 20
+_UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+# cases faster than this are dominated by timer and scheduling noise; they are reported but never flagged
+NOISE_FLOOR_S = 0.05
+# plausible-looking headers in front of the packet in the scan/decoys* cases
+SCAN_DECOYS = 1000
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in _UNITS:
+        return int(float(text[:-1]) * _UNITS[text[-1]])
+    return int(text)
+
+
+def format_size(n: int) -> str:
+    for unit in ('G', 'M', 'K'):
+        if n >= _UNITS[unit] and n % _UNITS[unit] == 0:
+            return f'{n // _UNITS[unit]}{unit}'
+    return str(n)
+
+
+# --- corpora --------------------------------------------------------------
+
+_CMDS = ('encode', 'decode', 'flush', 'status', 'ping', 'scan', 'archive', 'inspect')
+_WORDS = ('cortex', 'packet', 'part', 'offset', 'stream', 'header', 'payload', 'index', 'flush',
+          'buffer', 'worker', 'queue', 'length', 'manifest', 'decoder', 'encoder', 'channel', 'image')
+
+
+def _json_chunk(rng: random.Random, n: int) -> bytes:
+    out = []
+    size = 0
+    while size < n:
+        line = json.dumps({
+            'id': f'{rng.getrandbits(64):016x}',
+            'cmd': rng.choice(_CMDS),
+            'ts': 1700000000 + rng.randrange(10 ** 7),
+            'args': {'path': f'canal/{rng.choice(_WORDS)}_{rng.randrange(1000)}.png',
+                     'quality': rng.randrange(12), 'tags': rng.sample(_WORDS, 3)},
+        }, separators=(',', ':')).encode() + b'\n'
+        out.append(line)
+        size += len(line)
+    return b''.join(out)
+
+
+def _source_chunk(rng: random.Random, n: int) -> bytes:
+    out = []
+    size = 0
+    while size < n:
+        a, b, c = rng.sample(_WORDS, 3)
+        block = (
+            f'def {a}_{b}_{rng.randrange(100)}({c}, {b}=None):\n'
+            f'    """Return the {b} for a {c}."""\n'
+            f'    if {b} is None:\n'
+            f'        {b} = {rng.randrange(1 << 16)}\n'
+            f'    for i in range(len({c})):\n'
+            f'        {c}[i] = ({c}[i] + {b}) & 0x{rng.randrange(256):02x}\n'
+            f'    return {c}\n\n'
+        ).encode()
+        out.append(block)
+        size += len(block)
+    return b''.join(out)
+
+
+def _random_chunk(rng: random.Random, n: int) -> bytes:
+    return rng.randbytes(n)
+
+
+CORPORA = {'json': _json_chunk, 'source': _source_chunk, 'random': _random_chunk}
+
+
+def corpus_path(work_dir: str, kind: str, size: int) -> str:
+    path = os.path.join(work_dir, 'corpus', f'{kind}_{format_size(size)}.bin')
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rng = random.Random(f'{kind}:{size}')
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        left = size
+        while left:
+            chunk = CORPORA[kind](rng, min(left, _GEN_CHUNK))[:min(left, _GEN_CHUNK)]
+            f.write(chunk)
+            left -= len(chunk)
+    os.replace(tmp, path)
+    return path
+
+
+# --- measurement ----------------------------------------------------------
+
+def run_tool(argv: List[str], cwd: Optional[str] = None) -> Dict:
+    """Run one tool's main(argv) in a child process (see time_case); work and process seconds, peak RSS, exit code."""
+    with tempfile.TemporaryDirectory(prefix='bench-') as tmp:
+        result_path = os.path.join(tmp, 'result.json')
+        err_path = os.path.join(tmp, 'stderr')
+        start = time.perf_counter()
+        # stderr goes to a file: a pipe read only after the child exits blocks a chatty child forever
+        with open(err_path, 'wb') as err:
+            proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'time-case', result_path] + argv,
+                                    cwd=cwd, stdout=subprocess.DEVNULL, stderr=err)
+            _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - start
+        code = os.waitstatus_to_exitcode(status)
+        with open(err_path, 'rb') as f:
+            f.seek(max(0, os.path.getsize(err_path) - 2000))
+            err_tail = f.read().decode('utf-8', 'replace')
+        try:
+            with open(result_path, 'r', encoding='utf-8') as f:
+                timed = json.load(f)
+        except (OSError, ValueError):
+            timed = {'work_seconds': seconds, 'exit': code}  # died before main() returned
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return {'seconds': timed['work_seconds'], 'process_seconds': seconds, 'max_rss_bytes': rss,
+            'exit': timed['exit'] if code == 0 else code, 'stderr': err_tail}
+
+
+def time_case(result_path: str, tool: str, argv: List[str]) -> None:
+    # child side of run_tool: import the tool first, then time main(argv) alone
+    spec = importlib.util.spec_from_file_location('_bench_tool', tool)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    start = time.perf_counter()
+    try:
+        code = module.main(argv, prog=os.path.basename(tool)) or 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    seconds = time.perf_counter() - start
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump({'work_seconds': seconds, 'exit': code}, f)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(0)  # skip interpreter teardown: it is not the tool's work
+
+
+def measure(name: str, argv: List[str], repeat: int, raw_bytes: int, cwd: Optional[str] = None, expect_exit: int = 0, before=None, **extra) -> Dict:
+    runs = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        runs.append(run_tool(argv, cwd=cwd))
+    best = min(runs, key=lambda r: r['seconds'])
+    rec = {'name': name, 'seconds': round(best['seconds'], 4), 'process_seconds': round(best['process_seconds'], 4),
+           'startup_seconds': round(best['process_seconds'] - best['seconds'], 4), 'max_rss_bytes': max(r['max_rss_bytes'] for r in runs),
+           'raw_bytes': raw_bytes, 'mb_s': round(raw_bytes / best['seconds'] / 1e6, 3) if best['seconds'] else None,
+           'ok': all(r['exit'] == expect_exit for r in runs), 'runs': [round(r['seconds'], 4) for r in runs]}
+    if not rec['ok']:
+        rec['stderr'] = next(r['stderr'] for r in runs if r['exit'] != expect_exit)
+    rec.update(extra)
+    print(f"{name:<44} {rec['seconds']:>9.3f}s {rec['mb_s'] or 0:>9.2f} MB/s {rec['max_rss_bytes'] / 2 ** 20:>8.1f} MiB{'' if rec['ok'] else '  FAILED'}", flush=True)
+    return rec
+
+
+def _fresh_dir(path: str) -> str:
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+
+def codec_cases(work_dir: str, corpora: List[str], sizes: List[int], qualities: List[int], part_sizes: List[int], repeat: int) -> List[Dict]:
+    # quality scaling at the first part size, part-count scaling at the first quality
+    combos = [(q, part_sizes[0]) for q in qualities] + [(qualities[0], p) for p in part_sizes[1:]]
+    tool = os.path.join(HERE, 'rgba_brotli_oc8.py')
+    out = []
+    for kind in corpora:
+        for size in sizes:
+            src = corpus_path(work_dir, kind, size)
+            for q, p in combos:
+                tag = f'{kind}/{format_size(size)}/q{q}/p{format_size(p)}'
+                parts_dir = os.path.join(work_dir, 'parts', tag.replace('/', '_'))
+                prefix = os.path.join(parts_dir, 'bench')
+                enc = measure(f'encode/{tag}', [tool, 'encode', src, prefix, '--brotli-quality', str(q), '--max-png-bytes', str(p)],
+                              repeat, size, before=lambda d=parts_dir: _fresh_dir(d))
+                pngs = sorted(glob.glob(prefix + '_part*.png'))
+                png_bytes = sum(os.path.getsize(x) for x in pngs)
+                enc.update(parts=len(pngs), png_bytes=png_bytes, ratio=round(png_bytes / size, 4) if size else None)
+                out.append(enc)
+                dec_out = os.path.join(parts_dir, 'decoded.bin')
+                dec = measure(f'decode/{tag}', [tool, 'decode', prefix + '_part*.png', dec_out], repeat, size, parts=len(pngs))
+                if dec['ok'] and not _same_file(src, dec_out):
+                    dec.update(ok=False, stderr='decoded output differs from input')
+                out.append(dec)
+                shutil.rmtree(parts_dir, ignore_errors=True)
+    return out
+
+
+def _same_file(a: str, b: str) -> bool:
+    if os.path.getsize(a) != os.path.getsize(b):
+        return False
+    with open(a, 'rb') as fa, open(b, 'rb') as fb:
+        while True:
+            x, y = fa.read(_GEN_CHUNK), fb.read(_GEN_CHUNK)
+            if x != y:
+                return False
+            if not x:
+                return True
+
+
+def _legacy_parts(prefix: str, stream: bytes, max_png_bytes: int) -> List[str]:
+    # legacy (manifest-less) parts so the scanners have to search instead of trusting part 0
+    writer = PngPartWriter(prefix, max_png_bytes=max_png_bytes)
+    writer.write(stream)
+    return writer.close()
+
+
+def _red_image(path: str, red: bytes) -> None:
+    # a single row, so no padding trails the red plane; alpha opaque, green/blue zero
+    rgba = bytearray(4 * len(red))
+    rgba[0::4] = red
+    rgba[3::4] = b'\xff' * len(red)
+    Image.frombytes('RGBA', (len(red), 1), bytes(rgba)).save(path, compress_level=1)
+
+
+def _scan_packet(comp: bytes, flags: int) -> bytes:
+    check = PacketCheck(bool(flags & FLAG_CHECK32)).update(comp)
+    header = struct.pack('>I I B 7s', len(comp) + check.trailer_size + 16, len(comp) + check.trailer_size, flags, b'\x00' * 7)
+    return header + comp + check.trailer(header)
+
+
+def scan_cases(work_dir: str, scan_size: int, repeat: int) -> List[Dict]:
+    with open(corpus_path(work_dir, 'json', scan_size), 'rb') as f:
+        raw = f.read()
+    comp = brotli.compress(raw, quality=5)
+    rng = random.Random('scan')
+    junk = bytes(b | 1 for b in rng.randbytes(1000))  # no zero runs: nothing in the prefix looks like a header
+    packet = _scan_packet(comp, 0)
+    broken = bytearray(packet)
+    broken[16 + len(comp) // 2] ^= 0xFF
+    # NUL padding after the packet (dumps padded to a fixed size): every offset there passes the
+    # reserved-bytes test, so it measures how cheaply the rest of the header scan rejects it
+    streams = [('shifted', junk + packet, 0), ('corrupted', junk + bytes(broken), 3), ('zero-padded', junk + packet + bytes(scan_size), 0)]
+    # plausible headers whose payload spans the real packet: every one costs a checksum pass,
+    # one in 256 gets through CRC-8 to Brotli; the check word stops them all
+    for label, flags in (('decoys', 0), ('decoys-check32', FLAG_CHECK32)):
+        pkt = _scan_packet(comp, flags)
+        decoys = b''.join(struct.pack('>I I B 7s', len(pkt) + (SCAN_DECOYS - i) * 32, len(pkt) + (SCAN_DECOYS - i) * 32 - 16, flags, b'\x00' * 7)
+                          + bytes(b | 1 for b in rng.randbytes(16)) for i in range(SCAN_DECOYS))
+        streams.append((label, decoys + pkt, 0))
+    out = []
+    for label, stream, expect in streams:
+        d = _fresh_dir(os.path.join(work_dir, 'scan', label))
+        _legacy_parts(os.path.join(d, 'p'), stream, max(1 << 16, len(stream) // 3))
+        pattern = os.path.join(d, 'p_part*.png')
+        out.append(measure(f'scan/{label}/{format_size(scan_size)}', [os.path.join(HERE, 'scan_and_decode_cortex.py'), pattern],
+                           repeat, scan_size, cwd=d, expect_exit=expect))
+
+    # raw Brotli in the red plane: at offset 0 for decode_red_brotli, behind the junk prefix
+    # for the offset scanner (which needs the plane's tail to be exactly one stream)
+    d = _fresh_dir(os.path.join(work_dir, 'scan', 'red'))
+    _red_image(os.path.join(d, 'red.png'), comp)
+    _red_image(os.path.join(d, 'shifted.png'), junk + comp)
+    out.append(measure(f'red/json/{format_size(scan_size)}', [os.path.join(HERE, 'decode_red_brotli.py'), os.path.join(d, 'red.png'), os.path.join(d, 'out.json')],
+                       repeat, scan_size, cwd=d))
+    out.append(measure(f'offsets/shifted/{format_size(scan_size)}', [os.path.join(HERE, 'scan_brotli_offsets.py'), os.path.join(d, 'shifted.png'), '--max-offset', str(len(junk))],
+                       repeat, scan_size, cwd=d))
+    return out
+
+
+PNG_CODECS = ('pillow', 'cxpk')
+
+
+def png_case(codec: str, op: str, src: str, png: str) -> None:
+    # child side of the png/* cases: one part written from, or read back to, raw bytes
+    with open(src, 'rb') as f:
+        raw = f.read()
+    width, height = full_part_geometry(len(raw))
+    raw = raw[:width * height * 3]
+    if op == 'write':
+        if codec == 'pillow':
+            Image.frombytes('RGB', (width, height), raw).save(png, format='PNG', compress_level=1)
+        else:
+            pngio.write_png(png, raw, width, height, 'RGB')
+        return
+    if codec == 'pillow':
+        with Image.open(png) as img:
+            img.load()
+            data = planes.image_buffer(img, 'RGB')
+    else:
+        with pngio.open_image(png) as img:
+            data = img.tobytes()
+    if data != raw:
+        raise SystemExit(f'{png}: pixels differ')
+
+
+def png_cases(work_dir: str, png_size: int, repeat: int) -> List[Dict]:
+    src = corpus_path(work_dir, 'random', png_size)
+    d = _fresh_dir(os.path.join(work_dir, 'png'))
+    out = []
+    for codec in PNG_CODECS:
+        png = os.path.join(d, f'{codec}.png')
+        for op in ('write', 'read'):
+            rec = measure(f'png/{codec}/{op}/{format_size(png_size)}', [os.path.abspath(__file__), 'png-case', codec, op, src, png], repeat, png_size)
+            if op == 'write':
+                rec['png_bytes'] = os.path.getsize(png) if os.path.exists(png) else None
+            out.append(rec)
+    shutil.rmtree(d, ignore_errors=True)
+    return out
+
+
+def environment() -> Dict:
+    env = {'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.machine(), 'cpus': os.cpu_count()}
+    for mod in ('brotli', 'PIL', 'numpy'):
+        try:
+            env[mod] = getattr(__import__(mod), '__version__', 'unknown')
+        except ImportError:
+            env[mod] = None
+    return env
+
+
+# --- comparison -----------------------------------------------------------
+
+def compare(baseline: Dict, results: Dict, tolerance: float = 0.10) -> List[Dict]:
+    """Per-case ratios against the baseline; 'regression' marks slower or bigger beyond tolerance."""
+    old = {r['name']: r for r in baseline.get('results', [])}
+    rows = []
+    for r in results.get('results', []):
+        b = old.get(r['name'])
+        if b is None:
+            continue
+        time_ratio = r['seconds'] / b['seconds'] if b['seconds'] else None
+        rss_ratio = r['max_rss_bytes'] / b['max_rss_bytes'] if b['max_rss_bytes'] else None
+        slow = time_ratio is not None and time_ratio > 1 + tolerance and max(r['seconds'], b['seconds']) >= NOISE_FLOOR_S
+        fat = rss_ratio is not None and rss_ratio > 1 + tolerance
+        rows.append({'name': r['name'], 'seconds': r['seconds'], 'baseline_seconds': b['seconds'],
+                     'time_ratio': round(time_ratio, 3) if time_ratio else None,
+                     'rss_ratio': round(rss_ratio, 3) if rss_ratio else None,
+                     'regression': bool(slow or fat or (b.get('ok', True) and not r.get('ok', True)))})
+    return rows
+
+
+def print_comparison(rows: List[Dict]) -> int:
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['name']:<44} {row['baseline_seconds']:>9.3f}s -> {row['seconds']:>9.3f}s  x{row['time_ratio'] or 0:<6} rss x{row['rss_ratio'] or 0:<6}{flag}")
+    bad = sum(r['regression'] for r in rows)
+    print(f'{len(rows)} cases compared, {bad} regressions')
+    return 1 if bad else 0
+
+
+def load_results(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('v') != RESULTS_VERSION:
+        raise SystemExit(f"{path}: unsupported results version {data.get('v')}")
+    return data
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> int:
+    p = argparse.ArgumentParser(prog=prog, description='Benchmark the Python Cortex codec and scanners')
+    sub = p.add_subparsers(dest='cmd', required=True)
+    run = sub.add_parser('run')
+    run.add_argument('--work-dir', default=DEFAULT_WORK_DIR, help='corpora and scratch parts (corpora are reused)')
+    run.add_argument('--corpora', default=','.join(CORPORA))
+    run.add_argument('--sizes', default='1K,1M,4M', help='comma-separated, 1K .. 500M')
+    run.add_argument('--qualities', default='11,5', help='--brotli-quality values; the first is used for part-size scaling')
+    run.add_argument('--max-png-bytes', default='200M,256K', help='part sizes; the first is used for quality scaling')
+    run.add_argument('--scan-size', default='1M', help='raw size behind the scanner cases (0 = skip)')
+    run.add_argument('--png-size', default='32M', help='raw bytes in the png/* cases (0 = skip)')
+    run.add_argument('--repeat', type=int, default=3)
+    run.add_argument('--out', default=None, help='results JSON (default: <work-dir>/results.json)')
+    run.add_argument('--baseline', default=None, help='compare against this results JSON; exit 1 on regressions')
+    run.add_argument('--tolerance', type=float, default=0.10)
+    cmp_ = sub.add_parser('compare')
+    cmp_.add_argument('baseline')
+    cmp_.add_argument('results')
+    cmp_.add_argument('--tolerance', type=float, default=0.10)
+    timed = sub.add_parser('time-case')  # internal: the child process of every case
+    timed.add_argument('result')
+    timed.add_argument('tool')
+    timed.add_argument('argv', nargs=argparse.REMAINDER)
+    case = sub.add_parser('png-case')  # internal: the tool main() of a png/* case
+    case.add_argument('codec', choices=PNG_CODECS)
+    case.add_argument('op', choices=('write', 'read'))
+    case.add_argument('src')
+    case.add_argument('png')
+    args = p.parse_args(argv)
+
+    if args.cmd == 'compare':
+        return print_comparison(compare(load_results(args.baseline), load_results(args.results), args.tolerance))
+    if args.cmd == 'time-case':
+        time_case(args.result, args.tool, args.argv)
+    if args.cmd == 'png-case':
+        png_case(args.codec, args.op, args.src, args.png)
+        return 0
+
+    corpora = [c for c in args.corpora.split(',') if c]
+    unknown = sorted(set(corpora) - set(CORPORA))
+    if unknown:
+        raise SystemExit(f'unknown corpora: {unknown} (have {sorted(CORPORA)})')
+    sizes = [parse_size(s) for s in args.sizes.split(',') if s]
+    qualities = [int(q) for q in args.qualities.split(',') if q]
+    part_sizes = [parse_size(s) for s in args.max_png_bytes.split(',') if s]
+    scan_size = parse_size(args.scan_size)
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    started = time.time()
+    results = codec_cases(args.work_dir, corpora, sizes, qualities, part_sizes, args.repeat)
+    if scan_size:
+        results += scan_cases(args.work_dir, scan_size, args.repeat)
+    png_size = parse_size(args.png_size)
+    if png_size:
+        results += png_cases(args.work_dir, png_size, args.repeat)
+    doc = {'v': RESULTS_VERSION, 'created': round(started, 3), 'elapsed': round(time.time() - started, 3),
+           'env': environment(), 'args': {k: v for k, v in vars(args).items() if k not in ('cmd', 'out', 'baseline')},
+           'results': results}
+    out = args.out or os.path.join(args.work_dir, 'results.json')
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(doc, f, indent=1)
+    print('Wrote', out)
+
+    status = 0 if all(r['ok'] for r in results) else 2
+    if args.baseline:
+        status = print_comparison(compare(load_results(args.baseline), doc, args.tolerance)) or status
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
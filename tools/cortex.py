@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+One entry point for the Cortex Python tools.
+
+Usage:
+  python tools/cortex.py <command> [args...]
+  python tools/cortex.py batch <FILE|-> [--fail-fast]
+  python tools/cortex.py <command> --help
+
+Commands run the existing tools' main() in this process; a tool's module
+(and with it Pillow, Brotli, NumPy) is imported only when its command
+runs, so --help and `inspect` start without them.
+
+`batch` reads one command line per line (shell quoting, # comments), runs
+them all in one process and prints one status line each, so a batch pays
+interpreter and import startup once. inspect and dump also take several
+inputs or --list FILE directly.
+
+  python tools/cortex.py encode in.bin out/pkt --target balanced
+  python tools/cortex.py decode "out/pkt_part*.png" in.copy
+  python tools/cortex.py inspect a.png b.png --list more.txt
+  python tools/cortex.py batch jobs.txt
+"""
+import importlib
+import shlex
+import sys
+import time
+from typing import List, Optional
+
+# command -> (module, leading argv, summary)
+COMMANDS = {
+    'encode': ('rgba_brotli_oc8', ['encode'], 'pack a file into Cortex PNG parts'),
+    'decode': ('rgba_brotli_oc8', ['decode'], 'rebuild a file from Cortex PNG parts'),
+    'archive': ('rgba_brotli_oc8', ['archive'], 'pack many files into one seekable part set'),
+    'list': ('rgba_brotli_oc8', ['list'], 'list archive members'),
+    'extract': ('rgba_brotli_oc8', ['extract'], 'extract archive members'),
+    'cache': ('rgba_brotli_oc8', ['cache'], 'decode cache statistics'),
+    'dict': ('rgba_brotli_oc8', ['dict'], 'train and list payload dictionaries'),
+    'scan': ('scan_and_decode_cortex', [], 'search parts for a Cortex header and decode it'),
+    'offsets': ('scan_brotli_offsets', [], 'search channel streams for a Brotli stream start'),
+    'inspect': ('inspect_qflush_png', [], 'show a dump PNG header and first bytes (--full: everything)'),
+    'dump': ('decode_qflush_dump', [], 'decode RGBA dump PNGs to raw/text'),
+    'red': ('decode_red_brotli', [], 'decode Brotli text stored in the red plane'),
+    'bus': ('cortex_bus_worker', [], 'serve the Cortex bus inbox'),
+    'bench': ('bench_cortex', [], 'benchmark the tools'),
+}
+
+
+def usage() -> str:
+    width = max(len(name) for name in COMMANDS)
+    lines = ['usage: cortex <command> [args...]', '       cortex batch <FILE|-> [--fail-fast]', '', 'commands:']
+    lines += [f'  {name:<{width}}  {summary}' for name, (_, _, summary) in COMMANDS.items()]
+    lines += [f'  {"batch":<{width}}  run one command per line of FILE in this process', '',
+              "'cortex <command> --help' for a command's options."]
+    return '\n'.join(lines)
+
+
+def run_command(argv: List[str]) -> int:
+    """Run one command line; returns its exit status instead of exiting."""
+    name, rest = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(f'cortex: unknown command {name!r}\n\n{usage()}', file=sys.stderr)
+        return 2
+    module, lead, _ = COMMANDS[name]
+    prog = 'cortex' if lead else f'cortex {name}'
+    try:
+        rc = importlib.import_module(module).main(lead + rest, prog=prog)
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            print(e.code, file=sys.stderr)
+            return 1
+        rc = e.code
+    return rc or 0
+
+
+def batch(argv: List[str]) -> int:
+    from oc8.cli import read_list
+    fail_fast = '--fail-fast' in argv
+    paths = [a for a in argv if a != '--fail-fast']
+    if len(paths) != 1:
+        print('usage: cortex batch <FILE|-> [--fail-fast]', file=sys.stderr)
+        return 2
+    lines = read_list(paths[0])
+    failed = 0
+    for i, line in enumerate(lines, 1):
+        start = time.perf_counter()
+        try:
+            rc = run_command(shlex.split(line))
+        except Exception as e:  # one bad job must not end the batch
+            print(f'cortex: {type(e).__name__}: {e}', file=sys.stderr)
+            rc = 1
+        ms = (time.perf_counter() - start) * 1000
+        print(f'[batch {i}/{len(lines)}] rc={rc} {ms:.0f} ms: {line}', flush=True)
+        if rc:
+            failed += 1
+            if fail_fast:
+                break
+    print(f'[batch] {len(lines) - failed} ok, {failed} failed')
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0 if argv else 2
+    if argv[0] == 'batch':
+        return batch(argv[1:])
+    return run_command(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Serve the Cortex bus inbox (.qflush/cortex/inbox -> .qflush/cortex/outbox).
+
+Same message format as src/cortex/bus.ts, but event driven (inotify on
+Linux, a short poll elsewhere) and decoding/encoding in a process pool,
+so a message is answered in milliseconds instead of up to 500 ms later.
+
+Built-in commands: ping, echo. Anything else goes to --handler
+module:function(cmd, args) (importable from tools/), or is answered with
+ok=false. Shell commands stay with the TS executor and its policy, so this
+is not a drop-in replacement for src/cortex/bus.ts: stop the TS bus (the
+daemon's --use-cortex / QFLUSH_USE_CORTEX) before serving its inbox here.
+Both take .qflush/cortex/inbox.lock, so whichever starts second refuses
+to run instead of racing the other for the same files.
+
+Usage:
+  python tools/cortex_bus_worker.py [--jobs N] [--max-in-flight N] [--max-queue N]
+                                    [--handler module:function] [--once] [--poll]
+                                    [--stats .qflush/cortex/worker-stats.json]
+  python tools/cortex_bus_worker.py send <cmd> [args...] [--wait SECONDS]
+
+Counters (received, processed, failed, replayed, queue depth, backpressure,
+latency p50/p95/p99) are rewritten to the stats file every --stats-interval
+seconds and printed on exit.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+import uuid
+from typing import List, Optional
+
+from oc8 import bus
+
+
+def send(args: argparse.Namespace) -> int:
+    ident = uuid.uuid4().hex
+    name = ident + '.png'
+    bus.write_message({'id': ident, 'cmd': args.cmd, 'args': args.args}, os.path.join(args.inbox, name))
+    if not args.wait:
+        print(name)
+        return 0
+    out = os.path.join(args.outbox, name)
+    deadline = time.monotonic() + args.wait
+    while not os.path.exists(out):
+        if time.monotonic() > deadline:
+            print(f'no response after {args.wait}s', file=sys.stderr)
+            return 1
+        time.sleep(0.005)
+    with open(out, 'rb') as f:
+        response = bus.decode_message(f.read())
+    os.remove(out)
+    print(json.dumps(response))
+    return 0 if response.get('ok') else 1
+
+
+def serve(args: argparse.Namespace) -> int:
+    worker = bus.BusWorker(args.inbox, args.outbox, jobs=args.jobs, max_in_flight=args.max_in_flight,
+                           max_queue=args.max_queue, handler=args.handler, stats_path=args.stats or None,
+                           stats_interval=args.stats_interval, poll_interval=args.poll_interval,
+                           force_poll=args.poll)
+    signal.signal(signal.SIGTERM, worker.stop)
+    try:
+        stats = worker.run(once=args.once)
+    except bus.BusError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        stats = worker.stats()
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> int:
+    ap = argparse.ArgumentParser(prog=prog, description='Cortex bus inbox worker')
+    ap.add_argument('--inbox', default=bus.INBOX)
+    ap.add_argument('--outbox', default=bus.OUTBOX)
+    sub = ap.add_subparsers(dest='command')
+    s = sub.add_parser('send', help='drop a request in the inbox (and optionally wait for the answer)')
+    s.add_argument('cmd')
+    s.add_argument('args', nargs='*')
+    s.add_argument('--wait', type=float, default=0, help='seconds to wait for the response (0: do not wait)')
+    ap.add_argument('--jobs', type=int, default=0, help='worker processes (default: CPU count)')
+    ap.add_argument('--max-in-flight', type=int, default=0, help='messages in the pool at once (default: 2 x jobs)')
+    ap.add_argument('--max-queue', type=int, default=1024, help='names queued in memory; beyond that files wait on disk')
+    ap.add_argument('--handler', default=None, help='module:function(cmd, args) for non built-in commands')
+    ap.add_argument('--once', action='store_true', help='serve what is in the inbox, then exit')
+    ap.add_argument('--poll', action='store_true', help='poll the inbox even where inotify is available')
+    ap.add_argument('--poll-interval', type=float, default=0.05)
+    ap.add_argument('--stats', default=bus.STATS, help='stats JSON path ("" to disable)')
+    ap.add_argument('--stats-interval', type=float, default=1.0)
+    args = ap.parse_args(argv)
+    if args.command == 'send':
+        return send(args)
+    return serve(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,36 +1,88 @@
 #!/usr/bin/env python3
 """
-Decode a PNG containing an RGBA raw dump into raw and optional text files.
+Decode PNGs containing an RGBA raw dump into raw and optional text files.
 Usage:
-  python tools/decode_qflush_dump.py <input_png> [--raw-output out.raw] [--txt-output out.txt]
+  python tools/decode_qflush_dump.py <input_png> [--raw-output out.raw] [--txt-output out.txt] [--band-rows N]
+  python tools/decode_qflush_dump.py <input_png>... [--list FILE] [--band-rows N]
 
 If no outputs are specified defaults are used: <basename>.raw and <basename>.txt
+(always the case with several inputs).
+
+Rows are decoded a band at a time and written straight to the raw file, so
+memory stays at about one band whatever the dump size. The text guess is
+the raw file up to where its trailing NULs start, found by scanning the
+memory-mapped raw output backward.
 """
-from PIL import Image
 import argparse
+import mmap
 import os
+import shutil
+import sys
+from typing import List, Optional
+
+from oc8 import rows
+from oc8.cli import inputs_from
+
+_COPY_CHUNK = 1 << 20
+
+
+def copy_prefix(src_path: str, dst_path: str, length: int) -> None:
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        left = length
+        while left:
+            chunk = src.read(min(left, _COPY_CHUNK))
+            if not chunk:
+                break
+            dst.write(chunk)
+            left -= len(chunk)
+
+
+def text_length(raw_path: str) -> int:
+    size = os.path.getsize(raw_path)
+    if size == 0:
+        return 0
+    with open(raw_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        return rows.trailing_nul_start(m)
+
+
+def dump(inp: str, raw_out: Optional[str] = None, txt_out: Optional[str] = None, band_rows: Optional[int] = None) -> None:
+    base = os.path.splitext(os.path.basename(inp))[0]
+    raw_out = raw_out or f"{base}.raw"
+    txt_out = txt_out or f"{base}.txt"
+
+    # 4 bytes per pixel: R,G,B,A
+    with open(raw_out, "wb") as f:
+        for band in rows.iter_rgba_bands(inp, band_rows=band_rows):
+            f.write(band)
 
-p = argparse.ArgumentParser(description='Decode RGBA PNG dump to raw/text')
-p.add_argument('input_png')
-p.add_argument('--raw-output', default=None)
-p.add_argument('--txt-output', default=None)
-args = p.parse_args()
+    # If it was originally UTF-8 text stored in the dump, strip trailing nulls and write
+    end = text_length(raw_out)
+    if end == os.path.getsize(raw_out):
+        shutil.copyfile(raw_out, txt_out)
+    else:
+        copy_prefix(raw_out, txt_out, end)
 
-inp = args.input_png
-base = os.path.splitext(os.path.basename(inp))[0]
-raw_out = args.raw_output or f"{base}.raw"
-txt_out = args.txt_output or f"{base}.txt"
+    print(f"Wrote raw dump: {raw_out}")
+    print(f"Wrote text guess: {txt_out} (strip trailing NULs)")
 
-img = Image.open(inp).convert("RGBA")
-data = img.tobytes()  # 4 bytes per pixel: R,G,B,A
 
-with open(raw_out, "wb") as f:
-    f.write(data)
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> int:
+    p = argparse.ArgumentParser(prog=prog, description='Decode RGBA PNG dump to raw/text')
+    p.add_argument('input_png', nargs='*')
+    p.add_argument('--list', default=None, metavar='FILE', help="also decode the PNGs listed in FILE ('-' for stdin)")
+    p.add_argument('--raw-output', default=None)
+    p.add_argument('--txt-output', default=None)
+    p.add_argument('--band-rows', type=int, default=None, help='rows decoded per step (default: ~256 KiB of scanlines)')
+    args = p.parse_args(argv)
+    inputs = inputs_from(args.input_png, args.list)
+    if not inputs:
+        p.error('no input PNG given')
+    if len(inputs) > 1 and (args.raw_output or args.txt_output):
+        p.error('--raw-output/--txt-output need a single input')
+    for inp in inputs:
+        dump(inp, args.raw_output, args.txt_output, args.band_rows)
+    return 0
 
-# If it was originally UTF-8 text stored in the dump, strip trailing nulls and write
-text_bytes = data.rstrip(b"\x00")
-with open(txt_out, "wb") as f:
-    f.write(text_bytes)
 
-print(f"Wrote raw dump: {raw_out}")
-print(f"Wrote text guess: {txt_out} (strip trailing NULs)")
+if __name__ == '__main__':
+    sys.exit(main())
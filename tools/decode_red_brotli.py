@@ -1,44 +1,60 @@
 #!/usr/bin/env python3
-import sys
-from PIL import Image
+"""
+Decode a Brotli stream stored in the red plane of RGBA PNGs into UTF-8 text.
+Usage: python tools/decode_red_brotli.py <png_glob> <out_json>
+"""
 import glob
-import brotli
-
-if len(sys.argv) < 3:
-    print('Usage: decode_red_brotli.py <png_glob> <out_json>')
-    sys.exit(2)
-
-png_glob = sys.argv[1]
-out_path = sys.argv[2]
-
-paths = sorted(glob.glob(png_glob))
-if not paths:
-    print('No PNGs match', png_glob)
-    sys.exit(3)
-
-reds = bytearray()
-for p in paths:
-    img = Image.open(p).convert('RGBA')
-    data = img.tobytes()
-    # RGBA stride 4, red at offset 0
-    for i in range(0, len(data), 4):
-        reds.append(data[i])
-
-try:
-    decompressed = brotli.decompress(bytes(reds))
-except Exception as e:
-    print('Brotli decompression failed:', e)
-    sys.exit(4)
-
-try:
-    text = decompressed.decode('utf-8')
-except Exception as e:
-    print('UTF-8 decode failed:', e)
-    sys.exit(5)
-
-# write out
-with open(out_path, 'w', encoding='utf-8') as f:
-    f.write(text)
-
-print('Wrote', out_path)
-print(text)
+import sys
+from typing import List, Optional
+
+
+def decode_red(paths: List[str]) -> bytes:
+    import brotli
+    from PIL import Image
+    from oc8 import planes
+
+    reds = bytearray()
+    for p in paths:
+        data = planes.image_buffer(Image.open(p), 'RGBA')
+        # RGBA stride 4, red at offset 0
+        reds += planes.plane_bytes(data, planes.CHANNEL_INDEX['R'])
+    return brotli.decompress(bytes(reds))
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        print(f"Usage: {prog or 'decode_red_brotli.py'} <png_glob> <out_json>")
+        return 2
+
+    png_glob = argv[0]
+    out_path = argv[1]
+
+    paths = sorted(glob.glob(png_glob))
+    if not paths:
+        print('No PNGs match', png_glob)
+        return 3
+
+    try:
+        decompressed = decode_red(paths)
+    except Exception as e:
+        print('Brotli decompression failed:', e)
+        return 4
+
+    try:
+        text = decompressed.decode('utf-8')
+    except Exception as e:
+        print('UTF-8 decode failed:', e)
+        return 5
+
+    # write out
+    with open(out_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+    print('Wrote', out_path)
+    print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
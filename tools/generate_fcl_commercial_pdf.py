@@ -1,14 +1,53 @@
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import cm
+#!/usr/bin/env python3
+"""
+FCL commercial license PDFs.
+
+Usage:
+  python tools/generate_fcl_commercial_pdf.py
+  python tools/generate_fcl_commercial_pdf.py batch <licensees.csv|json> <output_dir> [--template FILE] [--filename PATTERN] [--logo PNG] [--jobs N]
+
+Without arguments, writes the generic license to installers/FCL_Commercial_License.pdf.
+
+``batch`` renders one PDF per licensee. Licensees come from a CSV with a header row or a
+JSON list of objects. Every field is available to the text template and the file name
+pattern as ``$field`` (string.Template). ``$index`` (1-based) is always set, and ``$issued``
+defaults to today. The default template is the license text with a licensee block
+(``$name``, ``$license_id``, ``$issued``).
+
+Each worker process opens the logo once as an ``ImageReader``, which keeps the decoded
+pixels, and every document draws it with ``canvas.drawImage``. So the PNG is decoded once
+per worker, and each PDF only deflates the pixels into its own image stream. Batch workers
+write binary streams (``rl_config.useA85 = 0``): ASCII85 costs more time than deflating
+the logo and makes it a quarter larger. Rendering runs on a process pool (``--jobs``,
+default: all cores). Output file names keep only letters, digits, '.', '-' and '_'.
+
+Requires: reportlab (Pillow for the PNG logo)
+"""
+
+import argparse
+import csv
+import datetime
+import json
 import os
+import re
+import string
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
 
-styles = getSampleStyleSheet()
-story = []
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable, Paragraph, SimpleDocTemplate, Spacer
 
-base_dir = os.path.dirname(__file__)
+base_dir = os.path.dirname(os.path.abspath(__file__))
 logo_path = os.path.join(base_dir, '..', 'installers', 'funesterie_logo.png')  # resolved relative path
+output_path = os.path.join(base_dir, '..', 'installers', 'FCL_Commercial_License.pdf')
+
+LOGO_SIZE = 8 * cm
 
 text = """FUNESTERIE COMMERCIAL LICENSE (FCL-PRO 1.0)
 
@@ -33,25 +72,172 @@ To purchase a commercial license for FCL:
 https://cellaurojeff.gumroad.com/l/jxktq
 """
 
-# Add logo if available
-try:
-    if os.path.exists(logo_path):
-        img = Image(logo_path, width=8*cm, height=8*cm)
-        story.append(img)
-    else:
-        print('Logo not found at', logo_path)
-except Exception as e:
-    print('Logo failed to load:', e)
+_title, _, _body = text.partition('\n\n')
+# batch default: the same text with the licensee named under the title ($ in the text itself escaped)
+TEMPLATE = _title + """
 
-story.append(Spacer(1, 12))
-story.append(Paragraph(text.replace("\n", "<br/>"), styles["Normal"]))
-story.append(Spacer(1, 12))
+Licensee: $name
+License ID: $license_id
+Issued: $issued
 
-output_path = os.path.join(base_dir, '..', 'installers', 'FCL_Commercial_License.pdf')
+""" + _body.replace('$', '$$')
+FILENAME = 'FCL_Commercial_License_$index.pdf'
+
+styles = getSampleStyleSheet()
+
+# set per worker process by _init_worker
+_logo: Optional[ImageReader] = None
+_template: Optional[string.Template] = None
+_filename: Optional[string.Template] = None
+_output_dir = ''
+
+
+def load_logo(path: str, quiet: bool = False) -> Optional[ImageReader]:
+    """The logo with its pixels decoded (ImageReader caches them for every later drawImage), or None if unreadable."""
+    try:
+        reader = ImageReader(path)
+        reader.getRGBData()
+        return reader
+    except Exception as e:
+        if not quiet:
+            print('Logo failed to load:', e)
+        return None
+
+
+class Logo(Flowable):
+    """Draws an ImageReader, alpha as a soft mask; the reader is shared by every document of a worker."""
+
+    def __init__(self, image: ImageReader, width: float = LOGO_SIZE, height: float = LOGO_SIZE) -> None:
+        super().__init__()
+        self.image = image
+        self.width = width
+        self.height = height
+        self.hAlign = 'CENTER'
+
+    def wrap(self, available_width, available_height):
+        return self.width, self.height
+
+    def draw(self) -> None:
+        self.canv.drawImage(self.image, 0, 0, self.width, self.height, mask='auto')
+
+
+def build_story(body: str, logo: Optional[ImageReader]) -> List:
+    story = []
+    if logo is not None:
+        story.append(Logo(logo))
+    story.append(Spacer(1, 12))
+    story.append(Paragraph(body.replace("\n", "<br/>"), styles["Normal"]))
+    story.append(Spacer(1, 12))
+    return story
+
+
+def write_pdf(path: str, body: str, logo: Optional[ImageReader]) -> None:
+    doc = SimpleDocTemplate(path, pagesize=A4)
+    doc.build(build_story(body, logo))
+
+
+def load_licensees(path: str) -> List[Dict[str, str]]:
+    """Licensee records from a CSV file (header row) or a JSON list of objects."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.json'):
+            entries = json.load(f)
+            if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+                raise ValueError(f'{path}: expected a JSON list of objects')
+        else:
+            entries = list(csv.DictReader(f))
+    today = datetime.date.today().isoformat()
+    out = []
+    for i, entry in enumerate(entries, 1):
+        fields = {'issued': today}
+        fields.update({str(k): '' if v is None else str(v) for k, v in entry.items()})
+        fields['index'] = str(i)
+        out.append(fields)
+    return out
+
+
+def _init_worker(logo: Optional[str], template: str, filename: str, output_dir: str) -> None:
+    global _logo, _template, _filename, _output_dir
+    rl_config.useA85 = 0
+    _logo = load_logo(logo, quiet=True) if logo else None
+    _template, _filename, _output_dir = string.Template(template), string.Template(filename), os.path.abspath(output_dir)
+
+
+def output_name(pattern: string.Template, fields: Dict[str, str]) -> str:
+    """File name from the pattern: anything but letters, digits, '.', '-' and '_' becomes '_'."""
+    name = re.sub(r'[^\w.-]', '_', pattern.substitute(fields))
+    if not name or name.startswith('.'):
+        raise ValueError(f'bad output file name {name!r}')
+    return name
+
+
+def _render_entry(fields: Dict[str, str]) -> Tuple[str, Optional[str]]:
+    # (output path or entry index, error); a bad entry does not stop the batch
+    try:
+        path = os.path.join(_output_dir, output_name(_filename, fields))
+        if os.path.dirname(path) != _output_dir:
+            raise ValueError(f'{path} is outside {_output_dir}')
+        body = _template.substitute({k: escape(v) for k, v in fields.items()})
+        write_pdf(path, body, _logo)
+        return path, None
+    except KeyError as e:
+        return f"entry {fields.get('index')}", f'no field {e} for the template or file name'
+    except Exception as e:
+        return f"entry {fields.get('index')}", f'{type(e).__name__}: {e}'
+
+
+def render_batch(entries: List[Dict[str, str]], output_dir: str, template: str = TEMPLATE, filename: str = FILENAME, logo: Optional[str] = None, jobs: Optional[int] = None) -> List[Tuple[str, Optional[str]]]:
+    """Render one PDF per entry into output_dir; (path, None) or (entry, error) per entry, in input order.
+
+    ``logo`` is the path of a PNG every worker opens once (None: no logo).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = min(jobs or os.cpu_count() or 1, max(1, len(entries)))
+    initargs = (logo, template, filename, output_dir)
+    if jobs <= 1:
+        _init_worker(*initargs)
+        return [_render_entry(e) for e in entries]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=initargs) as pool:
+        # a few chunks per worker: one task per PDF would cost more in IPC than in rendering
+        return list(pool.map(_render_entry, entries, chunksize=max(1, len(entries) // (jobs * 4))))
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> int:
+    p = argparse.ArgumentParser(prog=prog, description='FCL commercial license PDF generator')
+    sub = p.add_subparsers(dest='cmd')
+    bat = sub.add_parser('batch', help='one PDF per licensee from a CSV/JSON file')
+    bat.add_argument('licensees', help='CSV with a header row, or a JSON list of objects')
+    bat.add_argument('output_dir')
+    bat.add_argument('--template', default=None, metavar='FILE', help='license text with $field placeholders (default: the FCL-PRO text with a licensee block)')
+    bat.add_argument('--filename', default=FILENAME, metavar='PATTERN', help=f'output file name pattern (default {FILENAME})')
+    bat.add_argument('--logo', default=logo_path)
+    bat.add_argument('--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    args = p.parse_args(argv)
+
+    if args.cmd is None:
+        logo = load_logo(logo_path) if os.path.exists(logo_path) else None
+        if logo is None and not os.path.exists(logo_path):
+            print('Logo not found at', logo_path)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        write_pdf(output_path, text, logo)
+        print('Written', output_path)
+        return 0
 
-os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    template = TEMPLATE
+    if args.template:
+        with open(args.template, 'r', encoding='utf-8') as f:
+            template = f.read()
+    entries = load_licensees(args.licensees)
+    # checked here so a bad logo is reported once, not by every worker
+    logo = args.logo if os.path.exists(args.logo) and load_logo(args.logo) is not None else None
+    if not os.path.exists(args.logo):
+        print('Logo not found at', args.logo)
+    results = render_batch(entries, args.output_dir, template, args.filename, logo, args.jobs)
+    failed = [(what, err) for what, err in results if err]
+    for what, err in failed:
+        print(f'FAILED {what}: {err}')
+    print(f'Written {len(results) - len(failed)} of {len(results)} PDFs to {args.output_dir}')
+    return 1 if failed else 0
 
-doc = SimpleDocTemplate(output_path, pagesize=A4)
-doc.build(story)
 
-print('Written', output_path)
+if __name__ == '__main__':
+    sys.exit(main())
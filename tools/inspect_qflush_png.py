@@ -1,42 +1,133 @@
 #!/usr/bin/env python3
-from PIL import Image
-import sys, os
-p = 'parts/qflush-code-dump.png'
-if len(sys.argv) > 1:
-    p = sys.argv[1]
-if not os.path.exists(p):
-    print('file not found:', p)
-    sys.exit(2)
-img = Image.open(p).convert('RGBA')
-print('image:', p, 'size=', img.size, 'mode=', img.mode)
-data = img.tobytes()
-print('total bytes:', len(data))
-# print first bytes hex
-print('first 128 bytes (hex):', data[:128].hex())
-# try to strip trailing NULs and decode
-trim = data.rstrip(b"\x00")
-print('trimmed length:', len(trim))
-try:
-    txt = trim.decode('utf-8')
-    print('decoded utf-8 length:', len(txt))
-    print('preview (first 500 chars):')
-    print(txt[:500])
-    outdir = os.path.join('.qflush','incoming')
+"""
+Inspect qflush dump PNGs.
+Usage: python tools/inspect_qflush_png.py [png...] [--list FILE] [--full]
+
+By default only the PNG header and the first rows are decoded (size, first
+128 bytes, a text preview), so inspecting a dump of any size takes
+milliseconds, and Pillow is not even imported for RGB/RGBA dumps.
+--full streams every row once: trimmed length, UTF-8 check, and the guess
+written to .qflush/incoming/dump_guess.txt.
+"""
+import argparse
+import codecs
+import os
+import sys
+from typing import List, Optional
+
+from oc8 import rows
+from oc8.cli import inputs_from
+
+MARKER = b'qflush code dump generated'
+PREVIEW_BYTES = 2048
+
+
+def inspect_full(p: str) -> int:
+    outdir = os.path.join('.qflush', 'incoming')
     os.makedirs(outdir, exist_ok=True)
     outpath = os.path.join(outdir, 'dump_guess.txt')
-    with open(outpath, 'wb') as f:
-        f.write(trim)
-    print('wrote guess to', outpath)
-except Exception as e:
-    print('utf-8 decode failed:', e)
-    # also try to search for ASCII marker in bytes
-    marker = b'qflush code dump generated'
-    idx = data.find(marker)
-    print('marker found at:', idx)
-    if idx != -1:
-        snippet = data[idx: idx+512]
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pos = 0
+    end = 0  # trimmed length: start of the trailing NULs
+    chars = 0
+    error = None
+    preview = ''
+    marker_at = -1
+    snippet = b''
+    tail = b''  # last bytes of the previous band, so the marker is found across band edges
+    head = b''
+    with open(outpath, 'wb') as out:
+        for band in rows.iter_rgba_bands(p):
+            out.write(band)
+            if len(head) < 128:
+                head += band[:128 - len(head)]
+            kept = rows.trailing_nul_start(band)
+            if kept:
+                end = pos + kept
+            if error is None:
+                try:
+                    text = decoder.decode(band)
+                    chars += len(text)
+                    if len(preview) < 500:
+                        preview += text[:500 - len(preview)]
+                except UnicodeDecodeError as e:
+                    error = f"'utf-8' codec can't decode byte 0x{e.object[e.start]:02x} in position {pos + e.start}: {e.reason}"
+            if marker_at == -1:
+                idx = (tail + band).find(MARKER)
+                if idx != -1:
+                    marker_at = pos - len(tail) + idx
+                    snippet = (tail + band)[idx:idx + 512]
+                tail = band[-(len(MARKER) - 1):]
+            elif len(snippet) < 512:
+                snippet += band[:512 - len(snippet)]
+            pos += len(band)
+        out.truncate(end)
+    if error is None:
         try:
-            print(snippet.decode('utf-8', errors='replace')[:500])
-        except:
-            pass
-    sys.exit(0)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError as e:
+            error = f'truncated utf-8 sequence at the end: {e.reason}'
+
+    print('total bytes:', pos)
+    print('first 128 bytes (hex):', head.hex())
+    print('trimmed length:', end)
+    if error is None:
+        # trailing NULs decode to NUL characters; the guess file stops before them
+        print('decoded utf-8 length:', chars - (pos - end))
+        print('preview (first 500 chars):')
+        print(preview)
+        print('wrote guess to', outpath)
+        return 0
+    os.remove(outpath)
+    print('utf-8 decode failed:', error)
+    # also try to search for ASCII marker in bytes
+    print('marker found at:', marker_at)
+    if marker_at != -1:
+        print(snippet.decode('utf-8', errors='replace')[:500])
+    return 0
+
+
+def inspect(p: str, full: bool = False) -> int:
+    if not os.path.exists(p):
+        print('file not found:', p)
+        return 2
+    info = rows.read_info(p)  # header only; no pixel data is decoded here
+    mode = info.mode
+    if mode is None:
+        from PIL import Image
+        with Image.open(p) as img:
+            mode = img.mode
+    w, h = info.width, info.height
+    print('image:', p, 'size=', (w, h), 'mode=', mode)
+    if full:
+        return inspect_full(p)
+
+    head = rows.read_rgba_prefix(p, PREVIEW_BYTES)
+    print('total bytes:', w * h * 4)
+    # print first bytes hex
+    print('first 128 bytes (hex):', head[:128].hex())
+    print('preview (first 500 chars):')
+    print(head.rstrip(b'\x00').decode('utf-8', errors='replace')[:500])
+    print('(first rows only; --full for trimmed length, UTF-8 check and the guess file)')
+    return 0
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> int:
+    ap = argparse.ArgumentParser(prog=prog, description='Inspect qflush dump PNGs')
+    ap.add_argument('png', nargs='*', help='default: parts/qflush-code-dump.png')
+    ap.add_argument('--list', default=None, metavar='FILE', help="also inspect the paths listed in FILE ('-' for stdin)")
+    ap.add_argument('--full', action='store_true', help='stream the whole image: trimmed length, UTF-8 check, write the guess file')
+    args = ap.parse_args(argv)
+    paths = inputs_from(args.png, args.list)
+    if not paths:
+        paths = ['parts/qflush-code-dump.png']
+    rc = 0
+    for i, p in enumerate(paths):
+        if i:
+            print()
+        rc = max(rc, inspect(p, args.full))
+    return rc
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,6 @@
+"""
+Shared helpers for the Cortex RGBA + Brotli + OC8 Python tools.
+
+Submodules are imported on demand so that light callers (CRC only, header
+parsing) do not pay for Pillow / Brotli / NumPy imports.
+"""
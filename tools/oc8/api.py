@@ -0,0 +1,228 @@
+"""
+In-memory Cortex encode/decode for code that embeds the codec.
+
+  from oc8.api import encode, decode
+  parts = encode(data)                 # list of PNG bytes, one per part
+  images = encode(data, images=True)   # Pillow images, manifest in img.info
+  raw = decode(parts)                  # memoryview of the original bytes
+
+``encode`` takes any buffer (bytes, bytearray, mmap, memoryview, NumPy
+array) and compresses it through a memoryview, without a bytes copy of the
+input. Parts stay in memory unless an ``output_prefix`` names files.
+
+``decode`` takes parts as paths, PNG bytes in any buffer or open images
+(one part or a list, in any order when they carry manifests). PNG bytes
+are read in place (``oc8.rows.open_png``) and the output is decoded into a
+single growing buffer that is returned as a view, not copied out.
+``decode_to`` writes into any binary file instead, so the CLI streams to
+disk with the same code; ``find_packet`` is the header scan behind the
+legacy fallbacks. ``BlockReader``/``ArchiveReader`` take the same part
+sources for range reads and archive members.
+
+Nothing here prints; what was found comes back as an info dict
+(``strategy`` plus order/offset/layout details).
+"""
+
+from __future__ import annotations
+import io
+from collections import Counter
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+import brotli
+
+from oc8 import planes, pngio, rows, trace
+from oc8.blocks import decompress_blocks, write_blocks
+from oc8.codecs import Dictionary, DictionaryStore, codec_flags, codec_name, decode_region, encode_region
+from oc8.delta import DeltaBase, apply_delta, build_delta
+from oc8.headers import FLAG_DELTA, HEADER_SIZE, HeaderCandidate, find_header_candidates, format_stats, parse_header, payload_kind, trailer_size, verify_payload
+from oc8.manifest import plan_parts, read_manifest, stream_id_for, verified_part_data
+from oc8.parts import PngPartWriter, write_packet
+from oc8.pipeline import PacketStreamDecoder, detect_layout, iter_part_streams
+
+
+DEFAULT_MAX_PNG_BYTES = 200 * 1024 * 1024
+
+
+def encode(data, output_prefix: Optional[str] = None, quality: int = 11, lgwin: int = 22, mode: int = brotli.MODE_GENERIC, codec: str = 'brotli', level: Optional[int] = None, dictionary: Optional[Dictionary] = None,
+           block_size: int = 0, base: Optional[Sequence[bytes]] = None, layout: str = 'rgb', check32: bool = False, max_png_bytes: int = DEFAULT_MAX_PNG_BYTES, max_width: int = 4096,
+           manifest: bool = True, compress_level: int = 0, jobs: int = 1, images: bool = False) -> List:
+    """Cortex parts of ``data``: PNG bytes, Pillow images (images=True) or, with output_prefix, file names.
+
+    One Brotli stream by default; ``codec``/``level``/``dictionary`` pick another payload codec
+    (plain packets only), ``block_size`` a block-framed packet, ``base`` a delta packet against
+    those byte sources.
+    """
+    view = memoryview(data).cast('B')
+    opts = dict(max_png_bytes=max_png_bytes, max_width=max_width, compress_level=compress_level, jobs=jobs, images=images)
+    if (block_size or base is not None) and (codec != 'brotli' or dictionary is not None):
+        raise ValueError('codec and dictionary apply to plain packets (not block_size or base)')
+    if block_size:
+        writer = PngPartWriter(output_prefix, hold_first=True, stream_id=stream_id_for(view) if manifest else None, layout=layout, **opts)
+        blocks = (view[i:i + block_size] for i in range(0, len(view), block_size))
+        return write_blocks(writer, blocks, block_size, quality, jobs=jobs, lgwin=lgwin, brotli_mode=mode, check32=check32)
+    if base is not None:
+        with trace.span('delta_base', sources=len(base)):
+            delta_base = DeltaBase(base)
+        region, _ = build_delta(view, delta_base, quality)
+        flags = FLAG_DELTA
+    elif codec == 'brotli' and dictionary is None:
+        with trace.span('brotli_compress', bytes=len(view), quality=quality):
+            region = brotli.compress(view, quality=quality, lgwin=lgwin, mode=mode)
+        flags = 0
+    else:
+        with trace.span(f'{codec}_compress', bytes=len(view), level=level):
+            region = encode_region(view, codec, level, dictionary)
+        flags = codec_flags(codec, dictionary)
+    return write_packet(output_prefix, region, flags, check32, manifest, layout, **opts)
+
+
+def decode(parts, jobs: int = 1, dictionaries: Optional[DictionaryStore] = None, base: Optional[Sequence[bytes]] = None) -> memoryview:
+    """Original bytes of the packet carried by ``parts`` (see the module docstring), as a view."""
+    out = io.BytesIO()
+    decode_to(parts, out, jobs=jobs, dictionaries=dictionaries, base=base)
+    return out.getbuffer()
+
+
+def decode_to(parts, out: BinaryIO, jobs: int = 1, dictionaries: Optional[DictionaryStore] = None, base: Optional[Sequence[bytes]] = None) -> Dict:
+    """Decode ``parts`` into the seekable binary file ``out``; returns how the packet was found.
+
+    Parts with a cortex-part manifest are ordered, verified and decoded in one pass. Legacy parts
+    try the streaming pipeline first (header at offset 0, layout read from the header flags), then
+    every extraction strategy and part order with a header scan. Output of a failed attempt is
+    truncated away before the next one.
+    """
+    parts = _part_list(parts)
+    if not parts:
+        raise ValueError('no parts to decode')
+    start = out.tell()
+    plan = plan_parts(parts)
+    if plan is not None:
+        with trace.span('attempt', strategy='manifest', order='manifest'):
+            _decode_stream(out, iter_part_streams([p for p, _ in plan], _verified_layout_bytes, prefetch=jobs), jobs, dictionaries, base, stop=False)
+        trace.note(strategy='manifest', attempts=1)
+        return {'strategy': 'manifest', 'stream': plan[0][1]['stream'], 'parts': len(plan)}
+
+    layout = detect_layout(parts[0])
+    try:
+        with trace.span('attempt', strategy='pipeline', order='normal', layout=layout):
+            _decode_stream(out, iter_part_streams(parts, lambda img: planes.layout_bytes(img, layout), prefetch=jobs), jobs, dictionaries, base, stop=True)
+        trace.note(strategy='pipeline', layout=layout, attempts=1)
+        return {'strategy': 'pipeline', 'order': 'normal', 'offset': 0, 'endian': 'be', 'layout': layout}
+    except (ValueError, brotli.error) as e:
+        errors = [('pipeline', 'normal', str(e))]
+    _rewind(out, start)
+
+    # Try multiple extraction strategies to be robust against RGB/RGBA variations and ordering
+    # (name, extractor, layout of the extracted bytes)
+    strategies = [
+        ('rgb', planes.rgb_from_image, 'rgb'),
+        ('rgba_strip_alpha', planes.rgb_from_rgba_image, 'rgb'),
+    ]
+    if any(_part_mode(p) == 'RGBA' for p in parts):
+        # RGBA carrier whose header is not at the start of part 0 (shifted or reordered parts)
+        strategies.append(('rgba', lambda img: planes.image_buffer(img, 'RGBA'), 'rgba'))
+    orders = [('normal', parts), ('reversed', list(reversed(parts)))]
+    for order_name, order in orders:
+        for name, extractor, layout in strategies:
+            try:
+                with trace.span('attempt', strategy=name, order=order_name):
+                    full = b''.join(iter_part_streams(order, extractor, prefetch=jobs))
+                    raw, found = find_packet(full, dictionaries, base, layout)
+                    del full
+                    out.write(raw)
+                trace.note(strategy=name, order=order_name, attempts=len(errors) + 1)
+                return dict(found, strategy=name, order=order_name)
+            except Exception as e:
+                errors.append((name, order_name, str(e)))
+                _rewind(out, start)
+    raise ValueError('All decoding strategies failed:\n' + '\n'.join(f'{s} ({o}): {m}' for s, o, m in errors))
+
+
+def find_packet(full, dictionaries: Optional[DictionaryStore] = None, base: Optional[Sequence[bytes]] = None, layout: Optional[str] = None) -> Tuple[bytes, Dict]:
+    """(raw bytes, info) of the first packet in ``full`` whose header, checksums and payload all hold.
+
+    Offset 0 is tried big- and little-endian first; then header positions are ranked from header
+    fields alone (``oc8.headers``, which also checks the RGBA bit against ``layout`` when given)
+    and only those are verified and decompressed. The info dict has offset, endian and, after a
+    scan, the per-stage rejection counts (``scan``).
+    """
+    buf = memoryview(full).cast('B')
+    stats = Counter()
+
+    def attempt(c: HeaderCandidate) -> Optional[bytes]:
+        if c.payload_len < 1 or c.offset + HEADER_SIZE + c.payload_len > len(buf):
+            return None
+        compressed = buf[c.offset + HEADER_SIZE:c.offset + HEADER_SIZE + c.payload_len - trailer_size(c.flags)]
+        trace.count('candidates_tried')
+        failed = verify_payload(buf, c)
+        if failed:
+            stats[failed] += 1
+            return None
+        kind = payload_kind(c.flags)
+        codec = codec_name(c.flags) if kind == 'plain' else 'brotli'
+        try:
+            with trace.span(codec, bytes=len(compressed), offset=c.offset):
+                if kind == 'blocks':
+                    return decompress_blocks(compressed)
+                if kind == 'delta':
+                    if base is None:
+                        raise ValueError('packet is a delta; decode it with its base (--delta-base)')
+                    return apply_delta(compressed, base)
+                return decode_region(c.flags, compressed, dictionaries)
+        except (brotli.error, ValueError):
+            stats[codec] += 1
+            return None
+
+    # any flags/reserved value is accepted at offset 0, but the length pair must agree
+    # before paying for a checksum over the payload
+    for label in ('be', 'le'):
+        c = parse_header(buf, 0, label)
+        if c is None or c.total_len != c.payload_len + HEADER_SIZE:
+            continue
+        raw = attempt(c)
+        if raw is not None:
+            return raw, {'offset': 0, 'endian': label}
+
+    candidates, index_stats = find_header_candidates(buf, layout=layout)
+    index_stats.update(stats)
+    stats = index_stats
+    for c in candidates:
+        raw = attempt(c)
+        if raw is not None:
+            return raw, {'offset': c.offset, 'endian': c.endian, 'scan': format_stats(stats)}
+    raise ValueError('No valid Cortex OC8 header + payload found in stream (%s)' % format_stats(stats))
+
+
+def _decode_stream(out: BinaryIO, chunks, jobs: int, dictionaries: Optional[DictionaryStore], base: Optional[Sequence[bytes]], stop: bool) -> None:
+    # stop: legacy parts may pad past the packet, so stop reading once it is complete
+    dec = PacketStreamDecoder(out, jobs=jobs, dictionaries=dictionaries, base=base)
+    for data in chunks:
+        dec.feed(data)
+        if stop and dec.done:
+            break
+    dec.finish()
+
+
+def _verified_layout_bytes(img) -> bytes:
+    # every manifest part is checked against its own hash before its bytes reach the decoder
+    return verified_part_data(img, read_manifest(img), planes.layout_bytes)
+
+
+def _part_list(parts) -> List:
+    # one part (path, PNG bytes, image) or an iterable of them
+    if rows.is_path(parts) or pngio.is_image(parts):
+        return [parts]
+    try:
+        memoryview(parts)
+    except TypeError:
+        return list(parts)
+    return [parts]
+
+
+def _part_mode(part) -> Optional[str]:
+    return part.mode if pngio.is_image(part) else rows.read_info(part).mode
+
+
+def _rewind(out: BinaryIO, start: int) -> None:
+    out.seek(start)
+    out.truncate()
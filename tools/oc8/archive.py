@@ -0,0 +1,137 @@
+"""
+Multi-member Cortex archives.
+
+One packet, one part set, many members. The header carries FLAG_ARCHIVE
+and the payload is laid out so any member can be pulled out on its own:
+
+  payload = member_0 || member_1 || ... || toc || toc_len(uint32 BE) || crc8
+  member_i = Brotli(raw_i), an independent stream
+  toc      = Brotli(JSON {"v": 1, "members": [{"name", "offset", "length", "size", "crc8"}]})
+
+Member offsets are relative to the packet start; crc8 is CRC-8 OC8 over the
+member's compressed bytes, and the trailing crc8 still covers the whole
+compressed region (members + toc + toc_len) like a plain packet. With
+FLAG_CHECK32 the CRC-32 check word sits between toc_len and that crc8.
+
+``ArchiveReader`` reads the header from part 0, the TOC from the tail
+parts and then only the parts a member spans (via the part manifests).
+"""
+
+from __future__ import annotations
+import json
+import os
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import brotli
+
+from oc8.crc import Crc8Oc8, PacketCheck, crc8_oc8
+from oc8.headers import FLAG_ARCHIVE, FLAG_CHECK32, HEADER_SIZE, payload_kind, trailer_size
+from oc8.manifest import PacketRangeReader, plan_parts, stream_id_for
+from oc8.parts import PngPartWriter, layout_flag
+from oc8.planes import layout_bytes
+
+
+ARCHIVE_VERSION = 1
+_TOC_TRAILER = 4
+_READ_CHUNK = 1 << 20
+
+
+def archive_members(inputs: Iterable[str], base: Optional[str] = None) -> List[Tuple[str, str]]:
+    """(member name, path) for files and directory trees; names are relative to base, '/'-separated."""
+    base = base or os.getcwd()
+    out = []
+    for inp in inputs:
+        if os.path.isdir(inp):
+            for root, dirs, files in os.walk(inp):
+                dirs.sort()
+                for f in sorted(files):
+                    out.append(os.path.join(root, f))
+        else:
+            out.append(inp)
+    members = [(os.path.relpath(p, base).replace(os.sep, '/'), p) for p in out]
+    names = [n for n, _ in members]
+    dupes = sorted({n for n in names if names.count(n) > 1})
+    if dupes:
+        raise ValueError(f'duplicate member names: {dupes}')
+    return members
+
+
+def encode_archive_to_pngs(members: List[Tuple[str, str]], output_prefix: str, max_png_bytes: int = 200 * 1024 * 1024, brotli_quality: int = 11, max_width: int = 4096, jobs: int = 1, layout: str = 'rgb', check32: bool = False) -> List[str]:
+    ids = ';'.join(f'{n}:{os.path.getsize(p)}:{os.stat(p).st_mtime_ns}' for n, p in members)
+    writer = PngPartWriter(output_prefix, max_png_bytes=max_png_bytes, max_width=max_width, jobs=jobs, stream_id=stream_id_for(f'archive:{brotli_quality}:{ids}'.encode()), layout=layout)
+    writer.write(bytes(HEADER_SIZE))
+    crc = PacketCheck(check32)
+
+    def emit(chunk: bytes) -> None:
+        if chunk:
+            crc.update(chunk)
+            writer.write(chunk)
+
+    toc = []
+    for name, path in members:
+        offset = HEADER_SIZE + crc.length
+        member_crc = Crc8Oc8()
+        compressor = brotli.Compressor(quality=brotli_quality)
+        size = 0
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(_READ_CHUNK)
+                if not chunk:
+                    break
+                size += len(chunk)
+                out = compressor.process(chunk)
+                member_crc.update(out)
+                emit(out)
+        out = compressor.finish()
+        member_crc.update(out)
+        emit(out)
+        toc.append({'name': name, 'offset': offset, 'length': member_crc.length, 'size': size, 'crc8': member_crc.digest()})
+
+    toc_blob = brotli.compress(json.dumps({'v': ARCHIVE_VERSION, 'members': toc}, separators=(',', ':')).encode('utf-8'), quality=brotli_quality)
+    emit(toc_blob)
+    emit(struct.pack('>I', len(toc_blob)))
+    payload_len = crc.length + crc.trailer_size
+    flags = FLAG_ARCHIVE | layout_flag(layout) | (FLAG_CHECK32 if check32 else 0)
+    header = struct.pack('>I I B 7s', payload_len + HEADER_SIZE, payload_len, flags, b'\x00' * 7)
+    writer.write(crc.trailer(header))
+    writer.patch(0, header)
+    return writer.close()
+
+
+class ArchiveReader:
+    def __init__(self, png_paths: List[str]) -> None:
+        parts = plan_parts(png_paths)
+        if parts is None:
+            raise ValueError('archive parts need cortex-part manifests (legacy images are not seekable)')
+        self.reader = PacketRangeReader(parts, layout_bytes)
+        total_len, payload_len, flags = struct.unpack('>I I B', self.reader.read(0, 9))
+        if payload_kind(flags) != 'archive':
+            raise ValueError('packet is not an archive (flags=%d)' % flags)
+        end = HEADER_SIZE + payload_len - trailer_size(flags)  # compressed region ends before the check word/crc8
+        (toc_len,) = struct.unpack('>I', self.reader.read(end - _TOC_TRAILER, _TOC_TRAILER))
+        toc = json.loads(brotli.decompress(self.reader.read(end - _TOC_TRAILER - toc_len, toc_len)))
+        if toc.get('v') != ARCHIVE_VERSION:
+            raise ValueError(f"unsupported archive version {toc.get('v')}")
+        self.members: Dict[str, Dict] = {m['name']: m for m in toc['members']}
+
+    def read(self, name: str) -> bytes:
+        try:
+            m = self.members[name]
+        except KeyError:
+            raise KeyError(f'no member {name!r} in archive') from None
+        blob = self.reader.read(m['offset'], m['length'])
+        if crc8_oc8(blob) != m['crc8']:
+            raise ValueError(f'member {name!r}: CRC mismatch')
+        raw = brotli.decompress(blob)
+        if len(raw) != m['size']:
+            raise ValueError(f"member {name!r}: size {len(raw)} != {m['size']}")
+        return raw
+
+    def extract(self, name: str, output_path: str) -> None:
+        raw = self.read(name)
+        outdir = os.path.dirname(output_path)
+        if outdir:
+            os.makedirs(outdir, exist_ok=True)
+        with open(output_path, 'wb') as f:
+            f.write(raw)
@@ -0,0 +1,215 @@
+"""
+Block-framed, seekable Cortex packets.
+
+The header carries FLAG_BLOCKS and the input is cut into fixed-size blocks
+that are Brotli-compressed independently, so blocks (de)compress on all
+cores and a byte range can be served by inflating only the blocks it
+touches:
+
+  payload  = frame_0 || ... || frame_{n-1} || end || index || index_len(uint32 BE) || crc8
+  frame_i  = clen(uint32 BE) raw_len(uint32 BE) crc8(uint8) || Brotli(block_i)
+  end      = 9 zero bytes (clen == raw_len == 0)
+  index    = block_size(uint32 BE) n(uint32 BE) frame_offset(uint64 BE) * n
+
+Frame offsets are relative to the packet start and block i holds raw bytes
+[i * block_size, i * block_size + raw_len_i). The per-frame crc8 covers the
+frame's compressed bytes; the trailing crc8 still covers the whole
+compressed region like a plain packet. Frames carry their own lengths, so
+the streaming decoder never needs the index; the index is for seeking.
+With FLAG_CHECK32 the CRC-32 check word (see ``oc8.crc.PacketCheck``)
+sits between index_len and the packet crc8.
+
+Brotli releases the GIL, so the worker pools here are thread pools.
+"""
+
+from __future__ import annotations
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import brotli
+
+from oc8 import trace
+from oc8.crc import PacketCheck, crc8_oc8
+from oc8.headers import FLAG_BLOCKS, FLAG_CHECK32, HEADER_SIZE, payload_kind, trailer_size
+from oc8.manifest import PacketRangeReader, plan_parts, stream_id_for
+from oc8.parts import PngPartWriter, layout_flag
+from oc8.planes import layout_bytes
+
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+FRAME_HEADER = struct.Struct('>I I B')
+END_FRAME = bytes(FRAME_HEADER.size)
+INDEX_HEAD = struct.Struct('>I I')
+_INDEX_TRAILER = 4
+
+
+def ordered_map(fn: Callable, items: Iterable, jobs: int = 1) -> Iterator:
+    """map() on a thread pool: results in input order, at most 2 * jobs in flight."""
+    if jobs <= 1:
+        for item in items:
+            yield fn(item)
+        return
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def compress_frame(raw: bytes, quality: int = 11, lgwin: int = 22, mode: int = brotli.MODE_GENERIC) -> bytes:
+    with trace.span('brotli_compress', bytes=len(raw)):
+        comp = brotli.compress(raw, quality=quality, lgwin=lgwin, mode=mode)
+    return FRAME_HEADER.pack(len(comp), len(raw), crc8_oc8(comp)) + comp
+
+
+def decompress_frame(frame) -> bytes:
+    clen, raw_len, crc = FRAME_HEADER.unpack_from(frame, 0)
+    comp = memoryview(frame)[FRAME_HEADER.size:FRAME_HEADER.size + clen]
+    if len(comp) != clen:
+        raise ValueError(f'block frame truncated: have {len(comp)}, need {clen}')
+    with trace.span('crc', bytes=clen):
+        ok = crc8_oc8(comp) == crc
+    if not ok:
+        raise ValueError('block CRC mismatch')
+    with trace.span('brotli', bytes=clen):
+        raw = brotli.decompress(comp)
+    if len(raw) != raw_len:
+        raise ValueError(f'block size {len(raw)} != {raw_len}')
+    return raw
+
+
+def build_trailer(block_size: int, frame_offsets: List[int]) -> bytes:
+    # end frame + index + index_len: everything between the last frame and the packet crc8
+    index = INDEX_HEAD.pack(block_size, len(frame_offsets)) + struct.pack(f'>{len(frame_offsets)}Q', *frame_offsets)
+    return END_FRAME + index + struct.pack('>I', len(index))
+
+
+class FrameSplitter:
+    """Cuts a compressed region fed in arbitrary chunks into whole frames, up to the end frame."""
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        self.finished = False
+
+    def feed(self, data) -> List[bytes]:
+        if self.finished:
+            return []
+        self._buf += data
+        frames = []
+        pos = 0
+        while len(self._buf) - pos >= FRAME_HEADER.size:
+            clen, raw_len, _ = FRAME_HEADER.unpack_from(self._buf, pos)
+            if clen == 0 and raw_len == 0:
+                self.finished = True
+                break
+            end = pos + FRAME_HEADER.size + clen
+            if end > len(self._buf):
+                break
+            frames.append(bytes(self._buf[pos:end]))
+            pos = end
+        if self.finished:
+            self._buf = bytearray()  # index + index_len only feed the packet CRC
+        else:
+            del self._buf[:pos]
+        return frames
+
+
+def decompress_blocks(compressed, jobs: int = 1) -> bytes:
+    """Whole compressed region of a FLAG_BLOCKS packet -> raw bytes."""
+    splitter = FrameSplitter()
+    frames = splitter.feed(compressed)
+    if not splitter.finished:
+        raise ValueError('block stream has no end frame')
+    return b''.join(ordered_map(decompress_frame, frames, jobs))
+
+
+def encode_blocks_to_pngs(input_path: str, output_prefix: str, max_png_bytes: int = 200 * 1024 * 1024, brotli_quality: int = 11, max_width: int = 4096, block_size: int = DEFAULT_BLOCK_SIZE, jobs: int = 1, manifest: bool = True, lgwin: int = 22, brotli_mode: int = brotli.MODE_GENERIC, compress_level: int = 0, layout: str = 'rgb', check32: bool = False) -> List[str]:
+    # Blocks are read and compressed jobs-wide but written in order, so memory stays at
+    # ~2 * jobs blocks. Lengths are only known at the end: part 0 is held and patched.
+    stream_id = None
+    if manifest:
+        st = os.stat(input_path)
+        stream_id = stream_id_for(f'blocks:{os.path.basename(input_path)}:{st.st_size}:{st.st_mtime_ns}:{brotli_quality}:{block_size}'.encode())
+    writer = PngPartWriter(output_prefix, max_png_bytes=max_png_bytes, max_width=max_width, compress_level=compress_level, hold_first=True, jobs=jobs, stream_id=stream_id, layout=layout)
+
+    def blocks() -> Iterator[bytes]:
+        with open(input_path, 'rb') as f:
+            while True:
+                raw = f.read(block_size)
+                if not raw:
+                    return
+                yield raw
+
+    return write_blocks(writer, blocks(), block_size, brotli_quality, jobs=jobs, lgwin=lgwin, brotli_mode=brotli_mode, check32=check32)
+
+
+def write_blocks(writer: PngPartWriter, blocks: Iterable, block_size: int, brotli_quality: int = 11, jobs: int = 1, lgwin: int = 22, brotli_mode: int = brotli.MODE_GENERIC, check32: bool = False) -> List:
+    """Block-framed packet of ``blocks`` (buffers of block_size bytes, the last may be short) into a hold_first writer; returns writer.close()."""
+    if not 0 < block_size < 1 << 32:
+        raise ValueError(f'block_size out of range: {block_size}')
+    writer.write(bytes(HEADER_SIZE))
+    crc = PacketCheck(check32)
+
+    def emit(chunk: bytes) -> None:
+        crc.update(chunk)
+        writer.write(chunk)
+
+    offsets = []
+    # a block never needs a window larger than itself
+    lgwin = min(lgwin, max(16, (block_size - 1).bit_length()))
+    for frame in ordered_map(lambda raw: compress_frame(raw, brotli_quality, lgwin, brotli_mode), blocks, jobs):
+        offsets.append(HEADER_SIZE + crc.length)
+        emit(frame)
+    emit(build_trailer(block_size, offsets))
+    payload_len = crc.length + crc.trailer_size
+    flags = FLAG_BLOCKS | layout_flag(writer.layout) | (FLAG_CHECK32 if check32 else 0)
+    header = struct.pack('>I I B 7s', payload_len + HEADER_SIZE, payload_len, flags, b'\x00' * 7)
+    writer.write(crc.trailer(header))
+    writer.patch(0, header)
+    return writer.close()
+
+
+class BlockReader:
+    """Byte-range reads from a block packet: loads only the parts holding the header, index and touched frames."""
+
+    def __init__(self, png_paths: List[str]) -> None:
+        parts = plan_parts(png_paths)
+        if parts is None:
+            raise ValueError('range reads need cortex-part manifests (legacy images are not seekable)')
+        self.reader = PacketRangeReader(parts, layout_bytes)
+        total_len, payload_len, flags = struct.unpack('>I I B', self.reader.read(0, 9))
+        if payload_kind(flags) != 'blocks':
+            raise ValueError('packet is not block-framed (flags=%d)' % flags)
+        end = HEADER_SIZE + payload_len - trailer_size(flags)  # compressed region ends before the check word/crc8
+        (index_len,) = struct.unpack('>I', self.reader.read(end - _INDEX_TRAILER, _INDEX_TRAILER))
+        index = self.reader.read(end - _INDEX_TRAILER - index_len, index_len)
+        self.block_size, n = INDEX_HEAD.unpack_from(index, 0)
+        self.offsets = list(struct.unpack_from(f'>{n}Q', index, INDEX_HEAD.size))
+        # the end frame sits right after the last frame, so it bounds that frame too
+        self._ends = self.offsets[1:] + [end - _INDEX_TRAILER - index_len - len(END_FRAME)]
+
+    @property
+    def size(self) -> Optional[int]:
+        """Raw size, from the last frame header (one small read)."""
+        if not self.offsets:
+            return 0
+        _, raw_len, _ = FRAME_HEADER.unpack(self.reader.read(self.offsets[-1], FRAME_HEADER.size))
+        return (len(self.offsets) - 1) * self.block_size + raw_len
+
+    def read(self, offset: int, length: int, jobs: int = 1) -> bytes:
+        if offset < 0 or length < 0:
+            raise ValueError('offset and length must be >= 0')
+        first = offset // self.block_size
+        last = min(len(self.offsets), -(-(offset + length) // self.block_size))
+        if length == 0 or first >= last:
+            return b''
+        frames = (self.reader.read(self.offsets[i], self._ends[i] - self.offsets[i]) for i in range(first, last))
+        raw = b''.join(ordered_map(decompress_frame, frames, jobs))
+        start = offset - first * self.block_size
+        return raw[start:start + length]
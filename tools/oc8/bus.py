@@ -0,0 +1,487 @@
+"""
+Cortex bus messages and the inbox worker.
+
+Message format (same as src/cortex/encoder.ts / decoder.ts): a JSON object
+compressed with Brotli (q11), stored in the RGB of an RGBA PNG (square,
+alpha 255, zero padded) with a tEXt ``oc8`` chunk holding the first byte
+of sha256(compressed) in decimal. Requests are ``{id, cmd, args}``;
+responses are ``{id, ok, result | error, timestamp}`` and go to the outbox
+under the request's file name.
+
+``BusWorker`` serves ``.qflush/cortex/inbox``:
+
+  - new files are reported by ``watch.DirWatcher`` (inotify on Linux), not a
+    500 ms poll; files already in the inbox at startup are served first
+  - decode and encode+handle run in a process pool; the main process only
+    tracks state (replay ids, counters, the queue)
+  - at most ``max_in_flight`` messages are in the pool; further files wait in
+    a FIFO of names, and past ``max_queue`` names are not even recorded: they
+    stay on disk and are picked up by a rescan once the queue drains
+    (``backpressure`` is set in the stats file meanwhile, for producers)
+  - counters (latency percentiles, queue depth, ...) go to ``stats_path``
+  - one consumer per inbox: ``InboxLock`` (``<inbox>.lock``, the owner's pid)
+    is held while serving, and src/cortex/bus.ts checks the same file, so the
+    TS poller and this worker never claim the same message. Only ping/echo and
+    ``--handler`` commands are served here; the commands bus.ts runs through
+    its executor need the TS bus, so stop the worker to go back to it
+
+Latency is measured from the inbox file's mtime (when the producer finished
+writing it) to the response being renamed into the outbox.
+"""
+
+from __future__ import annotations
+import collections
+import hashlib
+import importlib
+import io
+import json
+import math
+import os
+import selectors
+import socket
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import brotli
+from PIL import Image, PngImagePlugin
+
+from oc8 import planes, rows, watch
+
+
+INBOX = os.path.join('.qflush', 'cortex', 'inbox')
+OUTBOX = os.path.join('.qflush', 'cortex', 'outbox')
+STATS = os.path.join('.qflush', 'cortex', 'worker-stats.json')
+SEEN_LIMIT = 10000
+LATENCY_WINDOW = 4096
+
+
+class BusError(ValueError):
+    pass
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # os.kill(pid, 0) would send CTRL_C_EVENT on Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _age(path: str) -> float:
+    try:
+        return time.time() - os.stat(path).st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+class InboxLock:
+    """Exclusive consumer lock of an inbox: ``<inbox>.lock``, created O_EXCL, holding the owner's pid.
+
+    A lock whose pid is no longer running is stale and taken over.
+    """
+
+    def __init__(self, inbox: str) -> None:
+        self.inbox = inbox
+        self.path = os.path.normpath(inbox) + '.lock'
+        self.held = False
+
+    def owner(self) -> Optional[int]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return int(f.read().split()[0])
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def acquire(self) -> None:
+        for _ in range(20):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                pid = self.owner()
+                if pid is not None and _pid_alive(pid):
+                    raise BusError(f'{self.inbox} is already served by pid {pid} ({self.path}); '
+                                   'stop that consumer first (the TS bus runs in the daemon with --use-cortex)') from None
+                if pid is None and _age(self.path) < 1.0:
+                    time.sleep(0.1)  # just created, the owner has not written its pid yet
+                    continue
+                try:
+                    os.remove(self.path)  # stale: its owner is gone
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(f'{os.getpid()} cortex_bus_worker\n')
+            self.held = True
+            return
+        raise BusError(f'could not take {self.path}')
+
+    def release(self) -> None:
+        if self.held and self.owner() == os.getpid():
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self.held = False
+
+
+def oc8_tag(compressed: bytes) -> int:
+    return hashlib.sha256(compressed).digest()[0]
+
+
+def encode_message(obj: Any) -> bytes:
+    """PNG bytes for a bus message, as ``encodeCortexCommand`` writes them."""
+    compressed = brotli.compress(json.dumps(obj, separators=(',', ':')).encode('utf-8'), quality=11)
+    pixels = -(-len(compressed) // 3)
+    width = max(1, math.ceil(math.sqrt(pixels)))
+    rgb = compressed + b'\x00' * (width * width * 3 - len(compressed))
+    img = Image.frombytes('RGB', (width, width), rgb).convert('RGBA')
+    info = PngImagePlugin.PngInfo()
+    info.add_text('oc8', str(oc8_tag(compressed)))
+    buf = io.BytesIO()
+    img.save(buf, format='PNG', pnginfo=info)
+    return buf.getvalue()
+
+
+def write_message(obj: Any, path: str) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(encode_message(obj))
+    os.replace(tmp, path)
+
+
+def decode_message(data: bytes) -> Any:
+    with Image.open(io.BytesIO(data)) as img:
+        tag = img.text.get('oc8') if hasattr(img, 'text') else None
+        rgb = planes.image_buffer(img, 'RGB')
+    end = rows.trailing_nul_start(rgb)
+    # the padding is zeros, but so may be the last byte(s) of the stream: give them back if needed
+    for n in range(end, min(end + 3, len(rgb)) + 1):
+        compressed = rgb[:n]
+        if tag is not None and int(tag) != oc8_tag(compressed):
+            continue
+        try:
+            return json.loads(brotli.decompress(compressed).decode('utf-8'))
+        except brotli.error:
+            continue
+    if tag is not None:
+        raise BusError('OC8 checksum mismatch')
+    raise BusError('payload is not a Brotli stream')
+
+
+# -- handlers ---------------------------------------------------------------
+
+def _ping(args: List[Any]) -> Dict:
+    return {'pong': True, 'pid': os.getpid()}
+
+
+def _echo(args: List[Any]) -> Any:
+    return args
+
+
+BUILTIN_HANDLERS: Dict[str, Callable[[List[Any]], Any]] = {'ping': _ping, 'echo': _echo}
+_resolved: Dict[str, Callable] = {}
+
+
+def resolve_handler(spec: Optional[str]) -> Optional[Callable]:
+    """``module:function`` taking (cmd, args) and returning a JSON-able result."""
+    if not spec:
+        return None
+    if spec not in _resolved:
+        mod, _, name = spec.partition(':')
+        if not name:
+            raise BusError(f'handler must be module:function, got {spec!r}')
+        _resolved[spec] = getattr(importlib.import_module(mod), name)
+    return _resolved[spec]
+
+
+# -- pool tasks (run in worker processes) -----------------------------------
+
+def _decode_task(path: str) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        payload = decode_message(f.read())
+    return payload, (time.perf_counter() - start) * 1000
+
+
+def _respond_task(payload: Any, out_path: str, handler: Optional[str]) -> Tuple[bool, float]:
+    start = time.perf_counter()
+    if not isinstance(payload, dict):
+        payload = {}
+    cmd, ident = payload.get('cmd'), payload.get('id')
+    args = payload.get('args') or []
+    try:
+        if cmd in BUILTIN_HANDLERS:
+            result = BUILTIN_HANDLERS[cmd](args)
+        else:
+            fn = resolve_handler(handler)
+            if fn is None:
+                raise BusError(f'unknown command: {cmd!r}')
+            result = fn(cmd, args)
+        response = {'id': ident, 'ok': True, 'result': result, 'timestamp': int(time.time() * 1000)}
+    except Exception as e:  # the error goes back to the caller, like the TS bus
+        response = {'id': ident, 'ok': False, 'error': f'{type(e).__name__}: {e}', 'timestamp': int(time.time() * 1000)}
+    write_message(response, out_path)
+    return response['ok'], (time.perf_counter() - start) * 1000
+
+
+def _error_task(ident: str, error: str, out_path: str) -> Tuple[bool, float]:
+    start = time.perf_counter()
+    write_message({'id': ident, 'ok': False, 'error': error, 'timestamp': int(time.time() * 1000)}, out_path)
+    return False, (time.perf_counter() - start) * 1000
+
+
+# -- worker -----------------------------------------------------------------
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class BusWorker:
+    def __init__(self, inbox: str = INBOX, outbox: str = OUTBOX, jobs: int = 0,
+                 max_in_flight: int = 0, max_queue: int = 1024, handler: Optional[str] = None,
+                 stats_path: Optional[str] = STATS, stats_interval: float = 1.0,
+                 poll_interval: float = 0.05, force_poll: bool = False, log=print) -> None:
+        self.inbox = inbox
+        self.outbox = outbox
+        self.jobs = jobs or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.jobs
+        self.max_queue = max_queue
+        self.handler = handler
+        self.stats_path = stats_path
+        self.stats_interval = stats_interval
+        self.poll_interval = poll_interval
+        self.force_poll = force_poll
+        self.log = log
+        self.queue: Deque[str] = collections.deque()
+        self.queued = set()
+        self.in_flight: Dict[str, float] = {}  # name -> arrival (inbox mtime)
+        self.overflow = False
+        self.seen: 'collections.OrderedDict[str, None]' = collections.OrderedDict()
+        self.latencies: Deque[float] = collections.deque(maxlen=LATENCY_WINDOW)
+        self.decode_ms: Deque[float] = collections.deque(maxlen=LATENCY_WINDOW)
+        self.respond_ms: Deque[float] = collections.deque(maxlen=LATENCY_WINDOW)
+        self.counters = collections.Counter()
+        self.max_depth = 0
+        self.started = time.time()
+        self._done: Deque[Tuple[str, str, Future]] = collections.deque()
+        self._stop = False
+
+    # queue ------------------------------------------------------------------
+
+    def _wanted(self, name: str) -> bool:
+        return name.endswith('.png') and name not in self.queued and name not in self.in_flight
+
+    def _enqueue(self, names: List[str]) -> None:
+        for name in names:
+            if not self._wanted(name):
+                continue
+            if len(self.queue) >= self.max_queue:
+                self.overflow = True  # left on disk; the rescan finds it
+                continue
+            self.queue.append(name)
+            self.queued.add(name)
+            self.counters['received'] += 1
+        self.max_depth = max(self.max_depth, self.depth)
+
+    def _rescan(self) -> None:
+        entries = []
+        with os.scandir(self.inbox) as it:
+            for e in it:
+                if e.is_file() and self._wanted(e.name):
+                    try:
+                        entries.append((e.stat().st_mtime, e.name))
+                    except FileNotFoundError:
+                        pass
+        self._enqueue([name for _, name in sorted(entries)])
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue) + len(self.in_flight)
+
+    # pool -------------------------------------------------------------------
+
+    def _wake(self, _fut=None) -> None:
+        try:
+            self._wsock.send(b'\x00')
+        except (BlockingIOError, OSError):
+            pass  # a wakeup is already pending
+
+    def _submit(self, pool: ProcessPoolExecutor) -> None:
+        while self.queue and len(self.in_flight) < self.max_in_flight:
+            name = self.queue.popleft()
+            self.queued.discard(name)
+            path = os.path.join(self.inbox, name)
+            try:
+                arrived = os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            self.in_flight[name] = arrived
+            fut = pool.submit(_decode_task, path)
+            self._done_later(name, 'decode', fut)
+        if self.overflow and len(self.queue) < self.max_queue // 2:
+            self.overflow = False
+            self.counters['rescans'] += 1
+            self._rescan()
+
+    def _done_later(self, name: str, stage: str, fut: Future) -> None:
+        fut.add_done_callback(lambda f: (self._done.append((name, stage, f)), self._wake()))
+
+    def _finish(self, pool: ProcessPoolExecutor, name: str, stage: str, fut: Future) -> None:
+        path = os.path.join(self.inbox, name)
+        out = os.path.join(self.outbox, name)
+        if stage == 'decode':
+            try:
+                payload, ms = fut.result()
+            except Exception as e:
+                self.counters['decode_errors'] += 1
+                self.log(f'[cortex-bus] {name}: {e}')
+                self._done_later(name, 'respond', pool.submit(_error_task, name[:-4], str(e), out))
+                return
+            self.decode_ms.append(ms)
+            ident = payload.get('id') if isinstance(payload, dict) else None
+            if ident is not None:
+                if ident in self.seen:
+                    self.counters['replayed'] += 1
+                    self._done_later(name, 'respond', pool.submit(_error_task, name[:-4], 'replay detected', out))
+                    return
+                self.seen[ident] = None
+                if len(self.seen) > SEEN_LIMIT:
+                    self.seen.popitem(last=False)
+            self._done_later(name, 'respond', pool.submit(_respond_task, payload, out, self.handler))
+            return
+        arrived = self.in_flight.pop(name, None)
+        try:
+            ok, ms = fut.result()
+            self.respond_ms.append(ms)
+            self.counters['processed' if ok else 'failed'] += 1
+        except Exception as e:
+            self.counters['failed'] += 1
+            self.log(f'[cortex-bus] {name}: response not written: {e}')
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        if arrived is not None:
+            self.latencies.append(max(0.0, time.time() - arrived) * 1000)
+
+    # stats ------------------------------------------------------------------
+
+    def stats(self) -> Dict:
+        lat = list(self.latencies)
+        return {
+            'uptime_s': round(time.time() - self.started, 3),
+            'jobs': self.jobs,
+            'received': self.counters['received'],
+            'processed': self.counters['processed'],
+            'failed': self.counters['failed'],
+            'decode_errors': self.counters['decode_errors'],
+            'replayed': self.counters['replayed'],
+            'overflow_rescans': self.counters['rescans'],
+            'queue_depth': self.depth,
+            'in_flight': len(self.in_flight),
+            'max_queue_depth': self.max_depth,
+            'backpressure': self.overflow or len(self.queue) >= self.max_queue,
+            'latency_ms': {'p50': round(_percentile(lat, 50), 3), 'p95': round(_percentile(lat, 95), 3),
+                           'p99': round(_percentile(lat, 99), 3), 'max': round(max(lat, default=0.0), 3)},
+            'decode_ms_p50': round(_percentile(list(self.decode_ms), 50), 3),
+            'respond_ms_p50': round(_percentile(list(self.respond_ms), 50), 3),
+        }
+
+    def write_stats(self) -> None:
+        if not self.stats_path:
+            return
+        os.makedirs(os.path.dirname(self.stats_path) or '.', exist_ok=True)
+        tmp = self.stats_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.stats(), f, indent=2)
+        os.replace(tmp, self.stats_path)
+
+    # loop -------------------------------------------------------------------
+
+    def stop(self, *_args) -> None:
+        self._stop = True
+        if hasattr(self, '_wsock'):
+            self._wake()
+
+    def run(self, once: bool = False) -> Dict:
+        """Serve the inbox until stop() (or, with ``once``, until it is empty)."""
+        os.makedirs(self.inbox, exist_ok=True)
+        os.makedirs(self.outbox, exist_ok=True)
+        lock = InboxLock(self.inbox)
+        lock.acquire()
+        try:
+            return self._serve(once)
+        finally:
+            lock.release()
+
+    def _serve(self, once: bool) -> Dict:
+        rsock, self._wsock = socket.socketpair()
+        rsock.setblocking(False)
+        self._wsock.setblocking(False)
+        watcher = watch.DirWatcher(self.inbox, self.poll_interval, self.force_poll)
+        sel = selectors.DefaultSelector()
+        sel.register(rsock, selectors.EVENT_READ)
+        if watcher.fileno() is not None:
+            sel.register(watcher, selectors.EVENT_READ)
+        self.log(f'[cortex-bus] watching {self.inbox} ({watcher.kind}), {self.jobs} worker(s), '
+                 f'{self.max_in_flight} in flight, queue {self.max_queue}')
+        last_stats = 0.0
+        try:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                self._rescan()
+                while True:
+                    self._submit(pool)
+                    now = time.monotonic()
+                    if now - last_stats >= self.stats_interval:
+                        self.write_stats()
+                        last_stats = now
+                    if self._stop or (once and not self.depth and not self.overflow):
+                        break
+                    timeout = self.stats_interval
+                    if watcher.timeout is not None:
+                        timeout = min(timeout, watcher.timeout)
+                    for key, _ in sel.select(timeout):
+                        if key.fileobj is rsock:
+                            try:
+                                while rsock.recv(4096):
+                                    pass
+                            except BlockingIOError:
+                                pass
+                    self._enqueue(watcher.read())
+                    if watcher.take_overflow():
+                        self._rescan()
+                    while self._done:
+                        self._finish(pool, *self._done.popleft())
+                    if self._stop:
+                        # let the pool finish what it holds; the rest stays in the inbox
+                        self.queue.clear()
+                        self.queued.clear()
+                        while self.in_flight:
+                            sel.select(0.1)
+                            while self._done:
+                                self._finish(pool, *self._done.popleft())
+        finally:
+            sel.close()
+            watcher.close()
+            rsock.close()
+            self._wsock.close()
+            self.write_stats()
+        return self.stats()
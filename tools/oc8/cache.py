@@ -0,0 +1,222 @@
+"""
+Content-addressed on-disk cache for decoded Cortex packets.
+
+Key = blake2b-128 over the PNG part bytes (in decode order) plus the
+decode options. An entry is the decoded payload file and a small JSON
+sidecar with the winning strategy / offset. A repeat decode therefore
+costs one pass of hashing over the PNGs and one copy of the cached file.
+
+A hit writes nothing but the output file: hit/miss/store/eviction
+counters and the keys that were hit are kept in memory and flushed once,
+by ``close()`` (run at exit for caches still open). The flush sets the
+mtime of the hit entries, which is their recency, and appends the counters
+as one JSON line to ``stats.log``. Appends do not overwrite each other, so
+concurrent decoders lose no counts; ``stats`` adds the lines up. Once the
+log passes STATS_LOG_MAX_BYTES the flush folds it into a single line.
+
+``evict`` drops least-recently-used entries until the cache fits
+``max_bytes``. It walks the objects directory, so ``put`` calls it only
+when a running size total (one walk per cache object, then the sizes
+this process stored) goes over the cap.
+
+Layout:
+  <root>/objects/<key[:2]>/<key>        decoded payload
+  <root>/objects/<key[:2]>/<key>.json   winner metadata
+  <root>/stats.log                      counters, one line per flush
+"""
+
+from __future__ import annotations
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import time
+import weakref
+from collections import Counter
+from typing import Dict, List, Optional
+
+from oc8 import trace
+
+
+DEFAULT_CACHE_DIR = os.path.join('.qflush', 'cortex', 'cache')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+CACHE_VERSION = 1
+_READ_CHUNK = 1 << 20
+STATS_LOG_MAX_BYTES = 64 * 1024
+_COUNTERS = ('hits', 'misses', 'stores', 'evictions')
+
+_open_caches = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_caches() -> None:
+    for cache in list(_open_caches):
+        cache.close()
+
+
+class DecodeCache:
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects = os.path.join(root, 'objects')
+        self._counts = Counter()
+        self._hit_keys = set()
+        self._bytes = None  # running size total, None until the first walk
+        _open_caches.add(self)
+
+    def __enter__(self) -> 'DecodeCache':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Flush recency and counters (see the module docstring); safe to call more than once."""
+        self._touch_hits()
+        if self._counts:
+            os.makedirs(self.root, exist_ok=True)
+            log = os.path.join(self.root, 'stats.log')
+            with open(log, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(dict(self._counts), sort_keys=True) + '\n')
+            self._counts.clear()
+            if os.path.getsize(log) > STATS_LOG_MAX_BYTES:
+                self._fold_stats()
+        _open_caches.discard(self)
+
+    def key_for(self, paths: List[str], options: Optional[Dict] = None) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(json.dumps({'v': CACHE_VERSION, 'options': options or {}}, sort_keys=True).encode())
+        with trace.span('cache_key') as sp:
+            total = 0
+            for p in paths:
+                with open(p, 'rb') as f:
+                    size = os.fstat(f.fileno()).st_size
+                    h.update(size.to_bytes(8, 'big'))
+                    total += size
+                    while True:
+                        chunk = f.read(_READ_CHUNK)
+                        if not chunk:
+                            break
+                        h.update(chunk)
+            sp.set(bytes=total)
+        return h.hexdigest()
+
+    def _paths(self, key: str):
+        d = os.path.join(self.objects, key[:2])
+        return d, os.path.join(d, key), os.path.join(d, key + '.json')
+
+    def get(self, key: str, output_path: str) -> Optional[Dict]:
+        """Copy the cached payload to output_path and return its metadata, or None on a miss."""
+        _, data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            shutil.copyfile(data_path, output_path)
+        except (OSError, ValueError):
+            self._counts['misses'] += 1
+            return None
+        self._counts['hits'] += 1
+        self._hit_keys.add(key)
+        return meta
+
+    def put(self, key: str, source_path: str, meta: Dict) -> None:
+        d, data_path, meta_path = self._paths(key)
+        os.makedirs(d, exist_ok=True)
+        tmp = f'{data_path}.{os.getpid()}.tmp'
+        shutil.copyfile(source_path, tmp)
+        os.replace(tmp, data_path)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(dict(meta, cached_at=time.time()), f)
+        os.replace(tmp, meta_path)
+        self._counts['stores'] += 1
+        if self._bytes is None:
+            self._bytes = sum(e['size'] for e in self.entries())
+        else:
+            self._bytes += os.path.getsize(data_path)
+        if self._bytes > self.max_bytes:
+            self.evict()
+
+    def entries(self) -> List[Dict]:
+        out = []
+        if not os.path.isdir(self.objects):
+            return out
+        for sub in os.listdir(self.objects):
+            d = os.path.join(self.objects, sub)
+            for name in os.listdir(d):
+                if name.endswith('.json') or name.endswith('.tmp'):
+                    continue
+                p = os.path.join(d, name)
+                try:
+                    st = os.stat(p)
+                except FileNotFoundError:
+                    continue
+                out.append({'key': name, 'size': st.st_size, 'mtime': st.st_mtime})
+        return out
+
+    def evict(self) -> int:
+        self._touch_hits()  # this run's hits count as recent
+        entries = sorted(self.entries(), key=lambda e: e['mtime'])
+        total = sum(e['size'] for e in entries)
+        removed = 0
+        for e in entries:
+            if total <= self.max_bytes:
+                break
+            _, data_path, meta_path = self._paths(e['key'])
+            for p in (meta_path, data_path):
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+            total -= e['size']
+            removed += 1
+        self._bytes = total
+        if removed:
+            self._counts['evictions'] += removed
+        return removed
+
+    def clear(self) -> None:
+        shutil.rmtree(self.objects, ignore_errors=True)
+
+    def stats(self) -> Dict:
+        self.close()
+        counters = self._load_stats()
+        entries = self.entries()
+        lookups = counters.get('hits', 0) + counters.get('misses', 0)
+        counters.update(entries=len(entries), bytes=sum(e['size'] for e in entries), max_bytes=self.max_bytes,
+                        hit_rate=round(counters.get('hits', 0) / lookups, 4) if lookups else 0.0)
+        return counters
+
+    def _load_stats(self, path: Optional[str] = None) -> Dict:
+        counters = Counter()
+        try:
+            with open(path or os.path.join(self.root, 'stats.log'), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        counters.update(json.loads(line))
+                    except ValueError:
+                        continue  # a line cut short by a crash
+        except OSError:
+            pass
+        return {k: counters[k] for k in _COUNTERS}
+
+    def _fold_stats(self) -> None:
+        # move the log aside (so new flushes start a fresh one), then append its sum as one line
+        log = os.path.join(self.root, 'stats.log')
+        aside = f'{log}.{os.getpid()}.fold'
+        try:
+            os.replace(log, aside)
+        except FileNotFoundError:
+            return  # another decoder is folding it
+        totals = self._load_stats(aside)
+        with open(log, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(totals, sort_keys=True) + '\n')
+        os.remove(aside)
+
+    def _touch_hits(self) -> None:
+        for key in self._hit_keys:
+            try:
+                os.utime(self._paths(key)[1])
+            except FileNotFoundError:
+                pass  # evicted by another decoder since the hit
+        self._hit_keys.clear()
@@ -0,0 +1,22 @@
+"""
+Small helpers shared by the command-line tools (stdlib only, cheap to import).
+"""
+
+from __future__ import annotations
+import sys
+from typing import List, Optional
+
+
+def read_list(path: str) -> List[str]:
+    """Lines of a list file ('-' for stdin), blank lines and # comments skipped."""
+    f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def inputs_from(positional: List[str], list_path: Optional[str]) -> List[str]:
+    """Positional inputs followed by the ones from --list FILE."""
+    return list(positional) + (read_list(list_path) if list_path else [])
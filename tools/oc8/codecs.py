@@ -0,0 +1,455 @@
+"""
+Payload codecs selected by the header flags byte, and trained dictionaries.
+
+The codec id lives in flags bits 4..6 (FLAG_CODEC_MASK); bit 7 (FLAG_DICT)
+says the compressed region starts with a uint32 BE dictionary id. Id 0 is
+Brotli, so packets written before the registry (and everything
+src/cortex/ writes) read unchanged:
+
+  id  name    needs       dictionaries
+  0   brotli  brotli      no (the Python binding has no dictionary API)
+  1   stored  -           no
+  2   zlib    stdlib      yes (raw deflate, zdict)
+  3   zstd    zstandard   yes (raw-content dictionary)
+  4   lz4     lz4         yes (lz4.block; the last 64 KiB of the dictionary)
+
+zstd and lz4 are optional like NumPy: they are always registered, and
+using one whose package is missing raises CodecUnavailable naming it.
+
+Brotli q11 spends milliseconds on a 200-byte JSON command and saves little
+on it. zlib or zstd with a dictionary trained on earlier packets get the
+same command down to a fraction of that in microseconds, because its keys
+and boilerplate are already in the dictionary.
+
+Dictionaries are raw content (no entropy tables), so one file serves zlib,
+zstd and lz4. ``train_dictionary`` picks them from sample packets in one
+COVER-style pass: the samples are cut into epochs and each epoch
+contributes its segment whose d-grams occur in the most samples; the best
+segments go last, where the match distances are shortest. A dictionary's
+id is the first four bytes of its blake2b, so it is the same everywhere
+and a wrong file is caught; ``DictionaryStore`` keeps them as
+``<dir>/<id:08x>.dict``.
+"""
+
+from __future__ import annotations
+import abc
+import hashlib
+import importlib
+import os
+import struct
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import brotli
+
+from oc8.headers import CODEC_COUNT, DICT_CODECS, FLAG_CODEC_MASK, FLAG_CODEC_SHIFT, FLAG_DICT
+
+
+DEFAULT_DICT_DIR = os.path.join('.qflush', 'cortex', 'dicts')
+DEFAULT_DICT_SIZE = 16 * 1024
+DICT_ID = struct.Struct('>I')
+# d-gram length and segment length used by the trainer
+TRAIN_DGRAM = 6
+TRAIN_SEGMENT = 48
+
+
+class CodecError(ValueError):
+    pass
+
+
+class CodecUnavailable(CodecError):
+    pass
+
+
+class Dictionary(NamedTuple):
+    id: int
+    data: bytes
+
+
+def dictionary_id(data: bytes) -> int:
+    return DICT_ID.unpack(hashlib.blake2b(data, digest_size=DICT_ID.size).digest())[0]
+
+
+def make_dictionary(data: bytes) -> Dictionary:
+    return Dictionary(dictionary_id(data), bytes(data))
+
+
+class Codec(abc.ABC):
+    """Whole-buffer compress/decompress plus an incremental decompressor (process(), finish())."""
+
+    name = ''
+    id = 0
+    package: Optional[str] = None  # optional dependency, imported on first use
+    dictionaries = False
+    default_level: Optional[int] = None
+
+    @property
+    def available(self) -> bool:
+        try:
+            self._module()
+        except CodecUnavailable:
+            return False
+        return True
+
+    def _module(self):
+        if self.package is None:
+            return None
+        try:
+            return importlib.import_module(self.package)
+        except ImportError:
+            raise CodecUnavailable(f"{self.name} codec needs the '{self.package.split('.')[0]}' package") from None
+
+    @abc.abstractmethod
+    def compress(self, raw, level: Optional[int] = None, dictionary: Optional[bytes] = None) -> bytes:
+        ...
+
+    def decompress(self, data, dictionary: Optional[bytes] = None) -> bytes:
+        dec = self.decompressor(dictionary)
+        return dec.process(data) + dec.finish()
+
+    @abc.abstractmethod
+    def decompressor(self, dictionary: Optional[bytes] = None):
+        ...
+
+
+class _BrotliDecompressor:
+    def __init__(self) -> None:
+        self._d = brotli.Decompressor()
+
+    def process(self, chunk) -> bytes:
+        try:
+            return self._d.process(chunk)
+        except brotli.error as e:
+            raise CodecError(f'brotli: {e}') from None
+
+    def finish(self) -> bytes:
+        if not self._d.is_finished():
+            raise CodecError('brotli stream truncated')
+        return b''
+
+
+class BrotliCodec(Codec):
+    name, id, default_level = 'brotli', 0, 11
+
+    def __init__(self, lgwin: int = 22, mode: int = brotli.MODE_GENERIC) -> None:
+        self.lgwin, self.mode = lgwin, mode
+
+    def compress(self, raw, level=None, dictionary=None) -> bytes:
+        return brotli.compress(bytes(raw), quality=self.default_level if level is None else level, lgwin=self.lgwin, mode=self.mode)
+
+    def decompressor(self, dictionary=None):
+        return _BrotliDecompressor()
+
+
+class _Passthrough:
+    def process(self, chunk) -> bytes:
+        return bytes(chunk)
+
+    def finish(self) -> bytes:
+        return b''
+
+
+class StoredCodec(Codec):
+    name, id = 'stored', 1
+
+    def compress(self, raw, level=None, dictionary=None) -> bytes:
+        return bytes(raw)
+
+    def decompressor(self, dictionary=None):
+        return _Passthrough()
+
+
+class _ZlibDecompressor:
+    def __init__(self, primed) -> None:
+        self._d = primed.copy()
+
+    def process(self, chunk) -> bytes:
+        if self._d.eof:
+            raise CodecError('zlib: data after the end of the stream')
+        try:
+            return self._d.decompress(chunk)
+        except zlib.error as e:
+            raise CodecError(f'zlib: {e}') from None
+
+    def finish(self) -> bytes:
+        if not self._d.eof or self._d.unused_data:
+            raise CodecError('zlib stream truncated' if not self._d.eof else 'zlib: data after the end of the stream')
+        return b''
+
+
+class ZlibCodec(Codec):
+    # raw deflate: the packet already carries its own checks, the zlib wrapper would add 6 bytes
+    # loading a dictionary costs more than deflating a small packet: objects are primed once and copied
+    name, id, dictionaries, default_level = 'zlib', 2, True, 9
+
+    def __init__(self) -> None:
+        self._primed: Dict = {}
+
+    def _prime(self, key, make):
+        if key[-1] is None:
+            return make()  # nothing to load: a fresh object is cheaper than a copy
+        obj = self._primed.get(key)
+        if obj is None:
+            if len(self._primed) >= 16:
+                self._primed.clear()
+            obj = self._primed[key] = make()
+        return obj.copy()
+
+    def compress(self, raw, level=None, dictionary=None) -> bytes:
+        level = self.default_level if level is None else level
+        kw = {'zdict': dictionary} if dictionary else {}
+        c = self._prime(('c', level, dictionary), lambda: zlib.compressobj(level, zlib.DEFLATED, -15, **kw))
+        return c.compress(raw) + c.flush()
+
+    def decompressor(self, dictionary=None):
+        kw = {'zdict': dictionary} if dictionary else {}
+        return _ZlibDecompressor(self._prime(('d', dictionary), lambda: zlib.decompressobj(-15, **kw)))
+
+
+class _ZstdDecompressor:
+    def __init__(self, zstd, dctx) -> None:
+        self._zstd = zstd
+        self._d = dctx.decompressobj()
+
+    def process(self, chunk) -> bytes:
+        try:
+            return self._d.decompress(bytes(chunk))
+        except self._zstd.ZstdError as e:
+            raise CodecError(f'zstd: {e}') from None
+
+    def finish(self) -> bytes:
+        if not self._d.eof:
+            raise CodecError('zstd frame truncated')
+        return b''
+
+
+class ZstdCodec(Codec):
+    name, id, package, dictionaries, default_level = 'zstd', 3, 'zstandard', True, 19
+
+    def _dict(self, zstd, dictionary):
+        return zstd.ZstdCompressionDict(dictionary, dict_type=zstd.DICT_TYPE_RAWCONTENT) if dictionary else None
+
+    def compress(self, raw, level=None, dictionary=None) -> bytes:
+        zstd = self._module()
+        cctx = zstd.ZstdCompressor(level=self.default_level if level is None else level, dict_data=self._dict(zstd, dictionary),
+                                   write_checksum=False, write_content_size=True, write_dict_id=False)
+        return cctx.compress(bytes(raw))
+
+    def decompressor(self, dictionary=None):
+        zstd = self._module()
+        return _ZstdDecompressor(zstd, zstd.ZstdDecompressor(dict_data=self._dict(zstd, dictionary)))
+
+
+class _Lz4Decompressor:
+    # lz4 blocks do not stream: collected, inflated in finish()
+    def __init__(self, codec: 'Lz4Codec', dictionary: Optional[bytes]) -> None:
+        self._codec = codec
+        self._dictionary = dictionary
+        self._buf = bytearray()
+
+    def process(self, chunk) -> bytes:
+        self._buf += chunk
+        return b''
+
+    def finish(self) -> bytes:
+        return self._codec.decompress(self._buf, self._dictionary)
+
+
+class Lz4Codec(Codec):
+    name, id, package, dictionaries, default_level = 'lz4', 4, 'lz4.block', True, 9
+
+    def compress(self, raw, level=None, dictionary=None) -> bytes:
+        block = self._module()
+        level = self.default_level if level is None else level
+        kw = {'dict': dictionary} if dictionary else {}
+        if level > 0:
+            return block.compress(bytes(raw), mode='high_compression', compression=level, **kw)
+        return block.compress(bytes(raw), **kw)
+
+    def decompress(self, data, dictionary=None) -> bytes:
+        block = self._module()
+        kw = {'dict': dictionary} if dictionary else {}
+        try:
+            return block.decompress(bytes(data), **kw)
+        except block.LZ4BlockError as e:
+            raise CodecError(f'lz4: {e}') from None
+
+    def decompressor(self, dictionary=None):
+        self._module()
+        return _Lz4Decompressor(self, dictionary)
+
+
+CODECS: Dict[str, Codec] = {c.name: c for c in (BrotliCodec(), StoredCodec(), ZlibCodec(), ZstdCodec(), Lz4Codec())}
+_BY_ID = {c.id: c for c in CODECS.values()}
+assert sorted(_BY_ID) == list(range(CODEC_COUNT))
+assert {c.id for c in CODECS.values() if c.dictionaries} == DICT_CODECS
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise CodecError(f'unknown codec {name!r} (known: {", ".join(CODECS)})') from None
+
+
+def codec_of(flags: int) -> Codec:
+    cid = (flags & FLAG_CODEC_MASK) >> FLAG_CODEC_SHIFT
+    try:
+        return _BY_ID[cid]
+    except KeyError:
+        raise CodecError(f'unknown codec id {cid}') from None
+
+
+def codec_name(flags: int) -> str:
+    """Codec name for reports; unknown ids read as 'codec<N>'."""
+    cid = (flags & FLAG_CODEC_MASK) >> FLAG_CODEC_SHIFT
+    return _BY_ID[cid].name if cid in _BY_ID else f'codec{cid}'
+
+
+def codec_flags(name: str, dictionary: Optional[Dictionary] = None) -> int:
+    """Header flag bits for a payload compressed with ``name`` (and ``dictionary``)."""
+    return (get_codec(name).id << FLAG_CODEC_SHIFT) | (FLAG_DICT if dictionary is not None else 0)
+
+
+class DictionaryStore:
+    """Trained dictionaries on disk, as ``<dir>/<id:08x>.dict``; loaded ones are kept in memory."""
+
+    def __init__(self, root: str = DEFAULT_DICT_DIR) -> None:
+        self.root = root
+        self._loaded: Dict[int, Dictionary] = {}
+
+    def path(self, dict_id: int) -> str:
+        return os.path.join(self.root, f'{dict_id:08x}.dict')
+
+    def add(self, data: bytes) -> Dictionary:
+        d = make_dictionary(data)
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.path(d.id) + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(d.data)
+        os.replace(tmp, self.path(d.id))
+        self._loaded[d.id] = d
+        return d
+
+    def get(self, dict_id: int) -> Dictionary:
+        d = self._loaded.get(dict_id)
+        if d is not None:
+            return d
+        try:
+            with open(self.path(dict_id), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise CodecError(f'dictionary {dict_id:08x} not found in {self.root}') from None
+        if dictionary_id(data) != dict_id:
+            raise CodecError(f'{self.path(dict_id)}: content does not match its id')
+        d = self._loaded[dict_id] = Dictionary(dict_id, data)
+        return d
+
+    def lookup(self, spec: str) -> Dictionary:
+        """A dictionary by hex id, or a dictionary file path."""
+        if os.path.isfile(spec):
+            with open(spec, 'rb') as f:
+                return make_dictionary(f.read())
+        try:
+            return self.get(int(spec, 16))
+        except ValueError:
+            raise CodecError(f'not a dictionary id or file: {spec!r}') from None
+
+    def ids(self) -> List[int]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(n[:-5], 16) for n in os.listdir(self.root) if n.endswith('.dict') and len(n) == 13)
+
+
+def encode_region(raw, codec: str = 'brotli', level: Optional[int] = None, dictionary: Optional[Dictionary] = None) -> bytes:
+    """Compressed region for ``codec``: [dictionary id ||] codec output."""
+    c = get_codec(codec)
+    if dictionary is None:
+        return c.compress(raw, level)
+    if not c.dictionaries:
+        raise CodecError(f'{c.name} codec does not take a dictionary')
+    return DICT_ID.pack(dictionary.id) + c.compress(raw, level, dictionary.data)
+
+
+class RegionDecoder:
+    """Incremental decoder for a compressed region; reads the dictionary id first when FLAG_DICT is set."""
+
+    def __init__(self, flags: int, store: Optional[DictionaryStore] = None) -> None:
+        self.codec = codec_of(flags)
+        self._store = store
+        self._id = bytearray() if flags & FLAG_DICT else None
+        self._d = None if self._id is not None else self.codec.decompressor()
+
+    def process(self, chunk) -> bytes:
+        if self._d is None:
+            view = memoryview(chunk)
+            need = DICT_ID.size - len(self._id)
+            self._id += view[:need]
+            if len(self._id) < DICT_ID.size:
+                return b''
+            dictionary = (self._store or DictionaryStore()).get(DICT_ID.unpack(self._id)[0])
+            self._d = self.codec.decompressor(dictionary.data)
+            chunk = view[need:]
+        return self._d.process(chunk)
+
+    def finish(self) -> bytes:
+        if self._d is None:
+            raise CodecError('compressed region ends inside the dictionary id')
+        return self._d.finish()
+
+
+def decode_region(flags: int, region, store: Optional[DictionaryStore] = None) -> bytes:
+    dec = RegionDecoder(flags, store)
+    return dec.process(region) + dec.finish()
+
+
+def train_dictionary(samples: Iterable[bytes], size: int = DEFAULT_DICT_SIZE, dgram: int = TRAIN_DGRAM, segment: int = TRAIN_SEGMENT) -> bytes:
+    """Raw-content dictionary of at most ``size`` bytes from sample packets (see the module docstring)."""
+    samples = [bytes(s) for s in samples if len(s) >= dgram]
+    if not samples:
+        raise CodecError(f'no samples of at least {dgram} bytes')
+    # document frequency: a d-gram repeated inside one sample is not what a dictionary is for
+    freq = Counter()
+    for s in samples:
+        freq.update({s[i:i + dgram] for i in range(len(s) - dgram + 1)})
+    total = sum(len(s) for s in samples)
+    epochs = max(1, size // segment)
+    epoch_bytes = max(segment, total // epochs)
+    picked = []
+
+    def best_in(pieces):
+        best = (0, b'')
+        span = segment - dgram + 1
+        for piece in pieces:
+            scores = [freq[piece[i:i + dgram]] if freq[piece[i:i + dgram]] > 1 else 0 for i in range(len(piece) - dgram + 1)]
+            run = sum(scores[:span])
+            top, at = run, 0
+            for i in range(1, len(scores) - span + 1):
+                run += scores[i + span - 1] - scores[i - 1]
+                if run > top:
+                    top, at = run, i
+            if top > best[0]:
+                best = (top, piece[at:at + segment])
+        return best
+
+    epoch, filled = [], 0
+    pieces = (s[p:p + epoch_bytes] for s in samples for p in range(0, len(s), epoch_bytes))
+    for piece in pieces:
+        epoch.append(piece)
+        filled += len(piece)
+        if filled < epoch_bytes:
+            continue
+        score, seg = best_in(epoch)
+        if score:
+            picked.append((score, seg))
+            for i in range(len(seg) - dgram + 1):
+                freq[seg[i:i + dgram]] = 0  # covered: later epochs look for something else
+        epoch, filled = [], 0
+    if epoch:
+        score, seg = best_in(epoch)
+        if score:
+            picked.append((score, seg))
+    picked.sort(key=lambda p: p[0])
+    out = b''.join(seg for _, seg in picked)
+    return out[-size:]
@@ -0,0 +1,241 @@
+"""
+Delta Cortex packets: a file as chunks of a base plus the chunks that are new.
+
+A regenerated dump differs from the previous one in a few places, but
+every byte is compressed and shipped again. Here both files are cut into
+content-defined chunks (an edit moves the boundaries near it only), and
+the packet carries just the chunks the base does not already have plus a
+recipe that references the rest by hash. Encode time (Brotli runs on the
+new chunks only) and pixels follow the size of the change.
+
+The header carries payload kind FLAG_DELTA (3 in the 2-bit kind field, flags bits 0..1):
+
+  payload  = recipe_len(uint32 BE) || Brotli(recipe) || Brotli(new chunks) || crc8
+  recipe   = JSON {"v": 1, "chunker": [min, bits, max], "base": id, "size": n,
+                   "hash": blake2b-128 of the file, "ops": [...]}
+  op       = [hash, count]      count chunks, starting at the chunk with this hash, in the
+                                sequence it was found in (the base, or the file so far)
+             [len, len, ...]    new chunks of these lengths, next in the new-chunk stream
+
+Hashes are blake2b-64 of a chunk, in hex. The base is one or more byte
+sources (a previous file, the members of an archive) chunked with the
+recipe's parameters; the decoder needs the same sources, and the file
+hash catches a wrong one. ``base`` (blake2b-64 over the base's chunk
+hashes) names it in error messages.
+
+Chunk boundaries come from a Gear rolling hash (FastCDC style): a cut
+after byte i when the top CHUNK_BITS bits of the hash of the 32 bytes
+ending at i are zero, at least CHUNK_MIN and at most CHUNK_MAX bytes after
+the previous cut. NumPy computes the hash of every position in five
+doubling passes; without it a byte loop computes the same cuts.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import random
+import struct
+from typing import Dict, List, Sequence, Tuple
+
+import brotli
+
+from oc8 import trace
+from oc8.headers import FLAG_DELTA
+from oc8.parts import write_packet
+
+try:
+    import numpy as _np
+except ImportError:  # optional: byte loop is used instead
+    _np = None
+
+
+DELTA_VERSION = 1
+CHUNK_MIN = 2 * 1024
+CHUNK_BITS = 13  # ~8 KiB between hash cuts after CHUNK_MIN
+CHUNK_MAX = 64 * 1024
+_RECIPE_LEN = struct.Struct('>I')
+_rng = random.Random(0x0c8d)
+_GEAR = tuple(_rng.getrandbits(32) for _ in range(256))
+del _rng
+
+
+def chunk_bounds(data, min_size: int = CHUNK_MIN, bits: int = CHUNK_BITS, max_size: int = CHUNK_MAX) -> List[int]:
+    """End offsets of the content-defined chunks of ``data`` (the last one is len(data))."""
+    view = memoryview(data).cast('B')
+    n = len(view)
+    if n == 0:
+        return []
+    mask = ((1 << bits) - 1) << (32 - bits)
+    with trace.span('chunk', bytes=n):
+        hits = _hash_hits_numpy(view, mask) if _np is not None else None
+        ends = []
+        start = 0
+        if hits is not None:
+            while start < n:
+                # first hit that leaves at least min_size bytes in the chunk
+                k = int(_np.searchsorted(hits, start + min_size - 1))
+                end = int(hits[k]) + 1 if k < len(hits) else n
+                end = min(end, start + max_size, n)
+                ends.append(end)
+                start = end
+            return ends
+        h = 0
+        for i, b in enumerate(view):
+            h = ((h << 1) + _GEAR[b]) & 0xFFFFFFFF
+            size = i + 1 - start
+            if (size >= min_size and not h & mask) or size >= max_size:
+                ends.append(i + 1)
+                start = i + 1
+        if start < n:
+            ends.append(n)
+        return ends
+
+
+def _hash_hits_numpy(view, mask: int):
+    # gear hash of the 32 bytes ending at each position: h_{2m}[i] = (h_m[i-m] << m) + h_m[i]
+    gear = _np.array(_GEAR, dtype=_np.uint32)
+    h = gear[_np.frombuffer(view, dtype=_np.uint8)]
+    m = 1
+    while m < 32:
+        shifted = _np.zeros_like(h)
+        shifted[m:] = h[:-m] << _np.uint32(m)
+        h = h + shifted
+        m *= 2
+    return _np.flatnonzero((h & _np.uint32(mask)) == 0)
+
+
+def chunk_hash(chunk) -> str:
+    return hashlib.blake2b(chunk, digest_size=8).hexdigest()
+
+
+def split_chunks(data, params: Sequence[int] = (CHUNK_MIN, CHUNK_BITS, CHUNK_MAX)) -> List[memoryview]:
+    view = memoryview(data).cast('B')
+    out = []
+    start = 0
+    for end in chunk_bounds(view, *params):
+        out.append(view[start:end])
+        start = end
+    return out
+
+
+class DeltaBase:
+    """Chunks of the base sources, in order, indexed by hash (first occurrence wins)."""
+
+    def __init__(self, sources: Sequence[bytes], params: Sequence[int] = (CHUNK_MIN, CHUNK_BITS, CHUNK_MAX)) -> None:
+        self.params = tuple(params)
+        self.chunks: List[memoryview] = []
+        for src in sources:
+            self.chunks += split_chunks(src, self.params)
+        self.hashes = [chunk_hash(c) for c in self.chunks]
+        self.index: Dict[str, int] = {}
+        for i, h in enumerate(self.hashes):
+            self.index.setdefault(h, i)
+        self.size = sum(len(c) for c in self.chunks)
+        self.id = hashlib.blake2b(''.join(self.hashes).encode('ascii'), digest_size=8).hexdigest()
+
+
+def build_delta(raw, base: DeltaBase, quality: int = 11) -> Tuple[bytes, Dict]:
+    """Compressed region of a delta packet for ``raw`` against ``base``, plus counts for the report."""
+    chunks = split_chunks(raw, base.params)
+    hashes = [chunk_hash(c) for c in chunks]
+    # where a hash can be copied from: ('b', i) base chunk, ('f', i) earlier chunk of this file
+    known: Dict[str, Tuple[str, int]] = {h: ('b', i) for h, i in base.index.items()}
+    ops: List[list] = []
+    new = bytearray()
+    new_chunks = 0
+    i = 0
+    while i < len(chunks):
+        loc = known.get(hashes[i])
+        if loc is not None:
+            src, j = loc
+            seq = base.hashes if src == 'b' else hashes
+            count = 1
+            while i + count < len(chunks) and j + count < len(seq) and seq[j + count] == hashes[i + count]:
+                count += 1
+            ops.append([hashes[i], count])
+        else:
+            lengths = []
+            count = 0
+            while i + count < len(chunks) and hashes[i + count] not in known:
+                lengths.append(len(chunks[i + count]))
+                new += chunks[i + count]
+                known.setdefault(hashes[i + count], ('f', i + count))
+                count += 1
+            ops.append(lengths)
+            new_chunks += count
+        for k in range(i, i + count):
+            known.setdefault(hashes[k], ('f', k))
+        i += count
+    recipe = {'v': DELTA_VERSION, 'chunker': list(base.params), 'base': base.id, 'size': len(raw),
+              'hash': hashlib.blake2b(raw, digest_size=16).hexdigest(), 'ops': ops}
+    with trace.span('brotli_compress', bytes=len(new)):
+        blob = brotli.compress(json.dumps(recipe, separators=(',', ':')).encode('utf-8'), quality=quality)
+        region = _RECIPE_LEN.pack(len(blob)) + blob + brotli.compress(bytes(new), quality=quality)
+    info = {'chunks': len(chunks), 'new_chunks': new_chunks, 'new_bytes': len(new), 'ops': len(ops),
+            'base': base.id, 'base_chunks': len(base.chunks), 'region': len(region)}
+    return region, info
+
+
+def read_recipe(region) -> Tuple[Dict, memoryview]:
+    """(recipe, compressed new-chunk stream) of a delta region."""
+    view = memoryview(region).cast('B')
+    if len(view) < _RECIPE_LEN.size:
+        raise ValueError('delta region too short')
+    (n,) = _RECIPE_LEN.unpack_from(view, 0)
+    end = _RECIPE_LEN.size + n
+    if end > len(view):
+        raise ValueError('delta recipe truncated')
+    recipe = json.loads(brotli.decompress(view[_RECIPE_LEN.size:end]))
+    if recipe.get('v') != DELTA_VERSION:
+        raise ValueError(f"unsupported delta version {recipe.get('v')}")
+    return recipe, view[end:]
+
+
+def apply_delta(region, sources: Sequence[bytes]) -> bytes:
+    """Rebuild the file from a delta region and the base sources it was encoded against."""
+    recipe, stream = read_recipe(region)
+    base = DeltaBase(sources, recipe['chunker'])
+    new = memoryview(brotli.decompress(stream))
+    pos = 0
+    out = bytearray()
+    chunks: List[memoryview] = []  # this file's chunks so far, as views of the base or of new
+    seen: Dict[str, int] = {}
+    for op in recipe['ops']:
+        if op and isinstance(op[0], str):
+            h, count = op
+            if h in base.index:
+                seq, j = base.chunks, base.index[h]
+            elif h in seen:
+                seq, j = chunks, seen[h]
+            else:
+                raise ValueError(f'chunk {h} is not in the base ({base.id}, recipe wants {recipe["base"]}): wrong base?')
+            if j + count > len(seq) and seq is base.chunks:
+                raise ValueError(f'base too short for a run of {count} chunks at {h}')
+            for k in range(count):
+                c = seq[j + k]
+                seen.setdefault(h if k == 0 else chunk_hash(c), len(chunks))
+                chunks.append(c)
+                out += c
+        else:
+            for length in op:
+                c = new[pos:pos + length]
+                if len(c) != length:
+                    raise ValueError('delta new-chunk stream truncated')
+                pos += length
+                seen.setdefault(chunk_hash(c), len(chunks))
+                chunks.append(c)
+                out += c
+    if len(out) != recipe['size'] or hashlib.blake2b(out, digest_size=16).hexdigest() != recipe['hash']:
+        raise ValueError(f'delta output does not match its hash: wrong base? (recipe wants {recipe["base"]}, have {base.id})')
+    return bytes(out)
+
+
+def encode_delta_to_pngs(input_path: str, output_prefix: str, sources: Sequence[bytes], max_png_bytes: int = 200 * 1024 * 1024, brotli_quality: int = 11, max_width: int = 4096, jobs: int = 1, manifest: bool = True, compress_level: int = 0, layout: str = 'rgb', check32: bool = False) -> Tuple[List[str], Dict]:
+    with open(input_path, 'rb') as f:
+        raw = f.read()
+    with trace.span('delta_base', sources=len(sources)):
+        base = DeltaBase(sources)
+    region, info = build_delta(raw, base, brotli_quality)
+    info['raw'] = len(raw)
+    paths = write_packet(output_prefix, region, FLAG_DELTA, check32, manifest, layout, max_png_bytes=max_png_bytes, max_width=max_width, compress_level=compress_level, jobs=jobs)
+    return paths, info
@@ -0,0 +1,238 @@
+"""
+Cortex header parsing and the candidate-header index used by scanners.
+
+Instead of trying CRC + Brotli at every offset, ``find_header_candidates``
+scores every offset of a stream at once from the 16-byte header layout
+alone:
+
+  reserved     bytes 9..15 are all zero
+  length_pair  total_len == payload_len + 16 and payload_len >= 1
+  flags        flags byte is a combination writers produce (see flags_valid): a registered
+               codec, codec/dict bits on plain payloads only, the dict bit only with a codec
+               that takes dictionaries, and the RGBA bit matching the layout when it is known
+  fits         offset + 16 + payload_len <= len(stream)
+
+The stages run in this order and each count is of offsets rejected there.
+With NumPy, whole-window uint8 slices carry the reserved test and the low
+byte of the length pair (low(total_len) == low(payload_len) + 16 mod 256);
+only the few offsets passing both are gathered and widened, so zero-filled
+padding scans as fast as random data.
+
+Each offset is checked big-endian and little-endian. Survivors come back
+in scan order (offset ascending, BE before LE), so the first one that
+verifies is the same one the old byte-by-byte scan would have found.
+NumPy is used when available, in fixed windows to bound memory; otherwise
+zero runs are located with ``re`` and only those offsets are examined.
+
+``verify_payload`` then checks a survivor's trailer before anyone pays
+for Brotli: the CRC-32 check word first on FLAG_CHECK32 packets (a wrong
+offset gets through about once in 2**32), then the CRC-8 every packet
+ends with.
+"""
+
+from __future__ import annotations
+import re
+import struct
+import zlib
+from collections import Counter
+from typing import List, NamedTuple, Optional, Tuple
+
+from oc8 import trace
+from oc8.crc import CHECK32_SIZE, check32_word, crc8_oc8
+
+try:
+    import numpy as _np
+except ImportError:  # optional: regex path is used instead
+    _np = None
+
+
+HEADER_SIZE = 16
+# bits 0..1 are one 2-bit field, the payload kind: compare ``flags & PAYLOAD_KIND_MASK`` (or use
+# payload_kind()) with the values below, never test FLAG_ARCHIVE or FLAG_BLOCKS on their own
+PAYLOAD_KIND_MASK = 0x03
+# payload is a multi-member archive (see oc8.archive)
+FLAG_ARCHIVE = 0x01
+# payload is a sequence of independently compressed blocks plus an index (see oc8.blocks)
+FLAG_BLOCKS = 0x02
+# payload is a chunk recipe against a base (see oc8.delta)
+FLAG_DELTA = 0x03
+# packet bytes fill all four channels of RGBA parts (see oc8.parts); describes the carrier, not the payload
+FLAG_RGBA = 0x04
+# payload ends with a CRC-32 check word before the crc8 (see oc8.crc.PacketCheck)
+FLAG_CHECK32 = 0x08
+# bits 4..6: payload codec id, 0 = Brotli (see oc8.codecs)
+FLAG_CODEC_SHIFT = 4
+FLAG_CODEC_MASK = 0x70
+CODEC_COUNT = 5
+# compressed region starts with a uint32 BE dictionary id (see oc8.codecs)
+FLAG_DICT = 0x80
+# codec ids that take a dictionary (oc8.codecs checks its registry against this)
+DICT_CODECS = frozenset({2, 3, 4})
+# flag bits defined by the format so far; anything else is treated as noise
+KNOWN_FLAGS = PAYLOAD_KIND_MASK | FLAG_RGBA | FLAG_CHECK32 | FLAG_CODEC_MASK | FLAG_DICT
+STAGES = ('reserved', 'length_pair', 'flags', 'fits')
+_WINDOW = 1 << 22
+_RESERVED_RE = re.compile(rb'(?=\x00{7})')
+
+
+class HeaderCandidate(NamedTuple):
+    offset: int
+    endian: str  # 'be' or 'le'
+    total_len: int
+    payload_len: int
+    flags: int
+
+
+def parse_header(buf, offset: int = 0, endian: str = 'be') -> Optional[HeaderCandidate]:
+    if offset + HEADER_SIZE > len(buf):
+        return None
+    fmt = '>I I B' if endian == 'be' else '<I I B'
+    total_len, payload_len, flags = struct.unpack_from(fmt, buf, offset)
+    return HeaderCandidate(offset, endian, total_len, payload_len, flags)
+
+
+def payload_kind(flags: int) -> str:
+    """'plain', 'archive', 'blocks' or 'delta', from flags bits 0..1."""
+    return ('plain', 'archive', 'blocks', 'delta')[flags & PAYLOAD_KIND_MASK]
+
+
+def flags_valid(flags: int, layout: Optional[str] = None) -> bool:
+    """Whether a flags byte is one the format can produce; ``layout`` ('rgb'/'rgba') of the bytes it was read from, if known."""
+    codec = (flags & FLAG_CODEC_MASK) >> FLAG_CODEC_SHIFT
+    if flags & ~KNOWN_FLAGS or codec >= CODEC_COUNT:
+        return False
+    if flags & PAYLOAD_KIND_MASK and flags & (FLAG_CODEC_MASK | FLAG_DICT):
+        return False  # archive, block and delta payloads are Brotli only
+    if flags & FLAG_DICT and codec not in DICT_CODECS:
+        return False
+    if layout is not None and bool(flags & FLAG_RGBA) != (layout == 'rgba'):
+        return False
+    return True
+
+
+# flags_valid() for every byte value, per layout (None: unknown)
+_VALID_FLAGS = {layout: bytes(flags_valid(f, layout) for f in range(256)) for layout in (None, 'rgb', 'rgba')}
+
+
+def trailer_size(flags: int) -> int:
+    """Payload bytes after the compressed region: crc8, plus the check word on FLAG_CHECK32 packets."""
+    return 1 + (CHECK32_SIZE if flags & FLAG_CHECK32 else 0)
+
+
+def verify_payload(buf, c: HeaderCandidate, **fields) -> Optional[str]:
+    """Check the payload trailer of a candidate that fits in ``buf``; returns the failed check ('check32' or 'crc') or None."""
+    start = c.offset + HEADER_SIZE
+    payload = memoryview(buf)[start:start + c.payload_len]
+    if c.flags & FLAG_CHECK32:
+        if c.payload_len < trailer_size(c.flags):
+            return 'check32'
+        (word,) = struct.unpack_from('>I', payload, c.payload_len - 1 - CHECK32_SIZE)
+        region = payload[:-1 - CHECK32_SIZE]
+        with trace.span('check32', bytes=len(region), offset=c.offset, **fields):
+            ok = check32_word(zlib.crc32(region), buf[c.offset:start]) == word
+        if not ok:
+            return 'check32'
+    with trace.span('crc', bytes=len(payload) - 1, offset=c.offset, **fields):
+        ok = crc8_oc8(payload[:-1]) == payload[-1]
+    return None if ok else 'crc'
+
+
+def _check(c: HeaderCandidate, length: int, flags_mask: int, valid: bytes) -> Optional[str]:
+    # returns the first failed stage name, or None if the header is plausible
+    if c.payload_len < 1 or c.total_len != c.payload_len + HEADER_SIZE:
+        return 'length_pair'
+    if c.flags & ~flags_mask or not valid[c.flags]:
+        return 'flags'
+    if c.offset + HEADER_SIZE + c.payload_len > length:
+        return 'fits'
+    return None
+
+
+def _scan_regex(buf, n_offsets: int, flags_mask: int, valid: bytes, stats: Counter) -> List[HeaderCandidate]:
+    out = []
+    length = len(buf)
+    seen = 0
+    for m in _RESERVED_RE.finditer(buf, 9, n_offsets + HEADER_SIZE - 1):
+        off = m.start() - 9
+        if off >= n_offsets:
+            break
+        seen += 1
+        for endian in ('be', 'le'):
+            c = parse_header(buf, off, endian)
+            failed = _check(c, length, flags_mask, valid)
+            if failed:
+                stats[failed] += 1
+            else:
+                out.append(c)
+    stats['reserved'] += 2 * (n_offsets - seen)
+    return out
+
+
+def _scan_numpy(buf, n_offsets: int, flags_mask: int, valid: bytes, stats: Counter) -> List[HeaderCandidate]:
+    a = _np.frombuffer(buf, dtype=_np.uint8)
+    table = _np.frombuffer(bytes(v and not f & ~flags_mask for f, v in enumerate(valid)), dtype=_np.bool_)
+    length = len(a)
+    found = []
+    for w0 in range(0, n_offsets, _WINDOW):
+        cnt = min(_WINDOW, n_offsets - w0)
+        seg = a[w0:w0 + cnt + HEADER_SIZE - 1]
+        zero = seg[9:9 + cnt] == 0
+        for k in range(10, 16):
+            zero &= seg[k:k + cnt] == 0
+        n_zero = int(_np.count_nonzero(zero))
+        stats['reserved'] += 2 * (cnt - n_zero)
+        if not n_zero:
+            continue
+        plus = seg + _np.uint8(HEADER_SIZE)
+        for endian in ('be', 'le'):
+            order = range(4) if endian == 'be' else range(3, -1, -1)
+            # total == payload + 16 implies it for the low bytes (mod 256): a uint8 test on whole
+            # slices that drops almost every offset of zero-filled or random data before any gather
+            low = order[-1]
+            idx = _np.flatnonzero(zero & (seg[low:low + cnt] == plus[low + 4:low + 4 + cnt]))
+            total = _np.zeros(len(idx), dtype=_np.uint64)
+            payload = _np.zeros(len(idx), dtype=_np.uint64)
+            for k in order:
+                total = (total << _np.uint64(8)) | seg[idx + k].astype(_np.uint64)
+                payload = (payload << _np.uint64(8)) | seg[idx + k + 4].astype(_np.uint64)
+            pair = (payload >= 1) & (total == payload + HEADER_SIZE)
+            stats['length_pair'] += n_zero - int(_np.count_nonzero(pair))
+            flag_ok = pair & table[seg[idx + 8]]
+            stats['flags'] += int(_np.count_nonzero(pair & ~flag_ok))
+            offs = idx.astype(_np.uint64) + _np.uint64(w0)
+            fits = flag_ok & (offs + _np.uint64(HEADER_SIZE) + payload <= _np.uint64(length))
+            stats['fits'] += int(_np.count_nonzero(flag_ok & ~fits))
+            for i in _np.flatnonzero(fits):
+                found.append(HeaderCandidate(int(offs[i]), endian, int(total[i]), int(payload[i]), int(seg[idx[i] + 8])))
+    found.sort(key=lambda c: (c.offset, c.endian != 'be'))
+    return found
+
+
+def find_header_candidates(buf, max_offset: Optional[int] = None, flags_mask: int = KNOWN_FLAGS, layout: Optional[str] = None) -> Tuple[List[HeaderCandidate], Counter]:
+    """Plausible header positions in scan order, plus per-stage rejection counts.
+
+    Counts are per (offset, endianness) pair; stats['offsets'] is the number
+    of offsets examined. ``layout`` is the channel layout ``buf`` was extracted
+    with, when the caller knows it.
+    """
+    valid = _VALID_FLAGS[layout]
+    buf = memoryview(buf).cast('B')
+    n_offsets = max(0, len(buf) - HEADER_SIZE + 1)
+    if max_offset is not None:
+        n_offsets = min(n_offsets, max_offset + 1)
+    stats = Counter({s: 0 for s in STAGES})
+    stats['offsets'] = n_offsets
+    with trace.span('header_scan', bytes=len(buf), offsets=n_offsets) as sp:
+        if _np is not None:
+            found = _scan_numpy(buf, n_offsets, flags_mask, valid, stats)
+        else:
+            found = _scan_regex(buf, n_offsets, flags_mask, valid, stats)
+        sp.set(candidates=len(found))
+    stats['candidates'] = len(found)
+    trace.count('header_offsets', n_offsets)
+    return found, stats
+
+
+def format_stats(stats: Counter) -> str:
+    keys = ('offsets',) + STAGES + ('candidates',) + tuple(k for k in stats if k not in STAGES and k not in ('offsets', 'candidates'))
+    return ' '.join(f'{k}={stats[k]}' for k in keys)
@@ -0,0 +1,156 @@
+"""
+Self-describing Cortex PNG parts.
+
+Each part written by ``PngPartWriter`` carries a ``cortex-part`` tEXt chunk
+(placed before IDAT, so it is readable from ``Image.open`` without
+inflating pixels) holding compact JSON:
+
+  v        manifest version (1)
+  stream   id shared by all parts of one packet
+  index    part index, 0-based
+  count    number of parts (always in part 0; in every part when known up front)
+  offset   byte offset of this part's data within the packet
+  length   packet bytes in this part (the rest is padding)
+  total    packet length (same rule as count)
+  layout   channel layout of the data: 'rgb' or 'rgba' (alpha carries data too)
+  hash     blake2b-128 of this part's data bytes
+
+Decoders use it to order parts, pick the channel layout and verify every
+part on its own. Images without the chunk are legacy and go through the
+old strategy/order heuristics.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from oc8 import pngio, rows
+
+
+MANIFEST_KEY = 'cortex-part'
+MANIFEST_VERSION = 1
+
+
+def part_hash(data) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def stream_id_for(data) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def make_manifest(stream: str, index: int, offset: int, data, layout: str = 'rgb', count: Optional[int] = None, total: Optional[int] = None) -> Dict:
+    m = {'v': MANIFEST_VERSION, 'stream': stream, 'index': index, 'offset': offset, 'length': len(data), 'layout': layout, 'hash': part_hash(data)}
+    if count is not None:
+        m['count'] = count
+    if total is not None:
+        m['total'] = total
+    return m
+
+
+def manifest_text(manifest: Dict) -> str:
+    return json.dumps(manifest, separators=(',', ':'), sort_keys=True)
+
+
+def read_manifest(img) -> Optional[Dict]:
+    raw = getattr(img, 'info', {}).get(MANIFEST_KEY)
+    if raw is None:
+        return None
+    try:
+        m = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(m, dict) or m.get('v') != MANIFEST_VERSION:
+        return None
+    return m
+
+
+def read_manifest_file(source) -> Optional[Dict]:
+    # paths or PNG bytes (see oc8.rows.open_png); an open image is read as is
+    if pngio.is_image(source):
+        return read_manifest(source)
+    with Image.open(rows.pillow_source(source)) as img:
+        return read_manifest(img)
+
+
+def plan_parts(paths: List) -> Optional[List[Tuple[object, Dict]]]:
+    """Ordered (part, manifest) list for one complete stream, or None for legacy input.
+
+    Parts are anything ``oc8.pngio.open_image`` takes: paths, PNG bytes, images.
+
+    Raises ValueError if manifests are present but inconsistent (missing
+    parts, several streams, mixed legacy/manifest input).
+    """
+    found = [(p, read_manifest_file(p)) for p in paths]
+    tagged = [(p, m) for p, m in found if m is not None]
+    if not tagged:
+        return None
+    if len(tagged) != len(found):
+        legacy = [rows.source_name(p) if not pngio.is_image(p) else '<image>' for p, m in found if m is None]
+        raise ValueError(f'mixed legacy and manifest parts: {legacy}')
+    streams = {}
+    for p, m in tagged:
+        streams.setdefault(m['stream'], []).append((p, m))
+    if len(streams) > 1:
+        raise ValueError(f'parts from {len(streams)} Cortex streams matched ({", ".join(sorted(streams))}); narrow the input')
+    parts = sorted(next(iter(streams.values())), key=lambda pm: pm[1]['index'])
+    count = next((m['count'] for _, m in parts if 'count' in m), None)
+    if count is None:
+        raise ValueError('part 0 (with the part count) is missing')
+    indices = [m['index'] for _, m in parts]
+    if indices != list(range(count)):
+        raise ValueError(f'expected parts 0..{count - 1}, got {indices}')
+    return parts
+
+
+def verified_part_data(img, manifest: Dict, extract) -> bytes:
+    data = extract(img, manifest['layout'])
+    if len(data) < manifest['length']:
+        raise ValueError(f"part {manifest['index']}: {len(data)} bytes, manifest says {manifest['length']}")
+    data = data[:manifest['length']]
+    if part_hash(data) != manifest['hash']:
+        raise ValueError(f"part {manifest['index']}: hash mismatch")
+    return data
+
+
+class PacketRangeReader:
+    """Random access to packet bytes through the part manifests.
+
+    read(offset, length) loads (and verifies) only the parts overlapping the
+    range; loaded parts are kept so neighbouring reads do not reload them.
+    """
+
+    def __init__(self, parts: List[Tuple[str, Dict]], extract) -> None:
+        self.parts = parts
+        self.extract = extract
+        self.total = next(m['total'] for _, m in parts if 'total' in m)
+        self._loaded: Dict[int, bytes] = {}
+
+    @property
+    def parts_loaded(self) -> List[int]:
+        return sorted(self._loaded)
+
+    def _part(self, idx: int) -> bytes:
+        data = self._loaded.get(idx)
+        if data is None:
+            path, m = self.parts[idx]
+            with pngio.open_image(path) as img:
+                data = verified_part_data(img, m, self.extract)
+            self._loaded[idx] = data
+        return data
+
+    def read(self, offset: int, length: int) -> bytes:
+        if offset < 0 or offset + length > self.total:
+            raise ValueError(f'range {offset}+{length} outside packet of {self.total} bytes')
+        out = bytearray()
+        end = offset + length
+        for idx, (_, m) in enumerate(self.parts):
+            lo, hi = m['offset'], m['offset'] + m['length']
+            if hi <= offset or lo >= end:
+                continue
+            data = self._part(idx)
+            out += memoryview(data)[max(offset, lo) - lo:min(end, hi) - lo]
+        return bytes(out)
@@ -0,0 +1,238 @@
+"""
+PNG part layout for Cortex packets.
+
+A packet (header + payload) is cut into RGB parts of at most
+``max_png_bytes // 3`` pixels. Every part except the last is a whole number
+of rows, so concatenating the parts' RGB bytes gives back the packet with
+padding only at the very end. The last part keeps the near-square layout
+used by ``encodePacketToPNGs`` in ``src/cortex/codec.ts``.
+
+With ``layout='rgba'`` the alpha channel carries packet bytes too: 4 bytes
+per pixel, ``max_png_bytes // 4`` pixels per part, so a quarter fewer
+pixels and rows per payload byte. The encoders then set FLAG_RGBA in the
+packet header (see ``layout_flag``) and the part manifests say
+``layout: rgba``, so decoders never have to guess.
+
+``PngPartWriter`` accepts the packet incrementally and saves each part as
+soon as it is full, so encoders never hold more than two parts in memory
+(plus one per extra job: with ``jobs > 1`` parts are deflated and written
+on a thread pool, zlib releases the GIL). Parts are written by
+``oc8.pngio.write_png``: unfiltered rows, stored deflate at level 0.
+Without an output prefix the parts stay in memory instead: PNG bytes, or
+Pillow images built on the part buffers (manifest in ``img.info``).
+"""
+
+from __future__ import annotations
+import math
+import struct
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from oc8 import pngio, trace
+from oc8.crc import PacketCheck
+from oc8.headers import FLAG_CHECK32, FLAG_RGBA, HEADER_SIZE
+from oc8.manifest import MANIFEST_KEY, make_manifest, manifest_text, stream_id_for
+
+# part layout -> (PNG mode, packet bytes per pixel)
+LAYOUTS = {'rgb': ('RGB', 3), 'rgba': ('RGBA', 4)}
+
+
+def pack_bytes_to_rgb(stream: bytes, channels: int = 3) -> bytes:
+    pad = (channels - (len(stream) % channels)) % channels
+    if pad:
+        stream = stream + (b"\x00" * pad)
+    return stream
+
+
+def layout_flag(layout: str) -> int:
+    """Header flag bits an encoder adds for its part layout."""
+    if layout not in LAYOUTS:
+        raise ValueError(f'unknown part layout: {layout}')
+    return FLAG_RGBA if layout == 'rgba' else 0
+
+
+def last_part_geometry(total_pixels: int, max_width: int = 4096) -> Tuple[int, int]:
+    if total_pixels == 0:
+        raise ValueError("No pixels to encode")
+    # choose width close to square but <= max_width
+    width = min(max_width, max(1, int(math.sqrt(total_pixels))))
+    return width, math.ceil(total_pixels / width)
+
+
+def pad_to_geometry(rgb_bytes: bytes, max_width: int = 4096, channels: int = 3) -> Tuple[bytes, int, int]:
+    width, height = last_part_geometry(len(rgb_bytes) // channels, max_width)
+    missing = width * height * channels - len(rgb_bytes)
+    if missing:
+        rgb_bytes = bytes(rgb_bytes) + (b"\x00" * missing)
+    return rgb_bytes, width, height
+
+
+def make_image_from_rgb(rgb_bytes: bytes, max_width: int = 4096) -> Image.Image:
+    rgb_bytes, width, height = pad_to_geometry(rgb_bytes, max_width)
+    return Image.frombytes("RGB", (width, height), rgb_bytes)
+
+
+def full_part_geometry(max_png_bytes: int, max_width: int = 4096, channels: int = 3) -> Tuple[int, int]:
+    """(width, height) of a full, non-final part: whole rows within the pixel budget."""
+    max_pixels = max(1, max_png_bytes // channels)
+    width = min(max_width, max(1, math.isqrt(max_pixels)))
+    return width, max(1, max_pixels // width)
+
+
+def part_name(output_prefix: str, idx: int) -> str:
+    return f"{output_prefix}_part{idx:02d}.png"
+
+
+class PngPartWriter:
+    """Incremental packet -> PNG parts writer.
+
+    write() appends packet bytes; full parts are saved immediately. The first
+    part is held back until close() so patch() can fill in header fields that
+    are only known once the whole payload has been produced.
+
+    With a stream_id every part gets a ``cortex-part`` manifest (see
+    oc8.manifest); part 0 is then always held so it can record the part
+    count. Pass total when the packet length is known up front to put
+    count/total in every part.
+
+    With output_prefix None, close() returns the parts themselves (PNG
+    bytes, or Pillow images with images=True) instead of file names.
+    """
+
+    def __init__(self, output_prefix: Optional[str], max_png_bytes: int = 200 * 1024 * 1024, max_width: int = 4096, compress_level: int = 0, hold_first: bool = False, jobs: int = 1, stream_id: Optional[str] = None, total: Optional[int] = None, layout: str = 'rgb', images: bool = False) -> None:
+        if layout not in LAYOUTS:
+            raise ValueError(f'unknown part layout: {layout}')
+        if images and output_prefix is not None:
+            raise ValueError('images=True keeps parts in memory; pass output_prefix=None')
+        self.images = images
+        self.layout = layout
+        self.mode, self.channels = LAYOUTS[layout]
+        self.output_prefix = output_prefix
+        self.max_width = max_width
+        self.compress_level = compress_level
+        self.stream_id = stream_id
+        self.total = total
+        self.hold_first = hold_first or stream_id is not None
+        self.width, self.height = full_part_geometry(max_png_bytes, max_width, self.channels)
+        self.part_bytes = self.width * self.height * self.channels
+        self._results: Dict[int, object] = {}  # part index -> file name, PNG bytes or image (or their Future)
+        self._idx = 0
+        self._buf = bytearray()  # grown on demand, never beyond part_bytes
+        self._held = None  # first part buffer kept for patch()
+        self.bytes_written = 0
+        self.jobs = max(1, jobs)
+        self._pool = ThreadPoolExecutor(max_workers=self.jobs) if self.jobs > 1 else None
+        self._pending = deque()
+
+    def write(self, data) -> None:
+        view = memoryview(data).cast('B')
+        pos = 0
+        while pos < len(view):
+            n = min(len(view) - pos, self.part_bytes - len(self._buf))
+            self._buf += view[pos:pos + n]
+            pos += n
+            if len(self._buf) == self.part_bytes:
+                self._flush_full()
+        self.bytes_written += len(view)
+
+    def patch(self, offset: int, data: bytes) -> None:
+        if offset + len(data) > self.part_bytes:
+            raise ValueError(f'patch range {offset}+{len(data)} exceeds first part size {self.part_bytes}; raise --max-png-bytes')
+        if self._held is not None:
+            target = self._held
+        elif self._idx == 0:
+            target = self._buf
+        else:
+            raise ValueError('first part already written; construct with hold_first=True to patch it')
+        if offset + len(data) > len(target):
+            raise ValueError('patch range not written yet')
+        target[offset:offset + len(data)] = data
+
+    def close(self) -> List:
+        if self._buf or self._idx == 0:
+            self._emit(self._idx, self._buf, full=False)
+            self._idx += 1
+        if self._held is not None:
+            self._emit(0, self._held, full=True)
+            self._held = None
+        self._buf = bytearray()
+        if self._pool is not None:
+            while self._pending:
+                self._pending.popleft().result()
+            self._pool.shutdown()
+            self._pool = None
+        return [r.result() if isinstance(r, Future) else r for _, r in sorted(self._results.items())]
+
+    def _flush_full(self) -> None:
+        if self._idx == 0 and self.hold_first:
+            self._held = self._buf
+        else:
+            self._emit(self._idx, self._buf, full=True)
+        self._idx += 1
+        self._buf = bytearray()
+
+    def _emit(self, idx: int, data: bytearray, full: bool) -> None:
+        if full:
+            pixels, width, height = data, self.width, self.height
+        else:
+            pixels, width, height = pad_to_geometry(pack_bytes_to_rgb(bytes(data), self.channels), self.max_width, self.channels)
+        text = None
+        if self.stream_id is not None:
+            total = self.total
+            if total is None and idx == 0:
+                # part 0 is emitted last, so everything has been written by now
+                total = self.bytes_written
+            count = max(1, math.ceil(total / self.part_bytes)) if total is not None else None
+            text = {MANIFEST_KEY: manifest_text(make_manifest(self.stream_id, idx, idx * self.part_bytes, data, layout=self.layout, count=count, total=total))}
+        self._save(pixels, width, height, idx, text)
+
+    def _save(self, pixels, width: int, height: int, idx: int, text=None) -> None:
+        name = part_name(self.output_prefix, idx) if self.output_prefix is not None else None
+        if self.images:
+            self._results[idx] = _part_image(pixels, width, height, text, self.mode)
+            return
+        if self._pool is None:
+            self._results[idx] = _save_png(pixels, width, height, name, self.compress_level, text, self.mode)
+            return
+        # bound the parts in flight so memory stays at ~jobs parts
+        while len(self._pending) >= self.jobs:
+            self._pending.popleft().result()
+        self._results[idx] = future = self._pool.submit(_save_png, pixels, width, height, name, self.compress_level, text, self.mode)
+        self._pending.append(future)
+
+
+def write_packet(output_prefix: Optional[str], region, flags: int = 0, check32: bool = False, manifest: bool = True, layout: str = 'rgb', **opts) -> List:
+    """Parts of the packet around a whole compressed ``region``: header, region, check word/crc8.
+
+    ``flags`` are the payload bits; layout and check32 add theirs. ``opts`` go to PngPartWriter.
+    """
+    check = PacketCheck(check32)
+    with trace.span('crc', bytes=len(region)):
+        check.update(region)
+    payload_len = len(region) + check.trailer_size
+    flags |= layout_flag(layout) | (FLAG_CHECK32 if check32 else 0)
+    header = struct.pack('>I I B 7s', payload_len + HEADER_SIZE, payload_len, flags, b'\x00' * 7)
+    writer = PngPartWriter(output_prefix, stream_id=stream_id_for(region) if manifest else None, total=payload_len + HEADER_SIZE, layout=layout, **opts)
+    writer.write(header)
+    writer.write(region)
+    writer.write(check.trailer(header))
+    return writer.close()
+
+
+def _save_png(pixels, width: int, height: int, name: Optional[str], compress_level: int, text=None, mode: str = 'RGB'):
+    # Brotli output does not deflate: no filtering, stored blocks unless a level is asked for
+    with trace.span('png_save', bytes=len(pixels), part=name, level=compress_level):
+        if name is None:
+            return pngio.png_bytes(pixels, width, height, mode, level=compress_level, text=text)
+        pngio.write_png(name, pixels, width, height, mode, level=compress_level, text=text)
+        return name
+
+
+def _part_image(pixels, width: int, height: int, text, mode: str) -> Image.Image:
+    # RGBA images share the part buffer; Pillow stores RGB with a pad byte, so that one copies
+    img = Image.frombuffer(mode, (width, height), pixels, 'raw', mode, 0, 1)
+    img.info.update(text or {})
+    return img
@@ -0,0 +1,231 @@
+"""
+Incremental, pipelined Cortex packet decoding.
+
+``iter_part_streams`` loads PNG part N+1 on a background thread while the
+caller consumes part N (zlib's inflate releases the GIL). Parts are read
+through ``oc8.pngio``: straight into a buffer for parts it wrote, Pillow
+for anything else.
+``PacketStreamDecoder`` accepts the concatenated packet bytes in any
+chunking, parses the 16-byte header as soon as it is complete, and pushes
+the payload through a running CRC and the packet's codec (Brotli unless the
+flags say otherwise, see ``oc8.codecs``) so output is written while later
+parts are still loading. FLAG_CHECK32 packets also
+get their CRC-32 check word verified at the end.
+
+Peak memory is bounded by one or two parts plus the Brotli window, not by
+the payload size.
+
+Block-framed packets (FLAG_BLOCKS, see ``oc8.blocks``) are cut into frames
+as they arrive and the frames are inflated on up to ``jobs`` threads,
+written in order. Delta packets (FLAG_DELTA, see ``oc8.delta``) are small
+by design: their region is collected and applied to the base at the end.
+
+``detect_layout`` tells RGBA-carrier parts (FLAG_RGBA) from RGB ones by
+reading the packet header from the first pixels of part 0, so manifest-less
+parts are decoded with the right layout on the first try.
+"""
+
+from __future__ import annotations
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Iterator, List, Optional, Sequence
+
+from PIL import Image
+
+from oc8 import pngio, rows, trace
+from oc8.blocks import FrameSplitter, decompress_frame
+from oc8.codecs import DictionaryStore, RegionDecoder, codec_of
+from oc8.crc import CHECK32_SIZE, Crc8Oc8, check32_word
+from oc8.delta import apply_delta
+from oc8.headers import FLAG_CHECK32, FLAG_CODEC_MASK, FLAG_DICT, FLAG_RGBA, payload_kind, trailer_size
+
+
+HEADER_SIZE = 16
+# compressed bytes handed to the decompressor per step; bounds the output burst
+FEED_CHUNK = 1 << 20
+
+
+def detect_layout(first_part) -> str:
+    """'rgba' if part 0 is RGBA and a FLAG_RGBA header starts its four-channel bytes, else 'rgb'."""
+    if pngio.is_image(first_part):
+        if first_part.mode != 'RGBA':
+            return 'rgb'
+        head = first_part.tobytes()[:HEADER_SIZE]
+    elif rows.read_info(first_part).mode != 'RGBA':
+        return 'rgb'
+    else:
+        head = rows.read_rgba_prefix(first_part, HEADER_SIZE)
+    if len(head) < HEADER_SIZE:
+        return 'rgb'
+    total_len, payload_len, flags = struct.unpack_from('>I I B', head)
+    if flags & FLAG_RGBA and total_len == payload_len + HEADER_SIZE and not any(head[9:HEADER_SIZE]):
+        return 'rgba'
+    return 'rgb'
+
+
+def iter_part_streams(paths: List, extractor: Callable[[Image.Image], bytes], prefetch: int = 1) -> Iterator[bytes]:
+    # paths, PNG bytes or open images (see oc8.pngio.open_image)
+    def load(path) -> bytes:
+        with pngio.open_image(path) as img:
+            with trace.span('png_inflate', part=img.filename) as sp:
+                img.load()
+                sp.set(bytes=len(img.mode) * img.width * img.height)
+            with trace.span('extract', part=img.filename) as sp:
+                data = extractor(img)
+                sp.set(bytes=len(data) if isinstance(data, (bytes, bytearray, memoryview)) else None)
+            return data
+
+    pool = ThreadPoolExecutor(max_workers=max(1, prefetch))
+    try:
+        pending = deque()
+        todo = iter(paths)
+        for p in todo:
+            pending.append(pool.submit(load, p))
+            if len(pending) > prefetch:
+                break
+        while pending:
+            data = pending.popleft().result()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append(pool.submit(load, nxt))
+            yield data
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class PacketStreamDecoder:
+    """Decode HEADER(16, big-endian) + Brotli payload [+ check word] + CRC-8 fed in arbitrary chunks."""
+
+    def __init__(self, out: BinaryIO, jobs: int = 1, dictionaries: Optional[DictionaryStore] = None, base: Optional[Sequence[bytes]] = None) -> None:
+        self.out = out
+        self.jobs = max(1, jobs)
+        self._header = bytearray()
+        self.payload_len = None
+        self.total_len = None
+        self.flags = None
+        self._remaining = 0  # compressed bytes still expected
+        self._trailer = bytearray()
+        self._trailer_size = 1
+        self._crc = Crc8Oc8()
+        self._crc32 = 0
+        self._dictionaries = dictionaries
+        self._decompressor = None
+        self._frames = None  # FrameSplitter for block-framed packets
+        self._base = base  # delta packets: byte sources of the base
+        self._delta = None
+        self._pool = None
+        self._pending = deque()
+        self.raw_len = 0
+
+    @property
+    def done(self) -> bool:
+        return self.payload_len is not None and len(self._trailer) == self._trailer_size
+
+    def feed(self, data) -> None:
+        view = memoryview(data).cast('B')
+        if self.payload_len is None:
+            need = HEADER_SIZE - len(self._header)
+            self._header += view[:need]
+            view = view[need:]
+            if len(self._header) < HEADER_SIZE:
+                return
+            self._parse_header()
+        if self.done:
+            return
+        take = min(len(view), self._remaining)
+        for pos in range(0, take, FEED_CHUNK):
+            chunk = view[pos:min(take, pos + FEED_CHUNK)]
+            with trace.span('crc', bytes=len(chunk)):
+                self._crc.update(chunk)
+                if self.flags & FLAG_CHECK32:
+                    self._crc32 = zlib.crc32(chunk, self._crc32)
+            if self._delta is not None:
+                self._delta += chunk
+            elif self._frames is None:
+                with trace.span(self._decompressor.codec.name, bytes=len(chunk)):
+                    raw = self._decompressor.process(chunk)
+                self._write(raw)
+            else:
+                self._submit(self._frames.feed(chunk))
+        self._remaining -= take
+        if self._remaining == 0:
+            self._trailer += view[take:take + self._trailer_size - len(self._trailer)]
+
+    def finish(self) -> None:
+        if self.payload_len is None:
+            raise ValueError('stream too short for Cortex header')
+        if not self.done:
+            raise ValueError(f'stream shorter than expected payload: missing {self._remaining + self._trailer_size - len(self._trailer)} bytes')
+        if self.flags & FLAG_CHECK32:
+            (word,) = struct.unpack_from('>I', self._trailer)
+            expected = check32_word(self._crc32, self._header)
+            if word != expected:
+                raise ValueError(f'CRC-32 check word mismatch: expected {expected:08x}, got {word:08x}')
+            self._crc.update(self._trailer[:CHECK32_SIZE])
+        expected = self._crc.digest()
+        checksum = self._trailer[-1]
+        if checksum != expected:
+            raise ValueError(f'CRC mismatch: expected {expected}, got {checksum}')
+        if self._frames is not None:
+            self._drain(0)
+            if not self._frames.finished:
+                raise ValueError('block stream has no end frame')
+        elif self._delta is not None:
+            with trace.span('delta', bytes=len(self._delta)):
+                self._write(apply_delta(self._delta, self._base))
+        else:
+            self._write(self._decompressor.finish())
+
+    def _parse_header(self) -> None:
+        total_len, payload_len, flags = struct.unpack('>I I B', bytes(self._header[:9]))
+        if payload_len < trailer_size(flags):
+            raise ValueError(f'payload_len<{trailer_size(flags)}')
+        kind = payload_kind(flags)
+        if kind == 'archive':
+            raise ValueError('packet is a multi-member archive; use the list/extract commands')
+        if kind == 'delta' and self._base is None:
+            raise ValueError('packet is a delta; decode it with its base (--delta-base)')
+        self.total_len, self.payload_len, self.flags = total_len, payload_len, flags
+        self._trailer_size = trailer_size(flags)
+        self._remaining = payload_len - self._trailer_size
+        if kind != 'plain' and flags & (FLAG_CODEC_MASK | FLAG_DICT):
+            raise ValueError(f'{kind} packets are plain Brotli (codec {codec_of(flags).name})')
+        if kind == 'delta':
+            self._delta = bytearray()
+        elif kind == 'blocks':
+            self._frames = FrameSplitter()
+            if self.jobs > 1:
+                self._pool = ThreadPoolExecutor(max_workers=self.jobs)
+        else:
+            self._decompressor = RegionDecoder(flags, self._dictionaries)
+
+    def _submit(self, frames: List[bytes]) -> None:
+        for frame in frames:
+            if self._pool is None:
+                self._write(decompress_frame(frame))
+                continue
+            self._pending.append(self._pool.submit(decompress_frame, frame))
+            self._drain(2 * self.jobs)
+
+    def _drain(self, keep: int) -> None:
+        try:
+            while len(self._pending) > keep:
+                self._write(self._pending.popleft().result())
+        except BaseException:
+            self.close()
+            raise
+        if keep == 0:
+            self.close()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        self._pending.clear()
+
+    def _write(self, raw: bytes) -> None:
+        if raw:
+            self.out.write(raw)
+            self.raw_len += len(raw)
@@ -0,0 +1,101 @@
+"""
+Channel / plane extraction for Cortex PNG parts.
+
+Everything works on the flat buffer returned by ``Image.tobytes()`` and
+never walks pixels in Python: single channels come out as strided views
+(NumPy) or one C-level step slice (bytes), alpha stripping is a single
+reshape-and-copy.
+
+Usage:
+  data = image_buffer(img, 'RGBA')
+  red = plane_bytes(data, 0)           # contiguous R plane
+  r, g, b, a = split_planes(data)      # zero-copy strided views
+  rgb = strip_alpha(data)              # RGBA -> interleaved RGB
+"""
+
+from __future__ import annotations
+from typing import Tuple
+
+try:
+    import numpy as _np
+except ImportError:  # optional: step slicing on bytes is used instead
+    _np = None
+
+
+CHANNEL_INDEX = {'R': 0, 'G': 1, 'B': 2, 'A': 3}
+MODE_CHANNELS = {'RGB': 3, 'RGBA': 4}
+# part manifest 'layout' value -> Pillow mode whose bytes carry the packet
+LAYOUT_MODES = {'rgb': 'RGB', 'rgba': 'RGBA'}
+
+
+def image_buffer(img, mode: str = 'RGBA') -> bytes:
+    # only convert when the stored mode differs; tobytes() is the one unavoidable copy
+    if img.mode != mode:
+        img = img.convert(mode)
+    return img.tobytes()
+
+
+def layout_bytes(img, layout: str) -> bytes:
+    try:
+        mode = LAYOUT_MODES[layout]
+    except KeyError:
+        raise ValueError(f'unknown part layout: {layout}') from None
+    return image_buffer(img, mode)
+
+
+def _whole_pixels(data, channels: int):
+    buf = memoryview(data).cast('B')
+    usable = len(buf) - (len(buf) % channels)
+    return buf if usable == len(buf) else buf[:usable]
+
+
+def plane(data, index: int, channels: int = 4):
+    """Zero-copy strided view of one channel (NumPy array or memoryview)."""
+    buf = _whole_pixels(data, channels)
+    if _np is not None:
+        return _np.frombuffer(buf, dtype=_np.uint8).reshape(-1, channels)[:, index]
+    return buf[index::channels]
+
+
+def split_planes(data, channels: int = 4) -> Tuple:
+    return tuple(plane(data, i, channels) for i in range(channels))
+
+
+def as_bytes(view) -> bytes:
+    # materialise a (possibly strided) view into one contiguous bytes object
+    if isinstance(view, bytes):
+        return view
+    if hasattr(view, 'tobytes'):
+        return view.tobytes()
+    return bytes(view)
+
+
+def plane_bytes(data, index: int, channels: int = 4) -> bytes:
+    """Contiguous copy of one channel, done in a single C-level pass."""
+    if isinstance(data, (bytes, bytearray)):
+        if len(data) % channels:
+            data = data[:len(data) - (len(data) % channels)]
+        return bytes(data[index::channels])
+    return as_bytes(plane(data, index, channels))
+
+
+def strip_alpha(data) -> bytes:
+    """RGBA -> interleaved RGB. Trailing partial pixels are dropped."""
+    buf = _whole_pixels(data, 4)
+    if _np is not None:
+        return _np.frombuffer(buf, dtype=_np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    src = bytes(buf)
+    out = bytearray((len(src) // 4) * 3)
+    out[0::3] = src[0::4]
+    out[1::3] = src[1::4]
+    out[2::3] = src[2::4]
+    return bytes(out)
+
+
+def rgb_from_image(img) -> bytes:
+    return image_buffer(img, 'RGB')
+
+
+def rgb_from_rgba_image(img) -> bytes:
+    # RGBA path: convert to RGBA first (keeps palette/alpha semantics), then drop A
+    return strip_alpha(image_buffer(img, 'RGBA'))
@@ -0,0 +1,239 @@
+"""
+Purpose-built PNG writer/reader for Cortex parts.
+
+Part pixels are Brotli output: PNG filtering and deflate buy nothing on
+them. Pillow still runs its adaptive filter and zlib over every byte
+when saving, and decoding goes through its generic decoder plus a
+``tobytes()`` copy (and ``convert()`` when modes differ).
+
+``write_png`` emits the PNG directly: filter type 0 on every row and
+deflate at ``level`` (0 = stored blocks, the default), with tEXt chunks
+before IDAT. The file is an ordinary 8-bit RGB/RGBA PNG that Pillow,
+pngjs and sharp (src/cortex/) open as usual. It goes to a path or to any
+writable binary file; ``png_bytes`` returns it in memory.
+
+``open_image`` returns a ``RawPng`` that reads IDAT straight into one
+preallocated buffer, dropping the filter bytes as the rows come out of
+inflate. It only handles what the writer produces (8-bit RGB/RGBA,
+non-interlaced, filter 0 on every row); anything else, such as parts
+saved by Pillow, is handed to Pillow transparently. It quacks like a
+Pillow image for the helpers in ``oc8.planes`` and ``oc8.manifest``
+(mode, size, info, filename, load, tobytes, convert). Parts may be paths
+or PNG bytes in any buffer (see ``oc8.rows.open_png``); ``open_image``
+also takes an image the caller already has and uses it as is.
+"""
+
+from __future__ import annotations
+import contextlib
+import io
+import struct
+import zlib
+from typing import Dict, Optional
+
+from oc8 import rows
+
+
+MODE_COLOR_TYPE = {'RGB': 2, 'RGBA': 6}
+CHANNELS = {'RGB': 3, 'RGBA': 4}
+IDAT_SIZE = 1 << 20
+# filtered rows handed to zlib per call
+_BAND_BYTES = 1 << 20
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(data, zlib.crc32(kind)))
+
+
+def _write_chunk(f, kind: bytes, data) -> int:
+    # written in pieces: IDAT bodies are large and need no concatenated copy
+    f.write(struct.pack('>I', len(data)) + kind)
+    f.write(data)
+    f.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+    return len(data) + 12
+
+
+def _text_chunk(key: str, value: str) -> bytes:
+    return _chunk(b'tEXt', key.encode('latin-1') + b'\x00' + value.encode('latin-1'))
+
+
+def write_png(path, data, width: int, height: int, mode: str = 'RGB', level: int = 0, text: Optional[Dict[str, str]] = None) -> int:
+    """Write ``data`` (``height`` rows of ``width`` pixels in ``mode``) as a PNG to a path or binary file; returns its size."""
+    stride = width * CHANNELS[mode]
+    view = memoryview(data).cast('B')
+    if len(view) != stride * height:
+        raise ValueError(f'{len(view)} bytes of pixel data, {width}x{height} {mode} needs {stride * height}')
+    zobj = zlib.compressobj(level)
+    band_rows = max(1, _BAND_BYTES // (stride + 1))
+    size = 0
+    with (open(path, 'wb') if rows.is_path(path) else contextlib.nullcontext(path)) as f:
+        head = [rows.PNG_SIGNATURE, _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, MODE_COLOR_TYPE[mode], 0, 0, 0))]
+        head += [_text_chunk(k, v) for k, v in (text or {}).items()]
+        f.write(b''.join(head))
+        size += sum(len(h) for h in head)
+        pending = bytearray()
+
+        def emit(final: bool) -> int:
+            n = 0
+            while len(pending) >= IDAT_SIZE or (final and pending):
+                n += _write_chunk(f, b'IDAT', memoryview(pending)[:IDAT_SIZE])
+                del pending[:IDAT_SIZE]
+            return n
+
+        for top in range(0, height, band_rows):
+            lines = [view[r * stride:(r + 1) * stride] for r in range(top, min(height, top + band_rows))]
+            pending += zobj.compress(b'\x00' + b'\x00'.join(lines))
+            size += emit(False)
+        pending += zobj.flush()
+        size += emit(True)
+        iend = _chunk(b'IEND', b'')
+        f.write(iend)
+        size += len(iend)
+    return size
+
+
+def png_bytes(data, width: int, height: int, mode: str = 'RGB', level: int = 0, text: Optional[Dict[str, str]] = None) -> bytes:
+    out = io.BytesIO()
+    write_png(out, data, width, height, mode, level, text)
+    return out.getvalue()  # hands over the BytesIO buffer, no copy
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class RawPng:
+    """Lazily loaded PNG part; see the module docstring."""
+
+    def __init__(self, source) -> None:
+        self._source = source
+        self.filename = rows.source_name(source)
+        info = rows.read_info(source)
+        self.size = (info.width, info.height)
+        self.width, self.height = self.size
+        self._info = info
+        self.mode = info.mode or 'unknown'
+        self.info: Dict[str, str] = {}
+        self._buf: Optional[bytearray] = None
+        self._img = None  # Pillow fallback
+        self._read_text()
+        if not info.streamable or self.mode not in CHANNELS:
+            self._pillow()
+
+    def _read_text(self) -> None:
+        with rows.open_png(self._source) as f:
+            for kind, body in rows._iter_chunks(f):
+                if kind == b'tEXt':
+                    key, _, value = body.partition(b'\x00')
+                    self.info[key.decode('latin-1')] = value.decode('latin-1')
+                elif kind == b'IDAT':
+                    return  # text after the pixels is not used by the tools
+
+    @property
+    def fast(self) -> bool:
+        return self._img is None
+
+    def _pillow(self):
+        if self._img is None:
+            from PIL import Image
+            self._img = Image.open(rows.pillow_source(self._source))
+            self._img.load()
+            self.mode = self._img.mode
+            self._buf = None
+        return self._img
+
+    def load(self) -> None:
+        if self._buf is not None or self._img is not None:
+            return
+        try:
+            self._buf = self._read_pixels()
+        except _Unsupported:
+            self._pillow()
+
+    def _read_pixels(self) -> bytearray:
+        stride = self._info.stride
+        line = stride + 1
+        total = stride * self.height
+        out = bytearray(total)
+        inflate = zlib.decompressobj()
+        pending = bytearray()
+        pos = 0  # bytes of ``out`` filled
+        with rows.open_png(self._source) as f:
+            for kind, body in rows._iter_chunks(f):
+                if kind != b'IDAT':
+                    continue
+                for piece in body:
+                    pending += inflate.decompress(piece)
+                    n = len(pending) // line
+                    if not n:
+                        continue
+                    filters = pending[0:n * line:line]
+                    if filters.count(0) != n:
+                        raise _Unsupported('filtered rows')
+                    if pos + n * stride > total:
+                        raise ValueError(f'{self.filename}: more image data than {self.width}x{self.height}')
+                    with memoryview(pending) as rows_in:
+                        for r in range(n):
+                            out[pos:pos + stride] = rows_in[r * line + 1:(r + 1) * line]
+                            pos += stride
+                    del pending[:n * line]
+                if pos == total:
+                    break
+        if pos != total:
+            raise ValueError(f'{self.filename}: image data ends {(total - pos) // stride} rows early')
+        return out
+
+    def tobytes(self):
+        self.load()
+        if self._img is not None:
+            return self._img.tobytes()
+        return self._buf
+
+    def convert(self, mode: str):
+        self.load()
+        if self._img is not None:
+            return self._img.convert(mode)
+        from PIL import Image
+        return Image.frombytes(self.mode, self.size, bytes(self._buf)).convert(mode)
+
+    def close(self) -> None:
+        if self._img is not None:
+            self._img.close()
+        self._buf = None
+
+    def __enter__(self) -> 'RawPng':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class _CallerImage:
+    """An image the caller opened, used as a part: attributes pass through, closing is left to the caller."""
+
+    def __init__(self, img) -> None:
+        self._img = img
+        self.filename = getattr(img, 'filename', '') or '<image>'
+
+    def __getattr__(self, name: str):
+        return getattr(self._img, name)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> '_CallerImage':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+def is_image(source) -> bool:
+    # a Pillow image (or RawPng) rather than a path or PNG bytes
+    return hasattr(source, 'mode') and hasattr(source, 'tobytes')
+
+
+def open_image(source) -> RawPng:
+    """A part from a path, PNG bytes in any buffer, or an already open image."""
+    if is_image(source):
+        return _CallerImage(source)
+    return RawPng(source)
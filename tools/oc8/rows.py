@@ -0,0 +1,314 @@
+"""
+Row-streaming PNG reads for large dump images.
+
+``iter_rgba_bands`` walks the PNG chunk by chunk, inflates IDAT with a
+``zlib.decompressobj`` and yields the image as RGBA bytes a band of rows
+at a time, so memory is about one band (``band_rows`` rows) whatever the
+image size. Unfiltering is left to Pillow's C decoder: each band of
+filtered scanlines is re-wrapped, behind the previous band's last
+unfiltered row, as a tiny stored-deflate PNG and decoded normally.
+
+``read_rgba_prefix`` stops after the first rows, so the first bytes of a
+huge dump cost milliseconds. For 8-bit RGB/RGBA those few rows are
+unfiltered in Python, so a prefix read does not even import Pillow.
+``trailing_nul_start`` finds where trailing NULs begin by scanning
+backward in small chunks (works on mmaps).
+
+Every reader takes a path or the PNG file itself in any buffer (bytes,
+bytearray, mmap, memoryview); ``open_png`` reads a buffer in place.
+
+Interlaced and non-8-bit images are not streamable; they fall back to a
+whole-image decode through ``planes.image_buffer``.
+"""
+
+from __future__ import annotations
+import io
+import os
+import struct
+import zlib
+from typing import Iterator, NamedTuple, Optional
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+BAND_BYTES = 256 * 1024
+_READ_CHUNK = 1 << 16
+_SCAN_CHUNK = 1 << 16
+# PNG color type -> samples per pixel
+_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# PNG color type -> Pillow mode (8-bit)
+MODES = {0: 'L', 2: 'RGB', 3: 'P', 4: 'LA', 6: 'RGBA'}
+
+
+class PngInfo(NamedTuple):
+    width: int
+    height: int
+    bit_depth: int
+    color_type: int
+    interlace: int
+
+    @property
+    def stride(self) -> int:
+        # filtered scanline length without the filter byte
+        return (self.width * _CHANNELS[self.color_type] * self.bit_depth + 7) // 8
+
+    @property
+    def streamable(self) -> bool:
+        return self.interlace == 0 and self.bit_depth == 8
+
+    @property
+    def mode(self) -> Optional[str]:
+        return MODES.get(self.color_type) if self.bit_depth == 8 else None
+
+
+def is_path(source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+def source_name(source) -> str:
+    return os.fspath(source) if is_path(source) else '<buffer>'
+
+
+class BufferFile:
+    """Read-only, seekable file over a buffer; reads copy only what they return."""
+
+    def __init__(self, data) -> None:
+        self._view = memoryview(data).cast('B')
+        self._pos = 0
+
+    def read(self, n: int = -1) -> bytes:
+        end = len(self._view) if n is None or n < 0 else min(len(self._view), self._pos + n)
+        out = bytes(self._view[self._pos:end])
+        self._pos = max(self._pos, end)
+        return out
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> 'BufferFile':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+def open_png(source):
+    """Binary file for a path, or a ``BufferFile`` over PNG bytes already in memory."""
+    return open(source, 'rb') if is_path(source) else BufferFile(source)
+
+
+def pillow_source(source):
+    # what Image.open takes: the path itself (Pillow then owns the file), else a view of the buffer
+    return source if is_path(source) else BufferFile(source)
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def _iter_chunks(f) -> Iterator:
+    """(type, body) for every chunk; IDAT bodies come as an iterator of <=64 KiB pieces."""
+    if f.read(8) != PNG_SIGNATURE:
+        raise ValueError('not a PNG file')
+    while True:
+        head = f.read(8)
+        if len(head) < 8:
+            raise ValueError('PNG truncated before IEND')
+        length, kind = struct.unpack('>I4s', head)
+        if kind == b'IDAT':
+            def pieces(left=length):
+                while left:
+                    piece = f.read(min(left, _READ_CHUNK))
+                    if not piece:
+                        raise ValueError('PNG truncated inside IDAT')
+                    left -= len(piece)
+                    yield piece
+            body = pieces()
+            yield kind, body
+            for _ in body:  # drain if the consumer stopped early
+                pass
+        else:
+            yield kind, f.read(length)
+        f.read(4)  # CRC; zlib's adler32 still guards the pixel data
+        if kind == b'IEND':
+            return
+
+
+def read_info(source) -> PngInfo:
+    with open_png(source) as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError(f'{source_name(source)}: not a PNG file')
+        length, kind = struct.unpack('>I4s', f.read(8))
+        if kind != b'IHDR':
+            raise ValueError(f'{source_name(source)}: first chunk is {kind!r}, not IHDR')
+        w, h, depth, ctype, _, _, interlace = struct.unpack('>IIBBBBB', f.read(13))
+    return PngInfo(w, h, depth, ctype, interlace)
+
+
+class _BandDecoder:
+    def __init__(self, info: PngInfo, extra: bytes) -> None:
+        self.info = info
+        self.extra = extra  # PLTE / tRNS chunks, passed through
+        self.prev: Optional[bytes] = None  # last unfiltered scanline (native format)
+
+    def decode(self, filtered: bytes, rows: int) -> bytes:
+        from PIL import Image
+        from oc8 import planes
+        info = self.info
+        body = filtered
+        if self.prev is not None:
+            # previous row as filter type 0 gives Up/Average/Paeth the right context
+            body = b'\x00' + self.prev + filtered
+            rows += 1
+        png = (PNG_SIGNATURE
+               + _chunk(b'IHDR', struct.pack('>IIBBBBB', info.width, rows, info.bit_depth, info.color_type, 0, 0, 0))
+               + self.extra + _chunk(b'IDAT', zlib.compress(body, 0)) + _chunk(b'IEND', b''))
+        with Image.open(io.BytesIO(png)) as img:
+            img.load()
+            self.prev = img.tobytes()[-info.stride:]
+            rgba = planes.image_buffer(img, 'RGBA')
+        if len(body) != len(filtered):
+            rgba = rgba[info.width * 4:]
+        return rgba
+
+
+def iter_rgba_bands(path, band_rows: Optional[int] = None) -> Iterator[bytes]:
+    """RGBA bytes of the image, top to bottom, ``band_rows`` rows at a time."""
+    info = read_info(path)
+    if not info.streamable:
+        from PIL import Image
+        from oc8 import planes
+        with Image.open(pillow_source(path)) as img:
+            yield planes.image_buffer(img, 'RGBA')
+        return
+    line = info.stride + 1
+    if band_rows is None:
+        band_rows = max(1, BAND_BYTES // line)
+    want = band_rows * line
+    with open_png(path) as f:
+        extra = b''
+        dec = None
+        inflate = zlib.decompressobj()
+        pending = bytearray()
+        rows_left = info.height
+        for kind, body in _iter_chunks(f):
+            if kind in (b'PLTE', b'tRNS'):
+                extra += _chunk(kind, body)
+                continue
+            if kind != b'IDAT':
+                continue
+            if dec is None:
+                dec = _BandDecoder(info, extra)
+            for piece in body:
+                data = piece
+                while data and rows_left:
+                    # bound the inflate burst so pending never grows much past one band
+                    pending += inflate.decompress(data, want)
+                    data = inflate.unconsumed_tail
+                    while len(pending) >= min(want, rows_left * line) and rows_left:
+                        n = min(band_rows, rows_left)
+                        yield dec.decode(bytes(pending[:n * line]), n)
+                        del pending[:n * line]
+                        rows_left -= n
+                if not rows_left:
+                    return
+        if rows_left:
+            raise ValueError(f'{source_name(path)}: image data ends {rows_left} rows early')
+
+
+def _unfilter(line: bytearray, prev: bytes, ftype: int, bpp: int) -> bytearray:
+    if ftype == 0:
+        return line
+    n = len(line)
+    if ftype == 1:
+        for i in range(bpp, n):
+            line[i] = (line[i] + line[i - bpp]) & 0xFF
+    elif ftype == 2:
+        for i in range(n):
+            line[i] = (line[i] + prev[i]) & 0xFF
+    elif ftype == 3:
+        for i in range(n):
+            left = line[i - bpp] if i >= bpp else 0
+            line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+    elif ftype == 4:
+        for i in range(n):
+            a = line[i - bpp] if i >= bpp else 0
+            b = prev[i]
+            c = prev[i - bpp] if i >= bpp else 0
+            pa, pb, pc = abs(b - c), abs(a - c), abs(a + b - 2 * c)
+            line[i] = (line[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xFF
+    else:
+        raise ValueError(f'bad PNG filter type {ftype}')
+    return line
+
+
+def _read_rows_python(path, info: PngInfo, rows: int) -> bytes:
+    # first ``rows`` rows of an 8-bit RGB/RGBA image as RGBA, without Pillow
+    bpp = _CHANNELS[info.color_type]
+    line = info.stride + 1
+    want = rows * line
+    inflate = zlib.decompressobj()
+    raw = bytearray()
+    with open_png(path) as f:
+        for kind, body in _iter_chunks(f):
+            if kind == b'IDAT':
+                for piece in body:
+                    raw += inflate.decompress(piece, want - len(raw))
+                    if len(raw) >= want:
+                        break
+            if len(raw) >= want or kind == b'IEND':
+                break
+    out = bytearray()
+    prev = bytes(info.stride)
+    for r in range(len(raw) // line):
+        cur = _unfilter(raw[r * line + 1:(r + 1) * line], prev, raw[r * line], bpp)
+        prev = bytes(cur)
+        if bpp == 4:
+            out += cur
+        else:
+            rgba = bytearray(b'\xff' * (info.width * 4))
+            for c in range(3):
+                rgba[c::4] = cur[c::3]
+            out += rgba
+    return bytes(out)
+
+
+def read_rgba_prefix(path, nbytes: int) -> bytes:
+    """First ``nbytes`` of the RGBA image bytes, decoding only the rows they live in."""
+    info = read_info(path)
+    row = info.width * 4
+    rows = max(1, -(-nbytes // row)) if row else 1
+    if info.streamable and info.color_type in (2, 6):
+        return _read_rows_python(path, info, min(rows, info.height))[:nbytes]
+    out = bytearray()
+    for band in iter_rgba_bands(path, band_rows=rows):
+        out += band
+        if len(out) >= nbytes:
+            break
+    return bytes(out[:nbytes])
+
+
+def trailing_nul_start(buf, chunk: int = _SCAN_CHUNK) -> int:
+    """Length of ``buf`` without its trailing NUL bytes, scanning backward one chunk at a time."""
+    view = memoryview(buf)
+    end = len(view)
+    while end > 0:
+        lo = max(0, end - chunk)
+        kept = len(bytes(view[lo:end]).rstrip(b'\x00'))
+        if kept:
+            return lo + kept
+        end = lo
+    return 0
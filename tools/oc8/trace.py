@@ -0,0 +1,194 @@
+"""
+Opt-in per-stage timing for the Cortex tools (``--profile``).
+
+Stages are wrapped in ``span(name, **args)``; when profiling is off that
+is a shared no-op context manager, so instrumented hot loops pay one
+function call and one attribute check. When on, every span becomes a
+Chrome trace-event "complete" event (wall time, thread CPU time, thread
+id and its args), viewable in chrome://tracing or https://ui.perfetto.dev.
+
+  with trace.span('brotli', bytes=len(chunk)):
+      ...
+  trace.count('candidates_tried')      # aggregated counters
+  trace.note(strategy='manifest')      # run-level facts, shown in the summary
+
+``finish(path)`` writes the trace JSON and prints a one-line summary:
+wall/CPU per stage, bytes per stage, counters and notes.
+"""
+
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+DEFAULT_TRACE_PATH = 'cortex_trace.json'
+
+_lock = threading.Lock()
+_events: List[Dict] = []
+_counters: Counter = Counter()
+_notes: Dict = {}
+_tids: Dict[int, int] = {}
+_enabled = False
+_t0 = 0
+_cpu0 = 0.0
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'args', '_start', '_cpu')
+
+    def __init__(self, name: str, args: Dict) -> None:
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self._cpu = time.thread_time_ns()
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        cpu = time.thread_time_ns() - self._cpu
+        if exc_type is not None:
+            self.args['error'] = f'{exc_type.__name__}: {exc}'
+        _record(self.name, self._start, end - self._start, cpu, self.args)
+        return False
+
+    def set(self, **args) -> None:
+        """Attach results known only at the end of the stage (bytes produced, hits, ...)."""
+        self.args.update(args)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable() -> None:
+    global _enabled, _t0, _cpu0
+    with _lock:
+        _events.clear()
+        _counters.clear()
+        _notes.clear()
+        _tids.clear()
+        _t0 = time.perf_counter_ns()
+        _cpu0 = time.process_time()
+        _enabled = True
+
+
+def span(name: str, **args):
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name, args)
+
+
+def count(name: str, n: int = 1) -> None:
+    if _enabled:
+        with _lock:
+            _counters[name] += n
+
+
+def note(**facts) -> None:
+    if _enabled:
+        with _lock:
+            _notes.update(facts)
+
+
+def _tid() -> int:
+    ident = threading.get_ident()
+    tid = _tids.get(ident)
+    if tid is None:
+        tid = _tids[ident] = len(_tids)
+    return tid
+
+
+def _record(name: str, start_ns: int, dur_ns: int, cpu_ns: int, args: Dict) -> None:
+    with _lock:
+        _events.append({'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': _tid(),
+                        'ts': (start_ns - _t0) / 1000, 'dur': dur_ns / 1000,
+                        'args': dict(args, cpu_ms=round(cpu_ns / 1e6, 3))})
+
+
+def stages() -> Dict[str, Dict]:
+    """Per-stage totals: calls, wall/CPU seconds and bytes (if the spans carried a `bytes` arg)."""
+    out: Dict[str, Dict] = {}
+    with _lock:
+        events = list(_events)
+    for e in events:
+        s = out.setdefault(e['name'], {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'bytes': 0})
+        s['calls'] += 1
+        s['wall'] += e['dur'] / 1e6
+        s['cpu'] += e['args']['cpu_ms'] / 1e3
+        s['bytes'] += e['args'].get('bytes', 0) or 0
+    return out
+
+
+def _fmt_bytes(n: int) -> str:
+    for unit, size in (('GB', 1e9), ('MB', 1e6), ('KB', 1e3)):
+        if n >= size:
+            return f'{n / size:.1f}{unit}'
+    return f'{n}B'
+
+
+def summary() -> str:
+    wall = (time.perf_counter_ns() - _t0) / 1e9
+    cpu = time.process_time() - _cpu0
+    parts = [f'profile: wall {wall:.3f}s cpu {cpu:.3f}s']
+    for name, s in sorted(stages().items(), key=lambda kv: -kv[1]['wall']):
+        item = f"{name} {s['wall']:.3f}s/{s['cpu']:.3f}cpu x{s['calls']}"
+        if s['bytes']:
+            item += f" {_fmt_bytes(s['bytes'])}"
+        parts.append(item)
+    with _lock:
+        parts += [f'{k}={v}' for k, v in sorted(_counters.items())]
+        parts += [f'{k}={v}' for k, v in sorted(_notes.items())]
+    return ' | '.join(parts)
+
+
+def write(path: str) -> None:
+    with _lock:
+        events = list(_events)
+        counters = dict(_counters)
+        notes = dict(_notes)
+        tids = dict(_tids)
+    meta = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+             'args': {'name': 'main' if ident == threading.main_thread().ident else f'worker-{tid}'}}
+            for ident, tid in tids.items()]
+    doc = {'traceEvents': meta + events, 'displayTimeUnit': 'ms',
+           'otherData': {'counters': counters, 'notes': notes,
+                         'stages': {k: dict(v, wall=round(v['wall'], 6), cpu=round(v['cpu'], 6)) for k, v in stages().items()}}}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(doc, f)
+
+
+def add_profile_argument(parser) -> None:
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_TRACE_PATH, default=None, metavar='TRACE_JSON',
+                        help=f'record per-stage timings to a Chrome trace-event file (default {DEFAULT_TRACE_PATH}) and print a summary')
+
+
+def finish(path: Optional[str]) -> None:
+    """Write the trace, print the summary line and stop recording; no-op when profiling is off."""
+    global _enabled
+    if not (_enabled and path):
+        return
+    write(path)
+    print(summary() + f' | trace={path}')
+    _enabled = False  # batch runs: the next command records only if it asks to
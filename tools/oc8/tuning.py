@@ -0,0 +1,158 @@
+"""
+Pick Brotli and PNG settings for an encode from a throughput/size target.
+
+``choose_settings(path, target)`` reads a sample of the input (a few
+evenly spaced slices), then:
+
+  mode       MODE_TEXT when the sample looks like text, else MODE_GENERIC
+  lgwin      just large enough for the input (16..22); 24 for 'ratio' on large inputs
+  quality    'ratio'     -> 11
+             'balanced'  -> the lowest of BALANCED_CANDIDATES whose output on a short
+                            sample is within BALANCED_SLACK of BALANCED_BASELINE's;
+                            the baseline itself when none is, or without sampling
+                            when the input is under BALANCED_MIN_INPUT
+             <MB/s>      -> the smallest sample output among the qualities
+                            whose sample throughput meets the figure
+  png level  0 (stored): Brotli output does not deflate, so zlib only costs time
+
+Incompressible input (Brotli q1 saves < 2% on the sample) gets quality 1
+whatever the target. Quality is not monotonic in size for every input
+(q5 can beat q9 on repetitive text), which is why candidates are measured
+rather than looked up.
+"""
+
+from __future__ import annotations
+import os
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import brotli
+
+
+TARGETS = ('ratio', 'balanced')
+# a few long slices: short ones hide the long-range matches that separate qualities
+SAMPLE_SLICES = 4
+SLICE_SIZE = 256 * 1024
+# q10 is the last quality before q11's cost (~2.5x q10 on text dumps); the
+# candidates are an order of magnitude faster than q10 and are taken only when
+# they cost little size against it
+BALANCED_BASELINE = 10
+BALANCED_CANDIDATES = (5, 9)
+BALANCED_SLACK = 0.05
+BALANCED_SLICES = 2
+BALANCED_SLICE_SIZE = 128 * 1024
+# below this, sampling at the baseline quality costs about as much as it could save
+BALANCED_MIN_INPUT = 4 * BALANCED_SLICES * BALANCED_SLICE_SIZE
+THROUGHPUT_QUALITIES = tuple(range(12))
+_MODE_NAMES = {brotli.MODE_GENERIC: 'generic', brotli.MODE_TEXT: 'text', brotli.MODE_FONT: 'font'}
+# control bytes other than \t \n \r; text dumps have (almost) none
+_CONTROL = bytes(range(0, 9)) + bytes(range(14, 32)) + b'\x0b\x0c\x7f'
+
+
+class EncodeSettings(NamedTuple):
+    quality: int = 11
+    lgwin: int = 22
+    mode: int = brotli.MODE_GENERIC
+    compress_level: int = 0
+    reason: str = 'default'
+
+    def describe(self) -> Dict:
+        return {'quality': self.quality, 'lgwin': self.lgwin, 'mode': _MODE_NAMES.get(self.mode, self.mode),
+                'png_level': self.compress_level, 'reason': self.reason}
+
+
+def parse_target(text: str):
+    """'ratio' | 'balanced' | MB/s as a number (e.g. '50')."""
+    if text in TARGETS:
+        return text
+    try:
+        mbps = float(text)
+    except ValueError:
+        raise ValueError(f"--target must be one of {', '.join(TARGETS)} or a MB/s figure, got {text!r}") from None
+    if mbps <= 0:
+        raise ValueError('--target MB/s must be > 0')
+    return mbps
+
+
+def sample_input(path: str, slices: int = SAMPLE_SLICES, slice_size: int = SLICE_SIZE) -> Tuple[bytes, int]:
+    """(sample, file size): the whole file if small, else evenly spaced slices."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if size <= slices * slice_size:
+            return f.read(), size
+        step = (size - slice_size) // (slices - 1)
+        out = []
+        for i in range(slices):
+            f.seek(i * step)
+            out.append(f.read(slice_size))
+    return b''.join(out), size
+
+
+def looks_text(sample: bytes) -> bool:
+    if not sample:
+        return False
+    control = len(sample) - len(sample.translate(None, _CONTROL))
+    return control <= len(sample) // 100
+
+
+def window_for(size: int) -> int:
+    return max(16, min(22, (max(size, 1) - 1).bit_length()))
+
+
+def _measure(sample: bytes, quality: int, lgwin: int, mode: int) -> Tuple[int, float]:
+    start = time.perf_counter()
+    size = len(brotli.compress(sample, quality=quality, lgwin=lgwin, mode=mode))
+    return size, max(time.perf_counter() - start, 1e-9)
+
+
+def choose_settings(path: str, target) -> EncodeSettings:
+    target = parse_target(target) if isinstance(target, str) else target
+    sample, size = sample_input(path)
+    mode = brotli.MODE_TEXT if looks_text(sample) else brotli.MODE_GENERIC
+    lgwin = window_for(size)
+    if not sample:
+        return EncodeSettings(1, lgwin, mode, 0, 'empty input')
+
+    if _measure(sample, 1, lgwin, mode)[0] >= len(sample) * 0.98:
+        return EncodeSettings(1, lgwin, brotli.MODE_GENERIC, 0, 'incompressible sample')
+
+    if target == 'ratio':
+        if size > 1 << 22:
+            lgwin = 24
+        return EncodeSettings(11, lgwin, mode, 0, 'ratio target')
+
+    if target == 'balanced':
+        if size < BALANCED_MIN_INPUT:
+            return EncodeSettings(BALANCED_BASELINE, lgwin, mode, 0, 'balanced: input too small to sample')
+        # sizes only: lower quality is faster in this range and sample timings are too noisy to rank by
+        short, _ = sample_input(path, BALANCED_SLICES, BALANCED_SLICE_SIZE)
+        base = _measure(short, BALANCED_BASELINE, lgwin, mode)[0]
+        for q in BALANCED_CANDIDATES:
+            s = _measure(short, q, lgwin, mode)[0]
+            if s <= base * (1 + BALANCED_SLACK):
+                return EncodeSettings(q, lgwin, mode, 0, f'balanced: sample {s}B vs q{BALANCED_BASELINE} {base}B')
+        return EncodeSettings(BALANCED_BASELINE, lgwin, mode, 0,
+                              f'balanced: q{BALANCED_CANDIDATES[-1]} sample {s}B > q{BALANCED_BASELINE} {base}B + {BALANCED_SLACK:.0%}')
+
+    # MB/s target: qualities get slower as they go up, so stop at the first one that misses
+    fast: Dict[int, Tuple[int, float]] = {}
+    for q in THROUGHPUT_QUALITIES:
+        s, t = _measure(sample, q, lgwin, mode)
+        if len(sample) / t / 1e6 < target:
+            if not fast:
+                fast[q] = (s, t)  # nothing meets the target: fastest quality, closest miss
+            break
+        fast[q] = (s, t)
+    q = min(fast, key=lambda q: (fast[q][0], -q))
+    mbps = len(sample) / fast[q][1] / 1e6
+    return EncodeSettings(q, lgwin, mode, 0, f'{target:g} MB/s target: sample {mbps:.1f} MB/s')
+
+
+def settings_for(target: Optional[str], path: str, brotli_quality: Optional[int] = None) -> EncodeSettings:
+    """CLI helper: explicit --brotli-quality wins over the tuned quality."""
+    if not target:
+        return EncodeSettings(quality=11 if brotli_quality is None else brotli_quality)
+    chosen = choose_settings(path, target)
+    if brotli_quality is not None:
+        chosen = chosen._replace(quality=brotli_quality, reason=chosen.reason + '; quality from --brotli-quality')
+    return chosen
@@ -0,0 +1,122 @@
+"""
+Directory change notification for the Cortex bus worker.
+
+``DirWatcher(path)`` reports files that finished arriving in a directory:
+a file closed after writing (IN_CLOSE_WRITE) or renamed into it
+(IN_MOVED_TO, the usual write-to-.tmp-then-rename pattern). On Linux it
+is inotify through ctypes (no extra dependency), so a new file is seen as
+soon as its writer is done. Elsewhere it falls back to rescanning the
+directory every ``poll_interval`` seconds.
+
+Either way it is a selectable object: ``fileno()`` for select/selectors
+(None when polling), ``read()`` for the names that arrived since the last
+call, and ``timeout`` for how long a caller should wait between polls.
+"""
+
+from __future__ import annotations
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+from typing import List, Optional, Set
+
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+_EVENT = struct.Struct('iIII')
+_READ_SIZE = 64 * 1024
+
+
+class _Inotify:
+    def __init__(self, path: str) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        wd = libc.inotify_add_watch(self._fd, os.fsencode(path), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, f'inotify_add_watch failed for {path}')
+        self.overflowed = False
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def read(self) -> List[str]:
+        names = []
+        while True:
+            try:
+                buf = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                return names
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            pos = 0
+            while pos < len(buf):
+                _, mask, _, length = _EVENT.unpack_from(buf, pos)
+                pos += _EVENT.size
+                if mask & IN_Q_OVERFLOW:
+                    self.overflowed = True  # events were dropped: caller must rescan
+                elif length:
+                    names.append(os.fsdecode(buf[pos:pos + length].rstrip(b'\x00')))
+                pos += length
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class _Poller:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._seen: Set[str] = set(os.listdir(path))
+        self.overflowed = False
+
+    def fileno(self) -> Optional[int]:
+        return None
+
+    def read(self) -> List[str]:
+        now = set(os.listdir(self.path))
+        new = sorted(now - self._seen)
+        self._seen = now
+        return new
+
+    def close(self) -> None:
+        pass
+
+
+class DirWatcher:
+    def __init__(self, path: str, poll_interval: float = 0.05, force_poll: bool = False) -> None:
+        self.path = path
+        self.backend = None
+        if sys.platform.startswith('linux') and not force_poll:
+            try:
+                self.backend = _Inotify(path)
+            except (OSError, AttributeError):
+                self.backend = None
+        if self.backend is None:
+            self.backend = _Poller(path)
+        self.kind = 'inotify' if isinstance(self.backend, _Inotify) else 'poll'
+        self.timeout = None if self.kind == 'inotify' else poll_interval
+
+    def fileno(self) -> Optional[int]:
+        return self.backend.fileno()
+
+    def read(self) -> List[str]:
+        return self.backend.read()
+
+    def take_overflow(self) -> bool:
+        """True once after the kernel dropped events (the directory needs a rescan)."""
+        hit = self.backend.overflowed
+        self.backend.overflowed = False
+        return hit
+
+    def close(self) -> None:
+        self.backend.close()
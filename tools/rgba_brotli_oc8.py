@@ -3,252 +3,317 @@
 RGBA + Brotli + OC8 encoder/decoder
 
 Usage:
-  python tools/rgba_brotli_oc8.py encode <input> <output_prefix> [--max-png-bytes N] [--brotli-quality Q]
-  python tools/rgba_brotli_oc8.py decode <png_glob> <output>
+  python tools/rgba_brotli_oc8.py encode <input> <output_prefix> [--max-png-bytes N] [--brotli-quality Q | --target ratio|balanced|MBPS] [--stream | --block-size N] [--layout rgb|rgba] [--check32] [--jobs N]
+                                                               [--codec brotli|stored|zlib|zstd|lz4 [--level L] [--dict ID|FILE]]
+                                                               [--delta-base FILE|PNG_GLOB]...
+  python tools/rgba_brotli_oc8.py decode <png_glob> <output> [--jobs N] [--cache [--cache-dir D] [--cache-max-bytes N]] [--range OFFSET:LENGTH] [--dict-dir D]
+                                                             [--delta-base FILE|PNG_GLOB]...
+  python tools/rgba_brotli_oc8.py archive <output_prefix> <file|dir>... [--base DIR] [--layout rgb|rgba] [--check32]
+  python tools/rgba_brotli_oc8.py list <png_glob>
+  python tools/rgba_brotli_oc8.py extract <png_glob> <output_dir> [member...]
+  python tools/rgba_brotli_oc8.py cache [--cache-dir D] [--clear]
+  python tools/rgba_brotli_oc8.py dict train <file|dir>... [--lines] [--size N] [--dict-dir D]
+  python tools/rgba_brotli_oc8.py dict list [--dict-dir D]
+
+Every command accepts --profile [TRACE_JSON]: per-stage timings as a Chrome trace plus a summary line.
 
 Produces PNG parts named <output_prefix>_partNN.png
-Requires: Pillow, brotli
+The commands wrap oc8.api: encode(buffer) / decode(parts) do the same in memory (PNG bytes or images, no files).
+Requires: Pillow, brotli (numpy optional, speeds up bulk paths)
 
 Install:
-  pip install Pillow brotli
+  pip install Pillow brotli numpy
 """
 
 from __future__ import annotations
 import argparse
-import math
+import hashlib
+import json
 import struct
 import os
-from typing import List
+from typing import Dict, List, Optional
 
 from PIL import Image
 import brotli
 
-
-# CRC-8 (OC8) implementation
-def crc8_oc8(data: bytes, poly: int = 0x07, init: int = 0x00) -> int:
-    crc = init & 0xFF
-    for b in data:
-        crc ^= b
-        for _ in range(8):
-            if (crc & 0x80) != 0:
-                crc = ((crc << 1) ^ poly) & 0xFF
-            else:
-                crc = (crc << 1) & 0xFF
-    return crc & 0xFF
-
-
-def pack_bytes_to_rgb(stream: bytes) -> bytes:
-    pad = (3 - (len(stream) % 3)) % 3
-    if pad:
-        stream = stream + (b"\x00" * pad)
-    return stream
-
-
-def make_image_from_rgb(rgb_bytes: bytes, max_width: int = 4096) -> Image.Image:
-    total_pixels = len(rgb_bytes) // 3
-    if total_pixels == 0:
-        raise ValueError("No pixels to encode")
-    # choose width close to square but <= max_width
-    width = min(max_width, max(1, int(math.sqrt(total_pixels))))
-    height = math.ceil(total_pixels / width)
-    required_pixels = width * height
-    if required_pixels > total_pixels:
-        missing = required_pixels - total_pixels
-        rgb_bytes = rgb_bytes + (b"\x00" * (missing * 3))
-    img = Image.frombytes("RGB", (width, height), rgb_bytes)
-    return img
+from oc8 import planes, trace
+from oc8.api import decode, decode_to, encode, find_packet
+from oc8.archive import ArchiveReader, archive_members, encode_archive_to_pngs
+from oc8.blocks import BlockReader, encode_blocks_to_pngs
+from oc8.cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, DecodeCache
+from oc8.codecs import CODECS, DEFAULT_DICT_DIR, CodecError, DEFAULT_DICT_SIZE, Dictionary, DictionaryStore, encode_region, train_dictionary
+from oc8.crc import PacketCheck
+from oc8.delta import encode_delta_to_pngs
+from oc8.headers import FLAG_CHECK32, parse_header, payload_kind
+from oc8.manifest import PacketRangeReader, plan_parts, stream_id_for
+from oc8.parts import LAYOUTS, PngPartWriter, layout_flag, make_image_from_rgb, pack_bytes_to_rgb  # noqa: F401 (re-exported)
+from oc8.tuning import settings_for
 
 
 def extract_rgb_from_image(img: Image.Image) -> bytes:
-    if img.mode != 'RGB':
-        img = img.convert('RGB')
-    return img.tobytes()
+    return planes.rgb_from_image(img)
 
 
 def extract_rgba_and_strip_alpha(img: Image.Image) -> bytes:
-    # if image is not RGBA, convert
-    if img.mode != 'RGBA':
-        img = img.convert('RGBA')
-    data = img.tobytes()
-    # strip every 4th byte (alpha)
-    if len(data) % 4 != 0:
-        # still try best-effort
-        stripped = bytearray()
-        for i in range(0, len(data), 4):
-            chunk = data[i:i+4]
-            if len(chunk) >= 3:
-                stripped.extend(chunk[0:3])
-        return bytes(stripped)
+    # convert to RGBA if needed, then drop every 4th byte (alpha) in one pass
+    return planes.rgb_from_rgba_image(img)
+
+
+def try_decode_stream(full: bytes, output_path: str, dictionaries: Optional[DictionaryStore] = None, base: Optional[List[bytes]] = None) -> Dict:
+    # header scan over one concatenated stream (see oc8.api.find_packet); the result is written once found
+    raw, found = find_packet(full, dictionaries, base)
+    with open(output_path, 'wb') as f:
+        f.write(raw)
+    report_decode(found)
+    return found
+
+
+def report_decode(info: Dict) -> None:
+    strategy = info.get('strategy')
+    if strategy == 'manifest':
+        print(f"Decoded using part manifest (stream={info['stream']}, parts={info['parts']})")
+    elif strategy == 'pipeline':
+        print(f"Decoded using streaming pipeline (header at offset=0, order=normal, layout={info['layout']})")
     else:
-        return bytes(b for i, b in enumerate(data) if (i % 4) != 3)
+        print(f"Decoded using header at offset={info['offset']} endianness={info['endian']}")
+        if 'scan' in info:
+            print('Header scan:', info['scan'])
+        if strategy:
+            print(f"Decoded using strategy={strategy}, order={info['order']}")
 
 
-def try_decode_stream(full: bytes, output_path: str) -> None:
-    # Expect CortexHeader of 16 bytes: uint32 totalLength, uint32 payloadLength, uint8 flags, uint8[7] reserved
-    # Be robust: try big-endian and little-endian, and scan the stream for a valid header if initial parse fails.
-    def parse_header_at(buf: bytes, offset: int):
-        if offset + 16 > len(buf):
-            return None
-        hdr = buf[offset:offset+16]
-        # try big-endian
-        try:
-            total_len_be, payload_len_be, flags_be = struct.unpack('>I I B', hdr[:9])
-        except Exception:
-            total_len_be = payload_len_be = flags_be = None
-        # try little-endian
-        try:
-            total_len_le, payload_len_le, flags_le = struct.unpack('<I I B', hdr[:9])
-        except Exception:
-            total_len_le = payload_len_le = flags_le = None
-        return (
-            ('>','be', total_len_be, payload_len_be, flags_be),
-            ('<','le', total_len_le, payload_len_le, flags_le)
-        )
-
-    def validate_and_decompress(buf: bytes, offset: int, total_len: int, payload_len: int):
-        if payload_len < 1:
-            return False, 'payload_len<1'
-        if offset + 16 + payload_len > len(buf):
-            return False, f'stream shorter than expected payload: have {len(buf)- (offset+16)}, need {payload_len}'
-        payload_with_crc = buf[offset+16: offset+16+payload_len]
-        if len(payload_with_crc) < 1:
-            return False, 'payload too short'
-        compressed = payload_with_crc[:-1]
-        checksum = payload_with_crc[-1]
-        expected = crc8_oc8(compressed)
-        if checksum != expected:
-            return False, f'CRC mismatch: expected {expected}, got {checksum}'
-        try:
-            raw = brotli.decompress(compressed)
-        except Exception as e:
-            return False, f'brotli decompress failed: {e}'
-        with open(output_path, 'wb') as f:
-            f.write(raw)
-        return True, 'ok'
-
-    # initial direct attempt at offset 0
-    headers = parse_header_at(full, 0)
-    if headers:
-        for prefix, label, total_len, payload_len, flags in headers:
-            if total_len is None:
-                continue
-            ok, msg = validate_and_decompress(full, 0, total_len, payload_len)
-            if ok:
-                print(f'Decoded using header at offset=0 endianness={label}')
-                return
-            else:
-                # continue to scanning
-                pass
-
-    # scan the stream for plausible header positions
-    max_scan = min(65536, max(0, len(full) - 16))
-    for off in range(0, max_scan, 1):
-        headers = parse_header_at(full, off)
-        if not headers:
+def decode_pngs_to_file(png_paths: List[str], output_path: str, jobs: int = 1, dictionaries: Optional[DictionaryStore] = None, base: Optional[List[bytes]] = None) -> Dict:
+    # returns how the packet was found (see oc8.api.decode_to); output goes to a temp file renamed on success
+    tmp_path = output_path + '.partial'
+    try:
+        with open(tmp_path, 'wb') as out:
+            info = decode_to(png_paths, out, jobs=jobs, dictionaries=dictionaries, base=base)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    report_decode(info)
+    return info
+
+
+def decode_pngs_to_file_cached(png_paths: List[str], output_path: str, cache: DecodeCache, jobs: int = 1, dictionaries: Optional[DictionaryStore] = None, base: Optional[List[bytes]] = None) -> Dict:
+    # repeat decodes of identical parts cost one hash pass over the PNGs plus one file copy;
+    # a delta packet decodes differently against another base, so the base is part of the key
+    options = {'decoder': 'rgba_brotli_oc8'}
+    if base is not None:
+        h = hashlib.blake2b(digest_size=16)
+        for src in base:
+            h.update(len(src).to_bytes(8, 'big'))
+            h.update(src)
+        options['base'] = h.hexdigest()
+    if dictionaries is not None:
+        options['dictionaries'] = [dictionaries.root, dictionaries.ids()]
+    key = cache.key_for(png_paths, options)
+    meta = cache.get(key, output_path)
+    if meta is not None:
+        print(f'Decode cache hit {key} (strategy={meta.get("strategy")})')
+        return meta
+    meta = decode_pngs_to_file(png_paths, output_path, jobs=jobs, dictionaries=dictionaries, base=base)
+    cache.put(key, output_path, meta)
+    return meta
+
+
+def load_delta_base(specs: List[str], jobs: int = 1) -> List[bytes]:
+    """Byte sources of a delta base: plain files, or PNG globs of a packet (decoded) or an archive (its members by name)."""
+    import glob
+    sources = []
+    for spec in specs:
+        if os.path.isfile(spec) and not spec.lower().endswith('.png'):
+            with open(spec, 'rb') as f:
+                sources.append(f.read())
             continue
-        for prefix, label, total_len, payload_len, flags in headers:
-            if total_len is None or payload_len is None:
-                continue
-            # sanity checks: payload_len should be reasonable (< remaining bytes and < 100MB)
-            if payload_len <= 0 or payload_len > 200 * 1024 * 1024:
-                continue
-            if off + 16 + payload_len > len(full):
-                continue
-            ok, msg = validate_and_decompress(full, off, total_len, payload_len)
-            if ok:
-                print(f'Decoded using header at offset={off} endianness={label}')
-                return
-            # else continue scanning
-    raise ValueError('No valid Cortex OC8 header + payload found in stream (scanned up to %d bytes)' % max_scan)
-
-
-def decode_pngs_to_file(png_paths: List[str], output_path: str) -> None:
-    # Try multiple extraction strategies to be robust against RGB/RGBA variations and ordering
-    def build_stream(paths, extractor):
-        all_rgb = bytearray()
-        for p in paths:
-            img = Image.open(p)
-            all_rgb.extend(extractor(img))
-        return bytes(all_rgb)
-
-    errors = []
-    # try normal order first
-    strategies = [
-        ('rgb', lambda img: extract_rgb_from_image(img)),
-        ('rgba_strip_alpha', lambda img: extract_rgba_and_strip_alpha(img)),
-    ]
-    orders = [png_paths, list(reversed(png_paths))]
-    for order in orders:
-        for name, extractor in strategies:
-            try:
-                full = build_stream(order, extractor)
-                try_decode_stream(full, output_path)
-                print(f'Decoded using strategy={name}, order={"reversed" if order is orders[1] else "normal"}')
-                return
-            except Exception as e:
-                errors.append((name, 'reversed' if order is orders[1] else 'normal', str(e)))
-                # continue
-    # if we reach here none worked
-    err_msg = 'All decoding strategies failed:\n' + '\n'.join([f'{s} ({ord}): {m}' for s, ord, m in errors])
-    raise ValueError(err_msg)
-
-
-def encode_file_to_pngs(input_path: str, output_prefix: str, max_png_bytes: int = 200 * 1024 * 1024, brotli_quality: int = 11, max_width: int = 4096) -> List[str]:
-    # read
-    with open(input_path, 'rb') as f:
+        pngs = sorted(glob.glob(spec))
+        if not pngs:
+            raise SystemExit(f'delta base not found: {spec}')
+        parts = plan_parts(pngs)
+        if parts is not None and payload_kind(parse_header(PacketRangeReader(parts, planes.layout_bytes).read(0, 16)).flags) == 'archive':
+            archive = ArchiveReader(pngs)
+            sources += [archive.read(name) for name in sorted(archive.members)]
+            continue
+        sources.append(decode(pngs, jobs=jobs))
+    return sources
+
+
+def dictionary_samples(inputs: List[str], lines: bool = False) -> List[bytes]:
+    paths = [p for _, p in archive_members(inputs)]
+    samples = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        samples += [line for line in data.splitlines() if line.strip()] if lines else [data]
+    return samples
+
+
+def dictionary_report(samples: List[bytes], dictionary: Dictionary) -> Dict:
+    # bytes per sample region with and without the dictionary, for the codecs that can be run here
+    report = {'samples': len(samples), 'raw': sum(len(s) for s in samples), 'brotli': sum(len(encode_region(s)) for s in samples)}
+    for name, c in CODECS.items():
+        if c.dictionaries and c.available:
+            report[name] = sum(len(encode_region(s, name)) for s in samples)
+            report[name + '+dict'] = sum(len(encode_region(s, name, dictionary=dictionary)) for s in samples)
+    return report
+
+
+def build_header(payload_len: int, flags: int = 0) -> bytes:
+    # Cortex header: totalLength = payload_len + 16, payloadLength = payload_len, flags, 7 reserved
+    return struct.pack('>I I B 7s', payload_len + 16, payload_len, flags, b'\x00'*7)
+
+
+def encode_file_to_pngs(input_path: str, output_prefix: str, max_png_bytes: int = 200 * 1024 * 1024, brotli_quality: int = 11, max_width: int = 4096, jobs: int = 1, manifest: bool = True, lgwin: int = 22, brotli_mode: int = brotli.MODE_GENERIC, compress_level: int = 0, layout: str = 'rgb', check32: bool = False, codec: str = 'brotli', codec_level: Optional[int] = None, dictionary: Optional[Dictionary] = None) -> List[str]:
+    with trace.span('read') as sp, open(input_path, 'rb') as f:
         raw = f.read()
-    # compress
-    compressed = brotli.compress(raw, quality=brotli_quality)
-    # crc
-    checksum = crc8_oc8(compressed)
-    payload = compressed + bytes([checksum])
-    payload_len = len(payload)
-    # construct Cortex header: totalLength = payload_len + 16, payloadLength = payload_len, flags=0
-    total_len = payload_len + 16
-    flags = 0
-    header = struct.pack('>I I B 7s', total_len, payload_len, flags, b'\x00'*7)
-    full = header + payload
-    rgb_stream = pack_bytes_to_rgb(full)
-    total_pixels = len(rgb_stream) // 3
-    max_pixels_per_img = max(1, max_png_bytes // 3)
-    num_images = max(1, math.ceil(total_pixels / max_pixels_per_img))
-
-    out_paths: List[str] = []
-    pixel_offset = 0
-    for idx in range(num_images):
-        pixels_in_chunk = min(max_pixels_per_img, total_pixels - pixel_offset)
-        if pixels_in_chunk <= 0:
-            break
-        start = pixel_offset * 3
-        end = start + pixels_in_chunk * 3
-        chunk_rgb = rgb_stream[start:end]
-        img = make_image_from_rgb(chunk_rgb, max_width=max_width)
-        part_name = f"{output_prefix}_part{idx:02d}.png"
-        # use low compression level for speed; Pillow uses optimize/quality differently
-        img.save(part_name, format='PNG', compress_level=1)
-        out_paths.append(part_name)
-        pixel_offset += pixels_in_chunk
-    return out_paths
-
-
-def main() -> None:
-    p = argparse.ArgumentParser(description='RGBA Brotli OC8 encoder/decoder')
+        sp.set(bytes=len(raw))
+    return encode(raw, output_prefix, quality=brotli_quality, lgwin=lgwin, mode=brotli_mode, codec=codec, level=codec_level, dictionary=dictionary, layout=layout, check32=check32,
+                  max_png_bytes=max_png_bytes, max_width=max_width, manifest=manifest, compress_level=compress_level, jobs=jobs)
+
+
+def encode_file_to_pngs_streaming(input_path: str, output_prefix: str, max_png_bytes: int = 200 * 1024 * 1024, brotli_quality: int = 11, max_width: int = 4096, chunk_size: int = 1 << 20, jobs: int = 1, manifest: bool = True, lgwin: int = 22, brotli_mode: int = brotli.MODE_GENERIC, compress_level: int = 0, layout: str = 'rgb', check32: bool = False) -> List[str]:
+    # Bounded-memory variant: input -> incremental Brotli -> running CRC -> PNG parts.
+    # Lengths are unknown until the end, so a zero header is written first and the
+    # first part is held back and patched once the payload length is known.
+    stream_id = None
+    if manifest:
+        # packet content is not known until the end: identify the stream by its source file instead
+        st = os.stat(input_path)
+        stream_id = stream_id_for(f'{os.path.basename(input_path)}:{st.st_size}:{st.st_mtime_ns}:{brotli_quality}'.encode())
+    writer = PngPartWriter(output_prefix, max_png_bytes=max_png_bytes, max_width=max_width, compress_level=compress_level, hold_first=True, jobs=jobs, stream_id=stream_id, layout=layout)
+    writer.write(bytes(16))
+    compressor = brotli.Compressor(quality=brotli_quality, lgwin=lgwin, mode=brotli_mode)
+    check = PacketCheck(check32)
+
+    def emit(chunk: bytes) -> None:
+        if chunk:
+            with trace.span('crc', bytes=len(chunk)):
+                check.update(chunk)
+            writer.write(chunk)
+
+    with open(input_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            with trace.span('brotli_compress', bytes=len(chunk)):
+                out = compressor.process(chunk)
+            emit(out)
+    emit(compressor.finish())
+    header = build_header(check.length + check.trailer_size, layout_flag(layout) | (FLAG_CHECK32 if check32 else 0))
+    writer.write(check.trailer(header))
+    writer.patch(0, header)
+    return writer.close()
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> None:
+    p = argparse.ArgumentParser(prog=prog, description='RGBA Brotli OC8 encoder/decoder')
     sub = p.add_subparsers(dest='cmd', required=True)
-    enc = sub.add_parser('encode')
+    common = argparse.ArgumentParser(add_help=False)
+    trace.add_profile_argument(common)
+    enc = sub.add_parser('encode', parents=[common])
     enc.add_argument('input')
     enc.add_argument('output_prefix')
     enc.add_argument('--max-png-bytes', type=int, default=200 * 1024 * 1024)
-    enc.add_argument('--brotli-quality', type=int, default=11)
-    dec = sub.add_parser('decode')
+    enc.add_argument('--brotli-quality', type=int, default=None, help='Brotli quality 0-11 (default 11, or tuned with --target)')
+    enc.add_argument('--target', default=None, help="tune Brotli quality/window/mode and PNG level from an input sample: 'ratio', 'balanced' or a MB/s figure")
+    enc.add_argument('--stream', action='store_true', help='bounded-memory encode: incremental Brotli, parts written as they fill')
+    enc.add_argument('--jobs', type=int, default=1, help='parts deflated/saved concurrently (and blocks compressed, with --block-size)')
+    enc.add_argument('--block-size', type=int, default=0, help='block-framed seekable payload with blocks of N raw bytes (e.g. 4194304); 0 = single Brotli stream')
+    enc.add_argument('--no-manifest', action='store_true', help='omit the cortex-part metadata chunk (legacy output)')
+    enc.add_argument('--layout', choices=sorted(LAYOUTS), default='rgb', help="'rgba' stores packet bytes in all four channels (4 bytes/pixel, FLAG_RGBA); 'rgb' (default) is what the TS tools read")
+    enc.add_argument('--check32', action='store_true', help='add a CRC-32 check word before the crc8 (FLAG_CHECK32): scanners reject wrong header offsets before Brotli; not read by the TS tools')
+    enc.add_argument('--codec', choices=list(CODECS), default='brotli', help="payload codec recorded in the header flags (default brotli, the only one the TS tools read); zstd/lz4 need their packages")
+    enc.add_argument('--level', type=int, default=None, help='compression level for --codec other than brotli (default: the codec\'s own)')
+    enc.add_argument('--dict', default=None, metavar='ID|FILE', help='trained dictionary (hex id in --dict-dir, or a file) for zlib/zstd/lz4')
+    enc.add_argument('--dict-dir', default=DEFAULT_DICT_DIR)
+    enc.add_argument('--delta-base', action='append', default=[], metavar='FILE|PNG_GLOB', help='delta packet: ship only the chunks this base lacks (a previous file, packet or archive; repeatable)')
+    dec = sub.add_parser('decode', parents=[common])
     dec.add_argument('png_glob')
     dec.add_argument('output')
-    args = p.parse_args()
+    dec.add_argument('--jobs', type=int, default=1, help='parts loaded/extracted concurrently')
+    dec.add_argument('--cache', action='store_true', help='reuse/store results in the content-addressed decode cache')
+    dec.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    dec.add_argument('--cache-max-bytes', type=int, default=DEFAULT_MAX_BYTES)
+    dec.add_argument('--range', default=None, metavar='OFFSET:LENGTH', help='write only this raw byte range (block-framed packets with manifests)')
+    dec.add_argument('--dict-dir', default=DEFAULT_DICT_DIR, help='where dictionaries named by packets are looked up')
+    dec.add_argument('--delta-base', action='append', default=[], metavar='FILE|PNG_GLOB', help='base(s) a delta packet was encoded against, same order')
+    arc = sub.add_parser('archive', parents=[common], help='pack many files into one seekable part set')
+    arc.add_argument('output_prefix')
+    arc.add_argument('inputs', nargs='+', help='files and/or directories')
+    arc.add_argument('--base', default=None, help='member names are relative to this directory (default: cwd)')
+    arc.add_argument('--max-png-bytes', type=int, default=200 * 1024 * 1024)
+    arc.add_argument('--brotli-quality', type=int, default=11)
+    arc.add_argument('--jobs', type=int, default=1, help='parts deflated/saved concurrently')
+    arc.add_argument('--layout', choices=sorted(LAYOUTS), default='rgb', help="'rgba' stores packet bytes in all four channels (4 bytes/pixel, FLAG_RGBA); 'rgb' (default) is what the TS tools read")
+    arc.add_argument('--check32', action='store_true', help='add a CRC-32 check word before the crc8 (FLAG_CHECK32)')
+    lst = sub.add_parser('list', parents=[common], help='list archive members')
+    lst.add_argument('png_glob')
+    ext = sub.add_parser('extract', parents=[common], help='extract archive members, decoding only the parts they span')
+    ext.add_argument('png_glob')
+    ext.add_argument('output_dir')
+    ext.add_argument('members', nargs='*', help='member names (default: all)')
+    cch = sub.add_parser('cache', parents=[common], help='show decode cache statistics')
+    cch.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    cch.add_argument('--cache-max-bytes', type=int, default=DEFAULT_MAX_BYTES)
+    cch.add_argument('--clear', action='store_true')
+    dct = sub.add_parser('dict', parents=[common], help='train and list payload dictionaries')
+    dsub = dct.add_subparsers(dest='dict_cmd', required=True)
+    dtr = dsub.add_parser('train', help='train a dictionary from sample packets (files, directories)')
+    dtr.add_argument('inputs', nargs='+')
+    dtr.add_argument('--lines', action='store_true', help='every line of the inputs is one sample (e.g. JSONL command logs)')
+    dtr.add_argument('--size', type=int, default=DEFAULT_DICT_SIZE, help='dictionary size in bytes')
+    dtr.add_argument('--dict-dir', default=DEFAULT_DICT_DIR)
+    dls = dsub.add_parser('list', help='list stored dictionaries')
+    dls.add_argument('--dict-dir', default=DEFAULT_DICT_DIR)
+    args = p.parse_args(argv)
+    if args.profile:
+        trace.enable()
+        trace.note(cmd=args.cmd)
+    try:
+        run(args)
+    finally:
+        trace.finish(args.profile)
+
 
+def run(args: argparse.Namespace) -> None:
     if args.cmd == 'encode':
         outdir = os.path.dirname(args.output_prefix)
         if outdir and not os.path.exists(outdir):
             os.makedirs(outdir, exist_ok=True)
-        paths = encode_file_to_pngs(args.input, args.output_prefix, max_png_bytes=args.max_png_bytes, brotli_quality=args.brotli_quality)
+        try:
+            with trace.span('tune', target=args.target):
+                settings = settings_for(args.target, args.input, args.brotli_quality)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        if args.target:
+            print('Tuned settings:', json.dumps(settings.describe()))
+            trace.note(target=args.target, **{'tuned_' + k: v for k, v in settings.describe().items()})
+        opts = dict(max_png_bytes=args.max_png_bytes, brotli_quality=settings.quality, lgwin=settings.lgwin, brotli_mode=settings.mode,
+                    compress_level=settings.compress_level, jobs=args.jobs, manifest=not args.no_manifest, layout=args.layout, check32=args.check32)
+        if args.delta_base:
+            if args.stream or args.block_size or args.codec != 'brotli' or args.dict:
+                raise SystemExit('--delta-base is a plain Brotli encode (no --stream, --block-size, --codec or --dict)')
+            sources = load_delta_base(args.delta_base, jobs=args.jobs)
+            paths, info = encode_delta_to_pngs(args.input, args.output_prefix, sources, max_png_bytes=args.max_png_bytes, brotli_quality=settings.quality,
+                                               jobs=args.jobs, manifest=not args.no_manifest, compress_level=settings.compress_level, layout=args.layout, check32=args.check32)
+            print(f"Delta against base {info['base']}: {info['new_chunks']}/{info['chunks']} chunks new ({info['new_bytes']} of {info['raw']} bytes), packet region {info['region']} bytes")
+            trace.note(**{'delta_' + k: v for k, v in info.items()})
+        elif args.codec != 'brotli' or args.dict:
+            if args.stream or args.block_size:
+                raise SystemExit('--codec/--dict apply to plain encodes (not --stream or --block-size)')
+            try:
+                dictionary = DictionaryStore(args.dict_dir).lookup(args.dict) if args.dict else None
+                paths = encode_file_to_pngs(args.input, args.output_prefix, codec=args.codec, codec_level=args.level, dictionary=dictionary, **opts)
+            except CodecError as e:
+                raise SystemExit(str(e))
+        elif args.block_size:
+            paths = encode_blocks_to_pngs(args.input, args.output_prefix, block_size=args.block_size, **opts)
+        else:
+            encode_fn = encode_file_to_pngs_streaming if args.stream else encode_file_to_pngs
+            paths = encode_fn(args.input, args.output_prefix, **opts)
         print('Written PNG parts:')
         for pp in paths:
             print(' -', pp)
@@ -257,8 +322,63 @@ def main() -> None:
         pngs = sorted(glob.glob(args.png_glob))
         if not pngs:
             raise SystemExit(f'No PNGs match pattern: {args.png_glob}')
-        decode_pngs_to_file(pngs, args.output)
+        if args.range:
+            offset, _, length = args.range.partition(':')
+            blocks = BlockReader(pngs)
+            with open(args.output, 'wb') as f:
+                f.write(blocks.read(int(offset), int(length), jobs=args.jobs))
+            print('Parts decoded:', blocks.reader.parts_loaded)
+        elif args.cache:
+            with DecodeCache(args.cache_dir, args.cache_max_bytes) as cache:
+                decode_pngs_to_file_cached(pngs, args.output, cache, jobs=args.jobs, dictionaries=DictionaryStore(args.dict_dir),
+                                           base=load_delta_base(args.delta_base, jobs=args.jobs) if args.delta_base else None)
+        else:
+            decode_pngs_to_file(pngs, args.output, jobs=args.jobs, dictionaries=DictionaryStore(args.dict_dir),
+                                base=load_delta_base(args.delta_base, jobs=args.jobs) if args.delta_base else None)
         print('Reconstructed file:', args.output)
+    elif args.cmd == 'archive':
+        outdir = os.path.dirname(args.output_prefix)
+        if outdir and not os.path.exists(outdir):
+            os.makedirs(outdir, exist_ok=True)
+        members = archive_members(args.inputs, base=args.base)
+        paths = encode_archive_to_pngs(members, args.output_prefix, max_png_bytes=args.max_png_bytes, brotli_quality=args.brotli_quality, jobs=args.jobs, layout=args.layout, check32=args.check32)
+        print(f'Archived {len(members)} members into PNG parts:')
+        for pp in paths:
+            print(' -', pp)
+    elif args.cmd in ('list', 'extract'):
+        import glob
+        pngs = sorted(glob.glob(args.png_glob))
+        if not pngs:
+            raise SystemExit(f'No PNGs match pattern: {args.png_glob}')
+        archive = ArchiveReader(pngs)
+        if args.cmd == 'list':
+            for m in archive.members.values():
+                print(f"{m['size']:>12} {m['length']:>12} {m['name']}")
+        else:
+            names = args.members or list(archive.members)
+            root = os.path.abspath(args.output_dir)
+            for name in names:
+                target = os.path.abspath(os.path.join(root, name))
+                if os.path.commonpath([root, target]) != root:
+                    raise SystemExit(f'refusing to extract {name!r} outside {args.output_dir}')
+                archive.extract(name, target)
+                print('Extracted', name)
+            print('Parts decoded:', archive.reader.parts_loaded)
+    elif args.cmd == 'cache':
+        cache = DecodeCache(args.cache_dir, args.cache_max_bytes)
+        if args.clear:
+            cache.clear()
+        print(json.dumps(cache.stats(), sort_keys=True))
+    elif args.cmd == 'dict':
+        store = DictionaryStore(args.dict_dir)
+        if args.dict_cmd == 'list':
+            for dict_id in store.ids():
+                print(f'{dict_id:08x} {os.path.getsize(store.path(dict_id)):>8}')
+            return
+        samples = dictionary_samples(args.inputs, args.lines)
+        d = store.add(train_dictionary(samples, args.size))
+        print(f'Dictionary {d.id:08x}: {len(d.data)} bytes from {len(samples)} samples -> {store.path(d.id)}')
+        print(json.dumps(dictionary_report(samples, d)))
 
 
 if __name__ == '__main__':
@@ -2,111 +2,115 @@
 """
 Scan combined PNG RGB/RGBA bytes for Cortex header occurrences and attempt decode.
 Writes first successful decode to decoded_scanned.bin
+
+Usage: python tools/scan_and_decode_cortex.py ["canal/cortex_packet_*.png"] [--jobs N] [--dict-dir D] [--profile [TRACE_JSON]]
 """
-from PIL import Image
+import argparse
 import brotli
-import struct
 import glob
 import sys
+from typing import List, Optional
+
+from oc8 import planes, trace
+from oc8.blocks import decompress_blocks
+from oc8.codecs import DEFAULT_DICT_DIR, DictionaryStore, codec_name, decode_region
+from oc8.headers import find_header_candidates, format_stats, payload_kind, trailer_size, verify_payload
+from oc8.manifest import plan_parts, verified_part_data
+from oc8.pipeline import iter_part_streams
+
+
+def legacy_streams(paths, jobs):
+    # (name, extractor, layout of the extracted bytes)
+    modes = [('rgb', lambda img: planes.image_buffer(img, 'RGB'), 'rgb'), ('rgba_strip', lambda img: planes.image_buffer(img, 'RGBA'), 'rgba')]
+
+    # build raw sequences for each strategy; each part is loaded once per mode and the
+    # reversed order reuses the same per-part buffers
+    streams = []
+    per_mode = {name: list(iter_part_streams(paths, extractor, prefetch=jobs)) for name, extractor, _ in modes}
+    for suffix, reverse in (('_norm', False), ('_rev', True)):
+        for name, _, layout in modes:
+            parts = per_mode[name]
+            streams.append((name + suffix, b''.join(reversed(parts) if reverse else parts), layout))
+    return streams
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> int:
+    ap = argparse.ArgumentParser(prog=prog, description='Scan PNG parts for a Cortex header and decode it')
+    ap.add_argument('png_glob', nargs='?', default='canal/cortex_packet_*.png')
+    ap.add_argument('--jobs', type=int, default=1, help='parts loaded/extracted concurrently')
+    ap.add_argument('--dict-dir', default=DEFAULT_DICT_DIR, help='where dictionaries named by packets are looked up')
+    trace.add_profile_argument(ap)
+    args = ap.parse_args(argv)
+    if args.profile:
+        trace.enable()
+    try:
+        return scan(args)
+    finally:
+        trace.finish(args.profile)
+
 
-paths = sorted(glob.glob('canal/cortex_packet_*.png'))
-if not paths:
-    print('No PNG parts found matching canal/cortex_packet_*.png')
-    sys.exit(2)
-
-print('Found parts:', paths)
-
-modes = [('rgb', lambda img: img.convert('RGB').tobytes()), ('rgba_strip', lambda img: img.convert('RGBA').tobytes())]
-orders = [paths, list(reversed(paths))]
-
-# build raw sequences for each strategy
-streams = []
-for order in orders:
-    for name, extractor in modes:
-        allb = bytearray()
-        for p in order:
-            img = Image.open(p)
-            allb.extend(extractor(img))
-        streams.append((name + ('_rev' if order is orders[1] else '_norm'), bytes(allb)))
-
-# helpers
-def crc8_oc8(data: bytes, poly: int = 0x07, init: int = 0x00) -> int:
-    crc = init & 0xFF
-    for b in data:
-        crc ^= b
-        for _ in range(8):
-            if (crc & 0x80) != 0:
-                crc = ((crc << 1) ^ poly) & 0xFF
-            else:
-                crc = (crc << 1) & 0xFF
-    return crc & 0xFF
-
-found = False
-for name, full in streams:
-    L = len(full)
-    print(f"Strategy {name}, length={L}")
-    # try offsets up to min(4096, L-16)
-    max_off = min(4096, max(0, L-16))
-    for off in range(0, max_off+1):
-        head = full[off:off+16]
-        if len(head) < 16:
-            continue
-        # try big-endian
-        total_be = int.from_bytes(head[0:4], 'big')
-        payload_be = int.from_bytes(head[4:8], 'big')
-        flags = head[8]
-        # basic plausibility checks
-        if payload_be < 1 or payload_be > (L - off - 16):
-            # also allow if payload_be equals remaining (len-16)
-            pass
-        else:
-            # attempt to extract payload
-            payload_with_crc = full[off+16:off+16+payload_be]
-            if len(payload_with_crc) < 1:
+def scan(args: argparse.Namespace) -> int:
+    paths = sorted(glob.glob(args.png_glob))
+    if not paths:
+        print(f'No PNG parts found matching {args.png_glob}')
+        return 2
+
+    print('Found parts:', paths)
+
+    plan = plan_parts(paths)
+    if plan is not None:
+        # parts carry a cortex-part manifest: one ordered, verified stream, no strategy guessing
+        manifests = dict(plan)
+        extract = lambda img: verified_part_data(img, manifests[img.filename], planes.layout_bytes)
+        streams = [('manifest', b''.join(iter_part_streams([p for p, _ in plan], extract, prefetch=args.jobs)), plan[0][1]['layout'])]
+    else:
+        streams = legacy_streams(paths, args.jobs)
+
+    dictionaries = DictionaryStore(args.dict_dir)
+    found = False
+    for name, full, layout in streams:
+        L = len(full)
+        print(f"Strategy {name}, length={L}")
+        # rank plausible header offsets from header fields only; checks + brotli run on survivors
+        candidates, stats = find_header_candidates(full, layout=layout)
+        view = memoryview(full)
+        for c in candidates:
+            comp = view[c.offset+16:c.offset+16+c.payload_len-trailer_size(c.flags)]
+            trace.count('candidates_tried')
+            failed = verify_payload(view, c, strategy=name)
+            if failed:
+                stats[failed] += 1
                 continue
-            comp = payload_with_crc[:-1]
-            crc = payload_with_crc[-1]
-            if crc8_oc8(comp) != crc:
+            kind = payload_kind(c.flags)
+            if kind == 'delta':
+                # a verified delta packet, but rebuilding it needs its base: rgba_brotli_oc8.py decode --delta-base
+                stats['delta'] += 1
                 continue
-            # try brotli decompress
+            codec = 'brotli' if kind == 'blocks' else codec_name(c.flags)
             try:
-                raw = brotli.decompress(comp)
-                print(f'SUCCESS BE at offset {off} strategy {name}: flags={flags} payload_len={payload_be} total={total_be}')
-                open('decoded_scanned.bin','wb').write(raw)
-                print('Wrote decoded_scanned.bin')
-                found = True
-                break
-            except Exception as e:
-                # decompression failed
+                with trace.span(codec, bytes=len(comp), offset=c.offset, strategy=name):
+                    raw = decompress_blocks(comp) if kind == 'blocks' else decode_region(c.flags, comp, dictionaries)
+            except (brotli.error, ValueError):
+                stats[codec] += 1
                 continue
-        # try little-endian in case
-        total_le = int.from_bytes(head[0:4], 'little')
-        payload_le = int.from_bytes(head[4:8], 'little')
-        if payload_le < 1 or payload_le > (L - off - 16):
-            continue
-        payload_with_crc = full[off+16:off+16+payload_le]
-        if len(payload_with_crc) < 1:
-            continue
-        comp = payload_with_crc[:-1]
-        crc = payload_with_crc[-1]
-        if crc8_oc8(comp) != crc:
-            continue
-        try:
-            raw = brotli.decompress(comp)
-            print(f'SUCCESS LE at offset {off} strategy {name}: payload_len={payload_le} total={total_le}')
+            print(f'SUCCESS {c.endian.upper()} at offset {c.offset} strategy {name}: flags={c.flags} payload_len={c.payload_len} total={c.total_len}')
+            trace.note(strategy=name, offset=c.offset)
             open('decoded_scanned.bin','wb').write(raw)
             print('Wrote decoded_scanned.bin')
             found = True
             break
-        except Exception:
-            continue
-    if found:
-        break
-
-if not found:
-    print('No valid Cortex packet found using scanned heuristics')
-    # print some debug sample
-    for name, full in streams:
-        print(f'--- {name} sample hex 0..64: {full[:64].hex()}')
-
-sys.exit(0 if found else 3)
+        print(f'  header scan: {format_stats(stats)}')
+        if found:
+            break
+
+    if not found:
+        print('No valid Cortex packet found using scanned heuristics')
+        # print some debug sample
+        for name, full, layout in streams:
+            print(f'--- {name} sample hex 0..64: {full[:64].hex()}')
+
+    return 0 if found else 3
+
+
+if __name__ == '__main__':
+    sys.exit(main())
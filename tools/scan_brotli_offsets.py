@@ -1,86 +1,97 @@
 #!/usr/bin/env python3
 """
 Scan channel streams for a Brotli block at any offset and write any valid UTF-8 JSON found.
-Usage: python tools/scan_brotli_offsets.py "canal/cortex_packet_*_fixed.png"
+Usage: python tools/scan_brotli_offsets.py "canal/cortex_packet_*_fixed.png" [--max-offset N | --all-offsets] [--jobs N] [--profile [TRACE_JSON]]
 """
+import argparse
 import sys
-from PIL import Image
 import glob
-import brotli
+from typing import List, Optional
 
-if len(sys.argv) < 2:
-    print('Usage: scan_brotli_offsets.py <png_glob>')
-    sys.exit(2)
+from oc8 import planes, trace
+from oc8.brotli_probe import offset_limit, scan_streams
+from oc8.pipeline import iter_part_streams
 
-png_glob = sys.argv[1]
-paths = sorted(glob.glob(png_glob))
-if not paths:
-    print('No PNGs match', png_glob)
-    sys.exit(3)
 
-print('Scanning parts:', paths)
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> int:
+    p = argparse.ArgumentParser(prog=prog, description='Scan PNG channel streams for a Brotli stream start')
+    p.add_argument('png_glob')
+    p.add_argument('--max-offset', type=int, default=3000, help='highest offset tried per stream (default 3000)')
+    p.add_argument('--all-offsets', action='store_true', help='search every offset of every stream')
+    p.add_argument('--jobs', type=int, default=None, help='worker processes for probing and threads for part loading (default: probing uses all cores once there are 8192+ offsets, in process below that)')
+    trace.add_profile_argument(p)
+    args = p.parse_args(argv)
+    if args.profile:
+        trace.enable()
+    try:
+        return scan(args)
+    finally:
+        trace.finish(args.profile)
 
-# build concatenated RGBA and RGB streams
-red = bytearray()
-green = bytearray()
-blue = bytearray()
-rgbrgb = bytearray()  # concatenated rgb bytes from each pixel
-rgba_strip = bytearray()
 
-for p in paths:
-    img = Image.open(p).convert('RGBA')
-    data = img.tobytes()
-    for i in range(0, len(data), 4):
-        r = data[i]
-        g = data[i+1]
-        b = data[i+2]
-        a = data[i+3]
-        red.append(r)
-        green.append(g)
-        blue.append(b)
-        rgbrgb.extend(bytes([r,g,b]))
-        rgba_strip.extend(bytes([r,g,b]))
+def scan(args: argparse.Namespace) -> int:
+    paths = sorted(glob.glob(args.png_glob))
+    if not paths:
+        print('No PNGs match', args.png_glob)
+        return 3
 
-streams = [('red', bytes(red)), ('green', bytes(green)), ('blue', bytes(blue)), ('rgb', bytes(rgbrgb)), ('rgba_strip', bytes(rgba_strip))]
+    print('Scanning parts:', paths)
 
-found = []
-for name, s in streams:
-    L = len(s)
-    print(f"Stream {name}, length={L}")
-    max_off = max(0, min(L-1, 3000))
-    for off in range(0, max_off+1):
-        if off >= L-4:
-            break
-        try:
-            candidate = s[off:]
-            # quick plausibility: must start with Brotli magic? brotli has no fixed magic, so try decompress
-            out = brotli.decompress(candidate)
-            # if successful, check utf-8
-            try:
-                text = out.decode('utf-8')
-                print(f'FOUND Brotli utf8 at stream={name} offset={off} len_out={len(out)}')
-                fn = f'decoded_brotli_{name}_{off}.json'
-                with open(fn,'wb') as f:
-                    f.write(out)
-                found.append((name,off,fn))
-                # stop on first success for this stream
-                break
-            except Exception:
-                # write binary candidate
-                fn = f'decoded_brotli_{name}_{off}.bin'
-                with open(fn,'wb') as f:
-                    f.write(out)
-                print(f'FOUND Brotli binary at stream={name} offset={off} wrote {fn}')
-                found.append((name,off,fn))
-                break
-        except Exception:
+    # build concatenated RGBA and RGB streams; parts are loaded and split on --jobs threads
+    def split(img):
+        data = planes.image_buffer(img, 'RGBA')
+        return planes.plane_bytes(data, 0), planes.plane_bytes(data, 1), planes.plane_bytes(data, 2), planes.strip_alpha(data)
+
+    red = bytearray()
+    green = bytearray()
+    blue = bytearray()
+    rgbrgb = bytearray()  # concatenated rgb bytes from each pixel
+
+    for r, g, b, rgb in iter_part_streams(paths, split, prefetch=args.jobs or 1):
+        red += r
+        green += g
+        blue += b
+        rgbrgb += rgb
+
+    # rgba_strip is the same byte sequence as rgb (alpha dropped), so it is not scanned twice
+    streams = [('red', bytes(red)), ('green', bytes(green)), ('blue', bytes(blue)), ('rgb', bytes(rgbrgb))]
+    for name, s in streams:
+        print(f"Stream {name}, length={len(s)}")
+
+    max_offset = None if args.all_offsets else args.max_offset
+    # probing runs in worker processes; the trace sees the whole search as one stage
+    offsets = sum(offset_limit(len(s), max_offset) for _, s in streams)
+    with trace.span('brotli_probe', bytes=sum(len(s) for _, s in streams), offsets=offsets) as sp:
+        hits = scan_streams(streams, max_offset=max_offset, jobs=args.jobs)
+        sp.set(hits=len(hits))
+    trace.count('probe_offsets', offsets)
+    if 'rgb' in hits:
+        hits['rgba_strip'] = hits['rgb']
+
+    found = []
+    for name in ('red', 'green', 'blue', 'rgb', 'rgba_strip'):
+        if name not in hits:
             continue
+        off, out = hits[name]
+        try:
+            out.decode('utf-8')
+            print(f'FOUND Brotli utf8 at stream={name} offset={off} len_out={len(out)}')
+            fn = f'decoded_brotli_{name}_{off}.json'
+        except UnicodeDecodeError:
+            fn = f'decoded_brotli_{name}_{off}.bin'
+            print(f'FOUND Brotli binary at stream={name} offset={off} wrote {fn}')
+        with open(fn, 'wb') as f:
+            f.write(out)
+        found.append((name, off, fn))
 
-if not found:
-    print('No Brotli block found in scanned offsets (up to 3000)')
-    sys.exit(4)
-else:
+    if not found:
+        print('No Brotli block found in scanned offsets (%s)' % ('all' if max_offset is None else f'up to {max_offset}'))
+        return 4
     print('Found candidates:')
     for t in found:
         print(t)
-    sys.exit(0)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the tools import the shared package as ``oc8`` from tools/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
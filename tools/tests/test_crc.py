@@ -0,0 +1,58 @@
+import os
+import random
+import struct
+import zlib
+
+import pytest
+
+from oc8.crc import CHECK32_SIZE, Crc8Oc8, PacketCheck, _np, crc8_oc8, crc8_oc8_reference
+
+
+BACKENDS = ['table', 'translate'] + (['numpy'] if _np is not None else [])
+SIZES = [0, 1, 9, 63, 64, 65, 768, 4095, 4096, 4097, 100003]
+
+
+def _data(n):
+    return random.Random(n).randbytes(n)
+
+
+def test_known_answer():
+    # shared with src/cortex/codec.ts crc8_oc8 (CRC-8/SMBUS check value)
+    assert crc8_oc8(b'123456789') == 0xF4
+    assert crc8_oc8_reference(b'123456789') == 0xF4
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('n', SIZES)
+@pytest.mark.parametrize('poly', [0x07, 0x1D])
+def test_backends_match_reference(backend, n, poly):
+    data = _data(n)
+    init = random.Random(n ^ poly).randrange(256)
+    assert crc8_oc8(data, poly, init, backend=backend) == crc8_oc8_reference(data, poly, init)
+
+
+@pytest.mark.parametrize('data', [b'', b'\x00', b'\xff', bytes(range(256)) * 3, bytes(70000)])
+def test_special_inputs(data):
+    want = crc8_oc8_reference(data)
+    assert all(crc8_oc8(data, backend=be) == want for be in BACKENDS)
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_incremental(n):
+    data = _data(n)
+    rnd = random.Random(n)
+    inc = Crc8Oc8()
+    pos = 0
+    while pos < len(data):
+        step = rnd.randrange(1, 9000)
+        inc.update(memoryview(data)[pos:pos + step])
+        pos += step
+    assert inc.digest() == crc8_oc8_reference(data)
+
+
+def test_packet_check_trailers():
+    region, header = os.urandom(5000), os.urandom(16)
+    trailer = PacketCheck(check32=True).update(region[:77]).update(region[77:]).trailer(header)
+    assert trailer[:CHECK32_SIZE] == struct.pack('>I', zlib.crc32(region + header))
+    assert trailer[-1] == crc8_oc8_reference(region + trailer[:CHECK32_SIZE])
+    assert PacketCheck().update(region).trailer(header) == bytes([crc8_oc8_reference(region)])
@@ -0,0 +1,87 @@
+import json
+import random
+
+import pytest
+
+from oc8 import api
+from oc8.archive import ArchiveReader, encode_archive_to_pngs
+from oc8.blocks import BlockReader
+from oc8.codecs import CODECS, DictionaryStore, train_dictionary
+
+
+def _text(n, seed=0):
+    rnd = random.Random(seed)
+    words = [b'cortex', b'packet', b'brotli', b'layout', b'{"cmd":', b'"args":[', b'\n', b' ']
+    out = bytearray()
+    while len(out) < n:
+        out += rnd.choice(words) + str(rnd.randrange(1000)).encode()
+    return bytes(out[:n])
+
+
+DATA = _text(50000) + random.Random(1).randbytes(20000)
+
+
+@pytest.mark.parametrize('layout', ['rgb', 'rgba'])
+@pytest.mark.parametrize('check32', [False, True])
+def test_layouts(layout, check32):
+    parts = api.encode(DATA, layout=layout, check32=check32, max_png_bytes=16 * 1024, quality=5)
+    assert len(parts) > 1
+    assert bytes(api.decode(parts[::-1])) == DATA  # manifests put the parts back in order
+
+
+@pytest.mark.parametrize('layout', ['rgb', 'rgba'])
+def test_legacy_parts_without_manifest(layout):
+    parts = api.encode(DATA, layout=layout, manifest=False, quality=5)
+    assert bytes(api.decode(parts)) == DATA
+
+
+@pytest.mark.parametrize('codec', sorted(CODECS))
+def test_codecs(codec):
+    if not CODECS[codec].available:
+        pytest.skip(f'{codec} needs an optional package')
+    parts = api.encode(DATA, codec=codec)
+    assert bytes(api.decode(parts)) == DATA
+
+
+@pytest.mark.parametrize('codec', sorted(name for name, c in CODECS.items() if c.dictionaries))
+def test_codecs_with_dictionary(codec, tmp_path):
+    if not CODECS[codec].available:
+        pytest.skip(f'{codec} needs an optional package')
+    samples = [json.dumps({'cmd': 'enable-spyder', 'args': [i, 'mode-%d' % (i % 7)]}).encode() for i in range(300)]
+    store = DictionaryStore(str(tmp_path))
+    dictionary = store.add(train_dictionary(samples, 4096))
+    parts = api.encode(samples[5], codec=codec, dictionary=dictionary)
+    assert bytes(api.decode(parts, dictionaries=store)) == samples[5]
+
+
+@pytest.mark.parametrize('layout', ['rgb', 'rgba'])
+def test_blocks(layout, tmp_path):
+    names = api.encode(DATA, str(tmp_path / 'blk'), block_size=8192, layout=layout, quality=5, max_png_bytes=16 * 1024)
+    assert bytes(api.decode(names)) == DATA
+    reader = BlockReader(names)
+    assert reader.size == len(DATA)
+    for offset, length in [(0, 10), (8190, 5), (30000, 20000), (len(DATA) - 3, 100)]:
+        assert reader.read(offset, length) == DATA[offset:offset + length]
+
+
+@pytest.mark.parametrize('layout', ['rgb', 'rgba'])
+@pytest.mark.parametrize('check32', [False, True])
+def test_archive(layout, check32, tmp_path):
+    members = []
+    for i, blob in enumerate([DATA, b'', _text(3000, seed=2)]):
+        path = tmp_path / f'm{i}.bin'
+        path.write_bytes(blob)
+        members.append((f'dir/m{i}.bin', str(path)))
+    names = encode_archive_to_pngs(members, str(tmp_path / 'arc'), max_png_bytes=16 * 1024, brotli_quality=5, layout=layout, check32=check32)
+    reader = ArchiveReader(names)
+    assert sorted(reader.members) == sorted(n for n, _ in members)
+    for name, path in members:
+        with open(path, 'rb') as f:
+            assert reader.read(name) == f.read()
+
+
+def test_delta():
+    base = _text(60000, seed=3)
+    new = base[:20000] + b'inserted bytes' + base[20000:45000] + _text(2000, seed=4)
+    parts = api.encode(new, base=[base], quality=5)
+    assert bytes(api.decode(parts, base=[base])) == new